@@ -14,7 +14,7 @@ from .session_store import create_session, get_user_id_by_token
 
 
 def _avatar_url_for_response(avatar_url):
-    """返回用于接口的头像 URL，若为 OSS 地址则刷新签名避免过期 403。"""
+    """返回用于接口的头像 URL：库中为 object key 或 OSS 地址时生成签名 URL，避免过期 403。"""
     if not avatar_url:
         return avatar_url
     if not getattr(settings, "ALIYUN_OSS_ENABLED", False):
@@ -497,16 +497,10 @@ def me(request):
     if user.status == 0:
         return Response(_result(400, "账号已被禁用"), status=status.HTTP_400_BAD_REQUEST)
     profile = _get_user_profile(user_id)
-    follow_count = follower_count = post_count = 0
+    stats = {"followCount": 0, "followerCount": 0, "postCount": 0}
     try:
-        from django.db import connection
-        with connection.cursor() as c:
-            c.execute("SELECT COUNT(*) FROM user_follow WHERE user_id = %s", [user_id])
-            follow_count = c.fetchone()[0] or 0
-            c.execute("SELECT COUNT(*) FROM user_follow WHERE target_user_id = %s", [user_id])
-            follower_count = c.fetchone()[0] or 0
-            c.execute("SELECT COUNT(*) FROM post WHERE user_id = %s AND status = 1", [user_id])
-            post_count = c.fetchone()[0] or 0
+        from apps.community import user_stats
+        stats = user_stats.get(user_id)
     except Exception:
         pass
     return Response(_result(data={
@@ -521,9 +515,9 @@ def me(request):
         "birthDate": profile["birthDate"],
         "birthTime": profile.get("birthTime"),
         "constitution": profile.get("constitution"),
-        "followCount": follow_count,
-        "followerCount": follower_count,
-        "postCount": post_count,
+        "followCount": stats["followCount"],
+        "followerCount": stats["followerCount"],
+        "postCount": stats["postCount"],
         "isMaster": profile.get("isMaster", False),
     }))
 
@@ -555,15 +549,18 @@ def user_location(request):
         or ""
     )
     loc = (str(loc).strip() or "")[:32]
+    # 同时保存解析后的省/市短名，供同城信息流等值查询
+    from apps.community.region import parse_region
+    province, city = parse_region(loc)
     try:
         with connection.cursor() as c:
             c.execute(
                 """
-                INSERT INTO user_profile (user_id, region_code, created_at, updated_at)
-                VALUES (%s, %s, NOW(), NOW())
-                ON DUPLICATE KEY UPDATE region_code = %s, updated_at = NOW()
+                INSERT INTO user_profile (user_id, region_code, region_province, region_city, created_at, updated_at)
+                VALUES (%s, %s, %s, %s, NOW(), NOW())
+                ON DUPLICATE KEY UPDATE region_code = %s, region_province = %s, region_city = %s, updated_at = NOW()
                 """,
-                [user_id, loc or None, loc or None],
+                [user_id, loc or None, province, city, loc or None, province, city],
             )
     except Exception:
         try:
@@ -658,8 +655,13 @@ def update_profile(request):
         user.nickname = (str(nickname).strip() or user.nickname)[:64]
     avatar_url = request.data.get("avatarUrl")
     if avatar_url is not None:
-        user.avatar_url = (str(avatar_url).strip() or user.avatar_url)[:512] if str(avatar_url).strip() else None
+        # 头像入库存 OSS object key，签名 URL 在返回时生成
+        from apps.system.oss_signer import to_object_key
+        user.avatar_url = to_object_key(str(avatar_url).strip())[:512] if str(avatar_url).strip() else None
     user.save(update_fields=["nickname", "avatar_url", "updated_at"])
+    # 帖子列表中的作者卡片（昵称/头像）有缓存，资料变更后清掉
+    from apps.community.hydration import invalidate_users
+    invalidate_users([user_id])
     gender = request.data.get("gender")
     if gender is not None:
         try:
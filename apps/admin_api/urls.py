@@ -5,6 +5,8 @@ from . import views
 urlpatterns = [
     path("stats", views.dashboard_stats),
     path("core-data", views.core_data_board),
+    path("oss-sign-cache", views.oss_sign_cache_stats),
+    path("media-cover-stats", views.media_cover_stats),
     path("teacher-applies", views.teacher_apply_list),
     path("teacher-applies/<int:apply_id>/approve", views.teacher_apply_approve),
     path("teacher-applies/<int:apply_id>/reject", views.teacher_apply_reject),
@@ -13,36 +13,28 @@ from rest_framework.response import Response
 
 from .auth import admin_api_required, _result
 from apps.account.models import User, WithdrawApply
+from apps.community import broadcast, unread, user_stats
+from apps.community.hydration import invalidate_posts, invalidate_users
 from apps.community.models import Post, Report, SystemNotification
+from apps.im import realtime
 from apps.system.models import Announcement
+from apps.system.oss_signer import refresh_url_map
 from apps.system.oss_upload import refresh_oss_url_if_applicable
 
 
 def _send_announcement_system_notification(announcement):
-    """公告上架时给全量用户插入一条系统通知（分批，每批 500）"""
+    """公告上架时发布一条全员系统通知（只写一行，用户读取时合并，见 apps.community.broadcast）"""
     try:
-        user_ids = list(
-            User.objects.exclude(mobile__startswith="deleted_").values_list("id", flat=True)
-        )
-        title = (announcement.title or "平台公告")[:255]
-        content = (announcement.content or "")[:2000]
         extra = json.dumps(
             {"announcementId": announcement.id, "linkUrl": (announcement.link_url or "") or None},
             ensure_ascii=False,
         )[:1024]
-        batch = 500
-        for i in range(0, len(user_ids), batch):
-            chunk = user_ids[i : i + batch]
-            SystemNotification.objects.bulk_create([
-                SystemNotification(
-                    user_id=uid,
-                    type="announcement",
-                    title=title,
-                    content=content,
-                    extra_json=extra,
-                )
-                for uid in chunk
-            ])
+        broadcast.publish(
+            "announcement",
+            (announcement.title or "平台公告")[:255],
+            (announcement.content or "")[:2000],
+            extra,
+        )
     except Exception:
         pass
 
@@ -263,6 +255,22 @@ def dashboard_stats(request):
         return Response(_result(500, str(e)), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(["GET"])
+@admin_api_required
+def oss_sign_cache_stats(request):
+    """OSS 签名 URL 缓存命中统计（process 为当前 worker，total 为所有 worker 汇总，约 60 秒延迟）"""
+    from apps.system.oss_signer import signed_url_cache_stats
+    return Response(_result(data=signed_url_cache_stats()))
+
+
+@api_view(["GET"])
+@admin_api_required
+def media_cover_stats(request):
+    """视频封面截取统计：各读取模式（faststart/moov_at_end/full）的次数与读取字节，用于评估按范围读取的效果"""
+    from apps.system.media_jobs import cover_stats
+    return Response(_result(data=cover_stats()))
+
+
 # ---------- 名师入驻审核 ----------
 @api_view(["GET"])
 @admin_api_required
@@ -412,7 +420,7 @@ def teacher_set_consult_price(request, user_id):
 @api_view(["GET"])
 @admin_api_required
 def post_list(request):
-    """帖子列表，支持 status=1|0，keyword 搜内容"""
+    """帖子列表，支持 status=1|0，keyword 搜内容；cursor（nextCursor）或 page 翻页"""
     status_val = request.GET.get("status")
     try:
         status_int = int(status_val) if status_val not in (None, "") else 1
@@ -421,17 +429,27 @@ def post_list(request):
     keyword = (request.GET.get("keyword") or "").strip()[:50]
     page = max(1, int(request.GET.get("page") or 1))
     page_size = min(50, max(1, int(request.GET.get("page_size") or 20)))
+    try:
+        cursor = int(request.GET.get("cursor") or 0)
+    except (TypeError, ValueError):
+        cursor = 0
     start = (page - 1) * page_size
     qs = Post.objects.filter(status=status_int).order_by("-id")
     if keyword:
         qs = qs.filter(content__icontains=keyword)
     total = qs.count()
-    posts = list(qs[start : start + page_size])
+    # cursor 为上一页最后一条的 id（nextCursor），按主键范围翻页；未传时兼容 page
+    if cursor > 0:
+        posts = list(qs.filter(id__lt=cursor)[: page_size + 1])
+    else:
+        posts = list(qs[start : start + page_size + 1])
+    has_more = len(posts) > page_size
+    posts = posts[:page_size]
+    next_cursor = posts[-1].id if has_more and posts else None
     user_ids = list({p.user_id for p in posts})
     users = {u.id: u for u in User.objects.filter(id__in=user_ids)} if user_ids else {}
-    items = []
+    parsed = {}
     for p in posts:
-        u = users.get(p.user_id)
         media_urls = []
         if p.media_urls_json:
             try:
@@ -448,6 +466,14 @@ def post_list(request):
                 pass
         if not isinstance(media_cover_urls, list):
             media_cover_urls = []
+        parsed[p.id] = (media_urls, media_cover_urls)
+    # 库中为 object key，整页一次签名
+    url_map = refresh_url_map([m for pair in parsed.values() for lst in pair for m in lst])
+    items = []
+    for p in posts:
+        u = users.get(p.user_id)
+        media_urls = [url_map.get(m, m) for m in parsed[p.id][0]]
+        media_cover_urls = [url_map.get(m, m) for m in parsed[p.id][1]]
         items.append({
             "id": p.id,
             "userId": p.user_id,
@@ -462,7 +488,7 @@ def post_list(request):
             "commentCount": p.comment_count,
             "createdAt": p.created_at.isoformat() if p.created_at else None,
         })
-    return Response(_result(data={"list": items, "total": total, "hasMore": len(posts) == page_size}))
+    return Response(_result(data={"list": items, "total": total, "hasMore": has_more, "nextCursor": next_cursor}))
 
 
 @api_view(["POST"])
@@ -479,7 +505,9 @@ def post_set_status(request, post_id):
         p = Post.objects.filter(id=post_id).first()
         if not p:
             return Response(_result(404, "帖子不存在"), status=status.HTTP_404_NOT_FOUND)
-        Post.objects.filter(id=post_id).update(status=s)
+        if Post.objects.filter(id=post_id).exclude(status=s).update(status=s):
+            user_stats.on_post_status(p, active=s == 1)
+        invalidate_posts([post_id])
         return Response(_result(data={"message": "已下架" if s == 0 else "已恢复"}))
     except Exception as e:
         return Response(_result(500, str(e)), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -562,7 +590,9 @@ def report_handle(request, report_id):
         if punish_post and r.target_type == "post":
             p = Post.objects.filter(id=r.target_id).first()
             if p:
-                Post.objects.filter(id=r.target_id).update(status=0)
+                if Post.objects.filter(id=r.target_id, status=1).update(status=0):
+                    user_stats.on_post_status(p, active=False)
+                invalidate_posts([r.target_id])
                 extra = json.dumps({"postId": p.id}, ensure_ascii=False)
                 SystemNotification.objects.create(
                     user_id=p.user_id,
@@ -571,6 +601,8 @@ def report_handle(request, report_id):
                     content=handle_result or "因违反社区规范，您的帖子已被下架。如有疑问请联系客服。",
                     extra_json=extra,
                 )
+                unread.incr(p.user_id, "system")
+                realtime.push([p.user_id], "notification", {"category": "system"})
         if punish_user:
             uid = r.target_id if r.target_type == "user" else None
             if uid is None and r.target_type == "post":
@@ -799,6 +831,7 @@ def user_delete(request, user_id):
             avatar_url="",
             updated_at=timezone.now(),
         )
+        invalidate_users([user_id])
         return Response(_result(data={"message": "已删除"}))
     except Exception as e:
         return Response(_result(500, str(e)), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
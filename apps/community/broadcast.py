@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+全员系统通知（平台公告）：只写一行 broadcast_notification，读时合并，发布公告为 O(1)，不再给每个用户插一行。
+- 用户可见：注册时间不晚于公告发布时间的公告（与原先“发布时给当时全量用户发送”一致）
+- 已读：user_broadcast_state.last_read_id 水位，id 不大于水位的公告视为已读
+- 公告列表整体缓存（数量少），发布时失效
+在系统通知列表中公告以负数 id 返回（-broadcast_id），标记已读接口据此区分。
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+LIST_KEY = "broadcast:list"
+LIST_TTL = 300
+LIST_MAX = 200
+
+
+def publish(ntype, title, content=None, extra_json=None):
+    """发布一条全员通知，返回 broadcast id"""
+    from .models import BroadcastNotification
+    b = BroadcastNotification.objects.create(
+        type=ntype, title=(title or "")[:255], content=content, extra_json=extra_json, status=1,
+    )
+    try:
+        cache.delete(LIST_KEY)
+    except Exception:
+        pass
+    from apps.im.realtime import broadcast
+    broadcast("notification", {"category": "system"})
+    return b.id
+
+
+def active_broadcasts():
+    """生效中的全员通知（新到旧），每项含 id/type/title/content/extraJson/createdAt/ts（秒级时间戳）"""
+    try:
+        items = cache.get(LIST_KEY)
+    except Exception:
+        items = None
+    if items is None:
+        from .models import BroadcastNotification
+        items = [
+            {
+                "id": b.id,
+                "type": b.type,
+                "title": b.title or "",
+                "content": b.content or "",
+                "extraJson": b.extra_json,
+                "createdAt": b.created_at.isoformat() if b.created_at else None,
+                "ts": int(b.created_at.timestamp()) if b.created_at else 0,
+            }
+            for b in BroadcastNotification.objects.filter(status=1).order_by("-id")[:LIST_MAX]
+        ]
+        try:
+            cache.set(LIST_KEY, items, timeout=LIST_TTL)
+        except Exception:
+            pass
+    return items
+
+
+def user_state(user_id):
+    """(已读水位, 注册时间秒级时间戳)"""
+    from apps.account.models import User
+    joined = User.objects.filter(id=user_id).values_list("created_at", flat=True).first()
+    with connection.cursor() as c:
+        c.execute("SELECT last_read_id FROM user_broadcast_state WHERE user_id = %s", [user_id])
+        row = c.fetchone()
+    return (row[0] if row else 0) or 0, int(joined.timestamp()) if joined else 0
+
+
+def visible(watermark, joined_ts):
+    """该用户可见的公告列表，附 read 标记"""
+    return [dict(b, read=b["id"] <= watermark) for b in active_broadcasts() if b["ts"] >= joined_ts]
+
+
+def unread_count(watermark, joined_ts):
+    return sum(1 for b in active_broadcasts() if b["ts"] >= joined_ts and b["id"] > watermark)
+
+
+def mark_read(user_id, upto_id=None):
+    """已读水位推进到 upto_id（为空时到最新一条）"""
+    if upto_id is None:
+        items = active_broadcasts()
+        upto_id = items[0]["id"] if items else 0
+    if not upto_id:
+        return
+    with connection.cursor() as c:
+        c.execute(
+            "INSERT INTO user_broadcast_state (user_id, last_read_id, updated_at) VALUES (%s, %s, NOW()) "
+            "ON DUPLICATE KEY UPDATE last_read_id = GREATEST(last_read_id, VALUES(last_read_id)), updated_at = NOW()",
+            [user_id, upto_id],
+        )
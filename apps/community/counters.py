@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+帖子计数（点赞/评论/分享）写后回写：请求内只在 Redis 累加增量，flush_post_counters 定期把增量合并写回 post 表，
+热门帖子不再因每次点赞 UPDATE 同一行而产生行锁竞争。
+- counter:post:<id>      Hash，未落库的增量（like_count / comment_count / share_count）
+- counter:flushing:<id>  Hash，正在落库的增量；落库成功后删除，失败保留并在下次合并
+- counter:dirty          Set，有待落库增量的 post_id
+读帖子计数时 = 库中值 + 两个 Hash 的增量（pending_deltas），落库后调用方缓存按 invalidate_posts 失效。
+Redis 不可用时 incr 返回 False，调用方回退为直接 UPDATE。
+"""
+import logging
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+LIVE_KEY = "counter:post:{}"
+FLUSHING_KEY = "counter:flushing:{}"
+DIRTY_KEY = "counter:dirty"
+FIELDS = ("like_count", "comment_count", "share_count")
+FLUSH_BATCH = 500
+
+# 把未落库增量并入 flushing（可能有上次失败残留），返回 flushing 全部内容。KEYS: live, flushing
+_MOVE_SCRIPT = """
+local vals = redis.call('HGETALL', KEYS[1])
+for i = 1, #vals, 2 do
+    redis.call('HINCRBY', KEYS[2], vals[i], vals[i + 1])
+end
+redis.call('DEL', KEYS[1])
+return redis.call('HGETALL', KEYS[2])
+"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def incr(post_id, field, delta=1):
+    """累加帖子计数增量；成功返回 True，Redis 不可用返回 False"""
+    if field not in FIELDS:
+        raise ValueError(field)
+    try:
+        pipe = _redis().pipeline()
+        pipe.hincrby(LIVE_KEY.format(post_id), field, delta)
+        pipe.sadd(DIRTY_KEY, post_id)
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning("帖子计数累加失败 post=%s %s: %s", post_id, field, e)
+        return False
+
+
+def pending_deltas(post_ids):
+    """{post_id: {field: 未落库增量}}，无增量的帖子不出现；Redis 不可用返回 {}"""
+    post_ids = list(dict.fromkeys(post_ids))
+    if not post_ids:
+        return {}
+    try:
+        pipe = _redis().pipeline()
+        for pid in post_ids:
+            pipe.hgetall(LIVE_KEY.format(pid))
+            pipe.hgetall(FLUSHING_KEY.format(pid))
+        results = pipe.execute()
+    except Exception as e:
+        logger.warning("读取帖子计数增量失败: %s", e)
+        return {}
+    deltas = {}
+    for i, pid in enumerate(post_ids):
+        merged = {}
+        for h in results[2 * i: 2 * i + 2]:
+            for k, v in (h or {}).items():
+                k = k.decode() if isinstance(k, bytes) else k
+                merged[k] = merged.get(k, 0) + int(v)
+        if any(merged.values()):
+            deltas[pid] = merged
+    return deltas
+
+
+def apply_deltas(post_id, counts, deltas):
+    """把增量合并到计数 dict（键为 likeCount/commentCount/shareCount），结果不小于 0"""
+    d = deltas.get(post_id)
+    if not d:
+        return counts
+    for field, key in (("like_count", "likeCount"), ("comment_count", "commentCount"), ("share_count", "shareCount")):
+        if d.get(field):
+            counts[key] = max(0, (counts.get(key) or 0) + d[field])
+    return counts
+
+
+def recover_orphans():
+    """进程中断残留的 counter:flushing:* 重新登记为待落库"""
+    r = _redis()
+    ids = []
+    for key in r.scan_iter(match=FLUSHING_KEY.format("*"), count=500):
+        key = key.decode() if isinstance(key, bytes) else key
+        try:
+            ids.append(int(key.rsplit(":", 1)[1]))
+        except ValueError:
+            continue
+    if ids:
+        r.sadd(DIRTY_KEY, *ids)
+    return len(ids)
+
+
+def flush(batch=FLUSH_BATCH):
+    """
+    取一批待落库的帖子，把增量写回 post 表。
+    :return: 本批处理的帖子数（0 表示没有待落库增量）
+    """
+    r = _redis()
+    post_ids = [int(x) for x in (r.spop(DIRTY_KEY, batch) or [])]
+    if not post_ids:
+        return 0
+    move = r.register_script(_MOVE_SCRIPT)
+    rows = []
+    for pid in post_ids:
+        raw = move(keys=[LIVE_KEY.format(pid), FLUSHING_KEY.format(pid)])
+        d = {}
+        for i in range(0, len(raw), 2):
+            k = raw[i].decode() if isinstance(raw[i], bytes) else raw[i]
+            d[k] = int(raw[i + 1])
+        rows.append((d.get("like_count", 0), d.get("comment_count", 0), d.get("share_count", 0), pid))
+    rows = [row for row in rows if any(row[:3])]
+    try:
+        if rows:
+            with transaction.atomic(), connection.cursor() as c:
+                c.executemany(
+                    "UPDATE post SET like_count = GREATEST(0, like_count + %s), "
+                    "comment_count = GREATEST(0, comment_count + %s), "
+                    "share_count = GREATEST(0, share_count + %s) WHERE id = %s",
+                    rows,
+                )
+    except Exception:
+        # 增量留在 flushing 中，重新登记下次再试
+        r.sadd(DIRTY_KEY, *post_ids)
+        raise
+    r.delete(*[FLUSHING_KEY.format(pid) for pid in post_ids])
+    from .hydration import invalidate_posts
+    invalidate_posts(post_ids)
+    # 点赞增量同时计入作者获赞数（user_stats），失败由 repair_user_stats 修正
+    from .user_stats import add_received_likes
+    try:
+        add_received_likes({pid: like for like, _, _, pid in rows})
+    except Exception as e:
+        logger.warning("累加作者获赞数失败: %s", e)
+    return len(post_ids)
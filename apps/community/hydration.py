@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+帖子列表组装（hydration）：按 post_id 批量取帖子主体、作者卡片、话题名与当前用户的点赞/收藏状态，
+输出与接口一致的帖子 dict。各列表接口只负责算出一页 id，其余统一走 hydrate_posts。
+- 帖子主体（已解析 media/topic/tags JSON）、作者卡片（昵称/头像 key）、话题名表缓存在 Redis，
+  一页用 cache.get_many 一次取回，未命中的再一次 id__in 回表并 set_many 回填
+- key 带 HYDRATE_VERSION，返回结构变化时升版本即整体失效；写操作（计数变化、删帖、改资料）调用 invalidate_* 删除对应条目
+- 点赞/收藏状态读每用户的 Redis 集合/位图（见 viewer_state.py），计数合并 Redis 中未落库的增量，媒体与头像整页一次批量签名
+"""
+import json
+import logging
+
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+HYDRATE_VERSION = 1
+POST_KEY = "hydrate:v%d:post:{}" % HYDRATE_VERSION
+USER_KEY = "hydrate:v%d:user:{}" % HYDRATE_VERSION
+TOPICS_KEY = "hydrate:v%d:topics" % HYDRATE_VERSION
+POST_TTL = 600
+USER_TTL = 1800
+TOPICS_TTL = 600
+
+
+def _json_list(raw):
+    if not raw:
+        return []
+    try:
+        value = json.loads(raw) if isinstance(raw, str) else raw
+    except Exception:
+        return []
+    return value if isinstance(value, list) else []
+
+
+def post_body(p):
+    """Post 模型 -> 可缓存的帖子主体（JSON 字段只在此解析一次）"""
+    return {
+        "id": p.id,
+        "userId": p.user_id,
+        "content": p.content or "",
+        "mediaType": p.media_type,
+        "media": _json_list(p.media_urls_json),
+        "covers": _json_list(getattr(p, "media_cover_urls_json", None)),
+        "topicIds": _json_list(p.topic_ids_json),
+        "tags": _json_list(getattr(p, "tags_json", None)),
+        "allowComment": bool(getattr(p, "allow_comment", 1)),
+        "locationCode": getattr(p, "location_code", None) or None,
+        "likeCount": p.like_count,
+        "commentCount": p.comment_count,
+        "shareCount": p.share_count,
+        "status": p.status,
+        "createdAt": p.created_at.isoformat() if p.created_at else None,
+    }
+
+
+def _cached_many(key_fmt, ids, load, ttl):
+    """按 id 批量读缓存，未命中的调用 load(missing_ids) -> {id: value} 回表并回填"""
+    ids = list(dict.fromkeys(i for i in ids if i))
+    if not ids:
+        return {}
+    keys = {key_fmt.format(i): i for i in ids}
+    try:
+        hits = cache.get_many(list(keys))
+    except Exception as e:
+        logger.warning("hydrate 读缓存失败: %s", e)
+        hits = {}
+    result = {keys[k]: v for k, v in hits.items()}
+    missing = [i for i in ids if i not in result]
+    if missing:
+        loaded = load(missing)
+        result.update(loaded)
+        if loaded:
+            try:
+                cache.set_many({key_fmt.format(i): v for i, v in loaded.items()}, timeout=ttl)
+            except Exception as e:
+                logger.warning("hydrate 写缓存失败: %s", e)
+    return result
+
+
+def _load_posts(ids):
+    from .models import Post
+    return {p.id: post_body(p) for p in Post.objects.filter(id__in=ids)}
+
+
+def _load_users(ids):
+    from apps.account.models import User
+    return {
+        u.id: {"nickname": u.nickname, "avatarUrl": u.avatar_url}
+        for u in User.objects.filter(id__in=ids).only("id", "nickname", "avatar_url")
+    }
+
+
+def post_bodies(ids):
+    """{post_id: 帖子主体}，含已下架帖子（status 由调用方判断）"""
+    return _cached_many(POST_KEY, ids, _load_posts, POST_TTL)
+
+
+def user_cards(ids):
+    """{user_id: {"nickname", "avatarUrl"}}，avatarUrl 为库中原值（object key）"""
+    return _cached_many(USER_KEY, ids, _load_users, USER_TTL)
+
+
+def topic_names():
+    """{topic_id: name}，仅启用中的话题"""
+    try:
+        names = cache.get(TOPICS_KEY)
+    except Exception:
+        names = None
+    if names is None:
+        from .models import Topic
+        names = dict(Topic.objects.filter(status=1).values_list("id", "name"))
+        try:
+            cache.set(TOPICS_KEY, names, timeout=TOPICS_TTL)
+        except Exception:
+            pass
+    return names
+
+
+def viewer_state(viewer_id, post_ids):
+    """当前用户对这批帖子的 (点赞集合, 收藏集合)：优先读 Redis（一次 pipeline），不可用时一次 UNION ALL 查库"""
+    if not viewer_id or not post_ids:
+        return set(), set()
+    from .viewer_state import flags
+    cached = flags(viewer_id, post_ids)
+    if cached is not None:
+        return cached
+    placeholders = ",".join(["%s"] * len(post_ids))
+    with connection.cursor() as c:
+        c.execute(
+            f"SELECT 'l', post_id FROM post_like WHERE user_id = %s AND post_id IN ({placeholders}) "
+            f"UNION ALL SELECT 'f', post_id FROM post_favorite WHERE user_id = %s AND post_id IN ({placeholders})",
+            [viewer_id] + list(post_ids) + [viewer_id] + list(post_ids),
+        )
+        rows = c.fetchall()
+    return {pid for kind, pid in rows if kind == "l"}, {pid for kind, pid in rows if kind == "f"}
+
+
+def post_counts(post_id):
+    """单个帖子的 {likeCount, commentCount, shareCount}，含 Redis 中未落库的增量"""
+    from .counters import apply_deltas, pending_deltas
+    body = post_bodies([post_id]).get(post_id) or {}
+    counts = {k: body.get(k) or 0 for k in ("likeCount", "commentCount", "shareCount")}
+    return apply_deltas(post_id, counts, pending_deltas([post_id]))
+
+
+def invalidate_posts(ids):
+    """帖子计数、状态或内容变化后调用"""
+    try:
+        cache.delete_many([POST_KEY.format(i) for i in ids if i])
+    except Exception as e:
+        logger.warning("hydrate 清理帖子缓存失败: %s", e)
+
+
+def invalidate_users(ids):
+    """昵称、头像变化后调用"""
+    try:
+        cache.delete_many([USER_KEY.format(i) for i in ids if i])
+    except Exception as e:
+        logger.warning("hydrate 清理用户缓存失败: %s", e)
+
+
+def invalidate_topics():
+    try:
+        cache.delete(TOPICS_KEY)
+    except Exception:
+        pass
+
+
+def _thumb_sources(body):
+    """与 media 一一对应的缩略图源：图文帖为图片本身，视频帖为对应封面"""
+    media, covers = body["media"], body["covers"]
+    if body["mediaType"] == "video":
+        return [covers[i] if i < len(covers) else None for i in range(len(media))]
+    return list(media)
+
+
+def media_url_map(bodies, cards):
+    """
+    整页帖子的媒体、封面、已生成的缩略图与作者头像一次批量签名，返回 {库中原值或 thumb key: 签名 URL}。
+    缩略图是否就绪按整页一次查询 media_job，未就绪的不进入 map，render_post 回退为原图。
+    """
+    from apps.system.media_jobs import JOB_THUMBNAIL, done_keys
+    from apps.system.oss_signer import refresh_url_map
+    from apps.system.thumbnails import THUMB_SIZES, thumb_key_for
+
+    values = []
+    sources = []
+    for body in bodies:
+        values.extend(body["media"])
+        values.extend(body["covers"])
+        sources.extend(s for s in _thumb_sources(body) if thumb_key_for(s, THUMB_SIZES[0]))
+    values.extend(card.get("avatarUrl") for card in cards.values() if card)
+    try:
+        ready = done_keys(JOB_THUMBNAIL, sources) if sources else set()
+    except Exception:
+        ready = set()
+    values.extend(thumb_key_for(s, size) for s in ready for size in THUMB_SIZES)
+    try:
+        return refresh_url_map(values)
+    except Exception:
+        return {}
+
+
+def _signed_thumb(url_map, src, size):
+    """已就绪且签名成功的缩略图 URL；签名失败时 map 中为原 key，不能直接给客户端，返回 None 回退原图"""
+    from apps.system.thumbnails import thumb_key_for
+    key = thumb_key_for(src, size)
+    url = url_map.get(key) if key else None
+    return url if url and url != key else None
+
+
+def render_post(body, card, topics, liked=False, favorited=False, url_map=None):
+    """帖子主体 + 作者卡片 -> 接口返回的帖子 dict"""
+    from apps.system.thumbnails import THUMB_SIZES, thumb_key_for
+
+    url_map = url_map or {}
+    card = card or {}
+    media_urls, media_cover_urls = body["media"], body["covers"]
+    thumb_urls = []
+    preview_urls = []
+    for m, src in zip(media_urls, _thumb_sources(body)):
+        fallback = url_map.get(src or m, src or m)
+        thumb_urls.append(_signed_thumb(url_map, src, THUMB_SIZES[0]) or fallback)
+        preview_urls.append(_signed_thumb(url_map, src, THUMB_SIZES[-1]) or fallback)
+    avatar_url = card.get("avatarUrl")
+    topic_list = [{"id": t, "name": topics[t]} for t in body["topicIds"] if t in topics]
+    return {
+        "id": body["id"],
+        "userId": body["userId"],
+        "nickname": card.get("nickname") or f"用户{body['userId']}",
+        "avatarUrl": url_map.get(avatar_url, avatar_url) if avatar_url else avatar_url,
+        "content": body["content"],
+        "mediaType": body["mediaType"],
+        "mediaUrls": [url_map.get(m, m) for m in media_urls],
+        "mediaCoverUrls": [url_map.get(m, m) for m in media_cover_urls],
+        "thumbUrls": thumb_urls,
+        "previewUrls": preview_urls,
+        "allowComment": body["allowComment"],
+        "locationCode": body["locationCode"],
+        "topicIds": [t["id"] for t in topic_list],
+        "topics": topic_list,
+        "tags": body["tags"],
+        "likeCount": body["likeCount"],
+        "commentCount": body["commentCount"],
+        "shareCount": body["shareCount"],
+        "liked": liked,
+        "favorited": favorited,
+        "createdAt": body["createdAt"],
+    }
+
+
+def hydrate_posts(ids, viewer_id=None):
+    """
+    按 ids 顺序组装帖子列表，跳过不存在或已下架的帖子。
+    :param ids: post_id 列表（一页）
+    :param viewer_id: 当前登录用户，用于点赞/收藏状态
+    """
+    bodies = post_bodies(ids)
+    ordered = [bodies[i] for i in dict.fromkeys(ids) if i in bodies and bodies[i]["status"] == 1]
+    if not ordered:
+        return []
+    cards = user_cards([b["userId"] for b in ordered])
+    topics = topic_names() if any(b["topicIds"] for b in ordered) else {}
+    post_ids = [b["id"] for b in ordered]
+    try:
+        liked_set, favorited_set = viewer_state(viewer_id, post_ids)
+    except Exception:
+        liked_set, favorited_set = set(), set()
+    # 计数 = 缓存中的库中值 + Redis 未落库增量（点赞等写后回写）
+    from .counters import apply_deltas, pending_deltas
+    deltas = pending_deltas(post_ids)
+    if deltas:
+        ordered = [apply_deltas(b["id"], dict(b), deltas) for b in ordered]
+    url_map = media_url_map(ordered, cards)
+    return [
+        render_post(
+            b, cards.get(b["userId"]), topics,
+            liked=b["id"] in liked_set, favorited=b["id"] in favorited_set, url_map=url_map,
+        )
+        for b in ordered
+    ]
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+回填地域字段：解析 user_profile.region_code 写入 region_province/region_city，
+再按作者地域（作者未设置时解析帖子 location_code）回填 post 的同名字段，供同城信息流使用。
+用法：python manage.py backfill_region --batch 1000
+需先执行 sql/migrate_region.sql；可重复执行，只处理尚未回填的行。
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.community.region import parse_region
+
+
+class Command(BaseCommand):
+    help = "回填用户资料与帖子的省/市字段（同城信息流）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="每批处理行数")
+
+    def handle(self, *args, **options):
+        batch = max(1, options["batch"])
+        self.stdout.write(f"用户资料回填 {self._backfill_profiles(batch)} 行")
+        self.stdout.write(f"帖子回填 {self._backfill_posts(batch)} 行")
+
+    def _backfill_profiles(self, batch):
+        total = 0
+        last_id = 0
+        while True:
+            with connection.cursor() as c:
+                c.execute(
+                    "SELECT user_id, region_code FROM user_profile "
+                    "WHERE user_id > %s AND region_code IS NOT NULL AND region_code <> '' "
+                    "AND region_province IS NULL AND region_city IS NULL "
+                    "ORDER BY user_id LIMIT %s",
+                    [last_id, batch],
+                )
+                rows = c.fetchall()
+                if not rows:
+                    break
+                updates = []
+                for user_id, region_code in rows:
+                    province, city = parse_region(region_code)
+                    if province or city:
+                        updates.append((province, city, user_id))
+                if updates:
+                    c.executemany(
+                        "UPDATE user_profile SET region_province = %s, region_city = %s WHERE user_id = %s",
+                        updates,
+                    )
+                    total += len(updates)
+            last_id = rows[-1][0]
+        return total
+
+    def _backfill_posts(self, batch):
+        total = 0
+        last_id = 0
+        while True:
+            with connection.cursor() as c:
+                c.execute(
+                    "SELECT p.id, p.location_code, up.region_province, up.region_city, up.region_code "
+                    "FROM post p LEFT JOIN user_profile up ON up.user_id = p.user_id "
+                    "WHERE p.id > %s AND p.region_province IS NULL AND p.region_city IS NULL "
+                    "ORDER BY p.id LIMIT %s",
+                    [last_id, batch],
+                )
+                rows = c.fetchall()
+                if not rows:
+                    break
+                updates = []
+                for post_id, location_code, u_province, u_city, u_code in rows:
+                    province, city = u_province, u_city
+                    if not province and not city:
+                        province, city = parse_region(u_code)
+                    if not province and not city:
+                        province, city = parse_region(location_code)
+                    if province or city:
+                        updates.append((province, city, post_id))
+                if updates:
+                    c.executemany(
+                        "UPDATE post SET region_province = %s, region_city = %s WHERE id = %s",
+                        updates,
+                    )
+                    total += len(updates)
+            last_id = rows[-1][0]
+        return total
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+帖子搜索基准：在独立表 bench_post 中生成合成帖子，对比 LIKE 与 FULLTEXT(ngram) 在不同数据量下的查询延迟。
+用法：python manage.py bench_post_search --sizes 100000,1000000 --queries 30
+不读写线上 post 表；默认结束后删除 bench_post（--keep 保留）。百万级生成与建索引需数分钟。
+"""
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from apps.community.search import boolean_query
+
+TABLE = "bench_post"
+INSERT_BATCH = 5000
+# 词表按常见程度排列，生成内容时按 1/rank 加权，既有高频词也有长尾词
+WORDS = (
+    "今天", "养生", "分享", "大家", "身体", "感觉", "八字", "运势", "喜用神", "五行", "调理", "睡眠",
+    "饮食", "中医", "气血", "体质", "湿气", "祛湿", "艾灸", "穴位", "经络", "阴虚", "阳虚", "脾胃",
+    "命理", "流年", "大运", "财运", "桃花", "事业", "风水", "节气", "立春", "冬至", "茶饮", "药膳",
+    "红豆薏米", "八段锦", "太极拳", "推拿", "针灸", "黄帝内经", "伤寒论", "本草纲目", "易经", "梅花易数",
+)
+TAGS = ("养生", "命理", "中医", "食疗", "运势", "风水", "节气", "经络")
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+class Command(BaseCommand):
+    help = "对比帖子搜索 LIKE 与 FULLTEXT 在不同数据量下的延迟"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100000,1000000", help="逗号分隔的数据量，依次递增生成")
+        parser.add_argument("--queries", type=int, default=30, help="每种查询执行次数")
+        parser.add_argument("--keep", action="store_true", help="结束后保留 bench_post 表")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(x) for x in options["sizes"].split(",") if x.strip())
+        rng = random.Random(42)
+        self._create_table()
+        try:
+            for size in sizes:
+                self._fill(size, rng)
+                self._report(size, options["queries"])
+        finally:
+            if not options["keep"]:
+                with connection.cursor() as c:
+                    c.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+    def _create_table(self):
+        with connection.cursor() as c:
+            c.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            c.execute(
+                f"""
+                CREATE TABLE {TABLE} (
+                    `id` BIGINT NOT NULL AUTO_INCREMENT,
+                    `status` TINYINT NOT NULL DEFAULT 1,
+                    `content` TEXT DEFAULT NULL,
+                    `tags_json` VARCHAR(500) DEFAULT NULL,
+                    `created_at` DATETIME NOT NULL,
+                    PRIMARY KEY (`id`),
+                    KEY `idx_status_created_id` (`status`, `created_at`, `id`)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """
+            )
+
+    def _fill(self, size, rng):
+        """补足到 size 行；批量写入前先去掉全文索引，写完再重建"""
+        with connection.cursor() as c:
+            c.execute(f"SELECT COUNT(*) FROM {TABLE}")
+            current = c.fetchone()[0]
+            c.execute(
+                "SELECT COUNT(*) FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = 'ft_content_tags'",
+                [TABLE],
+            )
+            if c.fetchone()[0]:
+                c.execute(f"ALTER TABLE {TABLE} DROP INDEX ft_content_tags")
+        weights = [1.0 / (i + 1) for i in range(len(WORDS))]
+        now = timezone.now()
+        started = time.monotonic()
+        while current < size:
+            n = min(INSERT_BATCH, size - current)
+            rows = []
+            for _ in range(n):
+                content = "，".join(rng.choices(WORDS, weights=weights, k=rng.randint(8, 40)))
+                tags = rng.sample(TAGS, rng.randint(0, 3))
+                created = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+                rows.append((content, json.dumps(tags, ensure_ascii=False) if tags else None, created))
+            with connection.cursor() as c:
+                c.executemany(
+                    f"INSERT INTO {TABLE} (content, tags_json, created_at) VALUES (%s, %s, %s)", rows
+                )
+            current += n
+        with connection.cursor() as c:
+            c.execute(f"ALTER TABLE {TABLE} ADD FULLTEXT KEY ft_content_tags (content, tags_json) WITH PARSER ngram")
+        self.stdout.write(f"\n== {size} 行（生成+建索引 {time.monotonic() - started:.1f}s）")
+
+    def _time(self, sql, params, times):
+        samples = []
+        for _ in range(times):
+            t0 = time.perf_counter()
+            with connection.cursor() as c:
+                c.execute(sql, params)
+                c.fetchall()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return samples
+
+    def _report(self, size, times):
+        # 高频词（LIKE 按时间倒序很快凑满一页）与长尾词（LIKE 需扫描大部分表）分别测
+        cases = [("高频词", WORDS[1]), ("长尾词", WORDS[-1])]
+        for label, kw in cases:
+            q = boolean_query(kw)
+            like = f"%{kw}%"
+            queries = [
+                (
+                    "LIKE 按时间",
+                    f"SELECT id FROM {TABLE} WHERE status = 1 AND (content LIKE %s OR tags_json LIKE %s) "
+                    "ORDER BY created_at DESC, id DESC LIMIT 21",
+                    [like, like],
+                ),
+                (
+                    "FULLTEXT 按相关度",
+                    f"SELECT id, MATCH(content, tags_json) AGAINST (%s IN BOOLEAN MODE) AS score FROM {TABLE} "
+                    "WHERE status = 1 AND MATCH(content, tags_json) AGAINST (%s IN BOOLEAN MODE) "
+                    "ORDER BY score DESC, id DESC LIMIT 21",
+                    [q, q],
+                ),
+                (
+                    "FULLTEXT 按时间",
+                    f"SELECT id FROM {TABLE} WHERE status = 1 AND MATCH(content, tags_json) AGAINST (%s IN BOOLEAN MODE) "
+                    "ORDER BY created_at DESC, id DESC LIMIT 21",
+                    [q],
+                ),
+            ]
+            for name, sql, params in queries:
+                samples = self._time(sql, params, times)
+                self.stdout.write(
+                    f"{label}「{kw}」 {name}: p50 {statistics.median(samples):.1f}ms "
+                    f"p95 {_percentile(samples, 0.95):.1f}ms avg {statistics.mean(samples):.1f}ms"
+                )
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+帖子计数回写：把 Redis 中累加的点赞/评论/分享增量按帖子合并后写回 post 表。
+用法：python manage.py flush_post_counters --interval 5
+生产环境用 systemd 常驻（单实例即可）；--once 处理完当前增量后退出。
+"""
+import logging
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.community import counters
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "把 Redis 中的帖子计数增量回写到 MySQL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=5, help="两轮回写的间隔秒数")
+        parser.add_argument("--once", action="store_true", help="回写完当前增量后退出")
+
+    def handle(self, *args, **options):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(1))
+        try:
+            recovered = counters.recover_orphans()
+            if recovered:
+                self.stdout.write(f"重新登记 {recovered} 个未完成回写的帖子")
+        except Exception as e:
+            logger.warning("检查未完成回写失败: %s", e)
+        while not stopping:
+            close_old_connections()
+            total = 0
+            try:
+                while True:
+                    n = counters.flush()
+                    total += n
+                    if n < counters.FLUSH_BATCH:
+                        break
+            except Exception as e:
+                logger.warning("帖子计数回写失败: %s", e)
+            if total:
+                self.stdout.write(f"回写 {total} 个帖子的计数")
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+互动通知消费者：从 Redis Stream notify:events 批量读取事件，合并点赞等同类通知后写入 notification 表。
+用法：python manage.py notification_consumer --batch 200
+生产环境用 systemd 常驻，可多开实例（同一消费组内事件不会重复分配）；同一主机多开时用 --name 区分且保持固定。
+"""
+import logging
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.community import notify
+
+logger = logging.getLogger(__name__)
+
+CLAIM_INTERVAL = 60
+MAX_BACKOFF = 30
+
+
+class Command(BaseCommand):
+    help = "消费互动通知事件并批量写入数据库"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=200, help="每批读取的事件数")
+        parser.add_argument("--name", default=None, help="同一主机多开实例时区分消费者名，需固定不变")
+        parser.add_argument("--once", action="store_true", help="处理完当前积压事件后退出")
+
+    def handle(self, *args, **options):
+        batch = max(1, options["batch"])
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(1))
+        r = notify._redis()
+        notify.ensure_group(r)
+        consumer = notify.consumer_name(options["name"])
+        self.stdout.write(f"notification_consumer 启动：{consumer}")
+        # 先接管其它已停止消费者的未确认事件，再与自己上次中断时已读取未确认的一起重放
+        pending = True
+        next_claim = 0
+        backoff = 0
+        while not stopping:
+            close_old_connections()
+            try:
+                if time.monotonic() >= next_claim:
+                    if notify.claim_idle(r, consumer):
+                        pending = True
+                    next_claim = time.monotonic() + CLAIM_INTERVAL
+                n = notify.consume(r, consumer, count=batch, block_ms=5000, pending=pending)
+            except Exception as e:
+                logger.warning("通知事件处理失败: %s", e)
+                if options["once"]:
+                    break
+                # 失败的批次仍在 pending 中，退避后重新读取
+                pending = True
+                backoff = min(MAX_BACKOFF, backoff * 2 or 1)
+                time.sleep(backoff)
+                continue
+            backoff = 0
+            if n:
+                self.stdout.write(f"写入 {n} 条通知事件")
+            elif pending:
+                pending = False
+                continue
+            elif options["once"]:
+                break
+        self.stdout.write("notification_consumer 退出")
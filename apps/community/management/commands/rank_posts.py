@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+推荐流离线打分：对最近几天的帖子按时间衰减、互动速度、话题热度打分，写入 Redis 预排序列表。
+用法：python manage.py rank_posts（建议 cron 每 5 分钟执行一次）
+"""
+from django.core.management.base import BaseCommand
+
+from apps.community import ranking
+
+
+class Command(BaseCommand):
+    help = "计算推荐信息流排序并写入 Redis"
+
+    def handle(self, *args, **options):
+        scored = ranking.compute_scores()
+        version = ranking.publish_ranking(scored)
+        self.stdout.write(f"推荐流已更新：版本 {version}，共 {len(scored)} 条")
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+通知未读数对账：用 MySQL 中的未读 COUNT 覆盖 Redis 中已缓存用户的未读数。
+用法：python manage.py reconcile_unread_counts（建议 cron 每小时执行；缓存本身 1 小时过期也会自动重算）
+"""
+from django.core.management.base import BaseCommand
+
+from apps.community import unread
+
+
+class Command(BaseCommand):
+    help = "对账 Redis 通知未读数与数据库"
+
+    def handle(self, *args, **options):
+        n = unread.reconcile()
+        self.stdout.write(f"已对账 {n} 个用户的未读数")
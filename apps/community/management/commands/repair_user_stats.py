@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+用户统计计数修复：按 user_follow / post 源表重算 user_stats，覆盖增量维护产生的偏差。
+用法：python manage.py repair_user_stats [--user-id 123]（建议 cron 每天执行一次）
+"""
+from django.core.management.base import BaseCommand
+
+from apps.community import user_stats
+
+
+class Command(BaseCommand):
+    help = "按源表重算用户关注/粉丝/发帖/获赞计数"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, default=None, help="只重算指定用户")
+        parser.add_argument("--batch", type=int, default=500, help="每批用户数")
+
+    def handle(self, *args, **options):
+        n = user_stats.repair(batch=options["batch"], user_id=options["user_id"])
+        self.stdout.write(f"已重算 {n} 个用户的统计计数")
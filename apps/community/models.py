@@ -25,6 +25,8 @@ class Post(models.Model):
     topic_ids_json = models.CharField(max_length=500, null=True, blank=True)
     tags_json = models.CharField(max_length=500, null=True, blank=True)  # 自定义标签名 JSON 数组
     location_code = models.CharField(max_length=32, null=True, blank=True)
+    region_province = models.CharField(max_length=16, null=True, blank=True)  # 发帖时作者所在省（短名），同城流用
+    region_city = models.CharField(max_length=16, null=True, blank=True)  # 发帖时作者所在市（短名）
     visibility = models.SmallIntegerField(default=1)
     allow_comment = models.SmallIntegerField(default=1)
     status = models.SmallIntegerField(default=1)
@@ -75,6 +77,17 @@ class PostFavorite(models.Model):
         managed = False
 
 
+class PostTopic(models.Model):
+    """联合主键 (topic_id, post_id)，表无 id 列。created_at 冗余帖子发布时间，话题页按此游标分页。"""
+    topic_id = models.BigIntegerField(primary_key=True)
+    post_id = models.BigIntegerField()
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "post_topic"
+        managed = False
+
+
 class UserFollow(models.Model):
     """联合主键 (user_id, target_user_id)，表无 id 列。"""
     user_id = models.BigIntegerField(primary_key=True)
@@ -95,6 +108,8 @@ class Notification(models.Model):
     comment_id = models.BigIntegerField(null=True, blank=True)
     content_snippet = models.CharField(max_length=255, null=True, blank=True)
     read = models.SmallIntegerField(default=0)
+    agg_count = models.IntegerField(default=1)  # 合并的触发人数（点赞等按帖子合并，按人去重），from_user_id 为最近一次触发人
+    event_id = models.CharField(max_length=32, null=True, blank=True)  # Redis Stream 事件 id，重放去重
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -117,6 +132,20 @@ class SystemNotification(models.Model):
         managed = False
 
 
+class BroadcastNotification(models.Model):
+    """全员系统通知（平台公告）：只存一行，读时与 system_notification 合并，已读水位见 user_broadcast_state"""
+    type = models.CharField(max_length=32)  # announcement
+    title = models.CharField(max_length=255)
+    content = models.TextField(null=True, blank=True)
+    extra_json = models.CharField(max_length=1024, null=True, blank=True)
+    status = models.SmallIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "broadcast_notification"
+        managed = False
+
+
 class Report(models.Model):
     id = models.BigAutoField(primary_key=True)
     reporter_id = models.BigIntegerField()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+互动通知异步管道：请求内只 XADD 一条事件到 Redis Stream，notification_consumer 批量落库，点赞等请求不再同步写通知表。
+- 事件流 notify:events，消费组 notify-consumers，处理成功后 XACK；消费者名按主机固定（同机多开用 --name 区分），
+  重启后先重放自己未确认的事件，并定期 XAUTOCLAIM 其它已停止消费者超时未确认的事件（至少一次）
+- 点赞/收藏/分享按 (接收人, 类型, 帖子) 合并：AGG_WINDOW 内已有未读的同类通知时更新为最新触发人，
+  触发人记入 notification_actor，agg_count 只按新出现的人累加，列表展示为 "A 等 38 人赞了你的帖子"；评论每条单独一条通知
+- 重放幂等：评论通知带事件 id（notification.event_id 唯一），合并通知按人去重，XACK 失败后重放不会重复写入或重复计未读
+- Redis 不可用时 publish 返回 False，调用方回退为同步写库
+"""
+import logging
+import socket
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "notify:events"
+GROUP = "notify-consumers"
+STREAM_MAXLEN = 100000
+CLAIM_MIN_IDLE_MS = 5 * 60 * 1000
+AGG_TYPES = ("like", "favorite", "share")
+AGG_WINDOW = timedelta(hours=1)
+FIELDS = ("user_id", "type", "from_user_id", "post_id", "comment_id", "content_snippet")
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def publish(user_id, ntype, from_user_id, post_id, comment_id=None, content_snippet=None):
+    """投递一条互动通知事件；成功返回 True"""
+    try:
+        _redis().xadd(
+            STREAM_KEY,
+            {
+                "user_id": user_id,
+                "type": ntype,
+                "from_user_id": from_user_id,
+                "post_id": post_id,
+                "comment_id": comment_id or "",
+                "content_snippet": (content_snippet or "")[:255],
+            },
+            maxlen=STREAM_MAXLEN,
+            approximate=True,
+        )
+        return True
+    except Exception as e:
+        logger.warning("投递通知事件失败，改为同步写入: %s", e)
+        return False
+
+
+def consumer_name(name=None):
+    """消费者名需跨重启保持不变，否则上个进程未确认的事件不会被重放"""
+    return f"{socket.gethostname()}-{name}" if name else socket.gethostname()
+
+
+def claim_idle(r, consumer, min_idle_ms=CLAIM_MIN_IDLE_MS, count=200):
+    """把其它消费者超过 min_idle_ms 未确认的事件转到 consumer 名下（之后按 pending 重放），返回转移的条数"""
+    claimed = 0
+    start = "0-0"
+    while True:
+        resp = r.xautoclaim(STREAM_KEY, GROUP, consumer, min_idle_ms, start_id=start, count=count, justid=True)
+        start, ids = resp[0], resp[1]
+        claimed += len(ids)
+        if start in (b"0-0", "0-0"):
+            return claimed
+
+
+def ensure_group(r):
+    try:
+        r.xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+    except Exception as e:
+        # 消费组已存在
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _decode(fields):
+    event = {}
+    for k, v in fields.items():
+        k = k.decode() if isinstance(k, bytes) else k
+        event[k] = v.decode() if isinstance(v, bytes) else v
+    for k in ("user_id", "from_user_id", "post_id", "comment_id"):
+        event[k] = int(event[k]) if event.get(k) else None
+    event["content_snippet"] = event.get("content_snippet") or None
+    return event
+
+
+def add_actors(notification_id, actor_ids):
+    """记录合并通知的触发人，返回其中新出现的人数"""
+    with connection.cursor() as c:
+        c.executemany(
+            "INSERT IGNORE INTO notification_actor (notification_id, actor_id) VALUES (%s, %s)",
+            [(notification_id, a) for a in actor_ids],
+        )
+        return max(0, c.rowcount or 0)
+
+
+def write_batch(events):
+    """
+    把一批事件写入 notification 表：可合并的按 (接收人, 类型, 帖子) 合并并按人去重，其余按事件 id 去重后 bulk_create。
+    返回写入/更新的通知数
+    """
+    from .models import Notification
+
+    now = timezone.now()
+    plain = []
+    groups = {}
+    for e in events:
+        if not e.get("user_id") or not e.get("from_user_id") or e["user_id"] == e["from_user_id"]:
+            continue
+        if e["type"] in AGG_TYPES:
+            actors = groups.setdefault((e["user_id"], e["type"], e["post_id"]), [])
+            if e["from_user_id"] in actors:
+                actors.remove(e["from_user_id"])
+            actors.append(e["from_user_id"])
+        else:
+            plain.append(Notification(
+                user_id=e["user_id"], type=e["type"], from_user_id=e["from_user_id"], post_id=e["post_id"],
+                comment_id=e["comment_id"], content_snippet=e["content_snippet"], read=0, agg_count=1,
+                event_id=e.get("event_id"),
+            ))
+    created = []
+    updated = []
+    with transaction.atomic():
+        # 重放的事件已写入过，跳过
+        event_ids = [n.event_id for n in plain if n.event_id]
+        if event_ids:
+            done = set(Notification.objects.filter(event_id__in=event_ids).values_list("event_id", flat=True))
+            plain = [n for n in plain if n.event_id not in done]
+        existing = {}
+        if groups:
+            cond = Q()
+            for user_id, ntype, post_id in groups:
+                cond |= Q(user_id=user_id, type=ntype, post_id=post_id)
+            rows = (
+                Notification.objects.filter(cond, read=0, created_at__gte=now - AGG_WINDOW)
+                .order_by("id")
+                .values_list("id", "user_id", "type", "post_id")
+            )
+            for nid, user_id, ntype, post_id in rows:
+                existing[(user_id, ntype, post_id)] = nid
+        for key, actors in groups.items():
+            user_id, ntype, post_id = key
+            if key in existing:
+                nid = existing[key]
+                added = add_actors(nid, actors)
+                Notification.objects.filter(id=nid).update(
+                    agg_count=F("agg_count") + added, from_user_id=actors[-1], created_at=now,
+                )
+                updated.append(user_id)
+            else:
+                n = Notification.objects.create(
+                    user_id=user_id, type=ntype, from_user_id=actors[-1], post_id=post_id,
+                    read=0, agg_count=len(actors),
+                )
+                add_actors(n.id, actors)
+                created.append(n)
+        if plain:
+            Notification.objects.bulk_create(plain, ignore_conflicts=True)
+    created += plain
+    # 合并进已有未读通知的不改变未读数，只有新插入的行计入
+    new_per_user = {}
+    for n in created:
+        new_per_user[n.user_id] = new_per_user.get(n.user_id, 0) + 1
+    from .unread import incr_many
+    incr_many("interaction", new_per_user)
+    from apps.im.realtime import push
+    push([n.user_id for n in created] + updated, "notification", {"category": "interaction"})
+    return len(created) + len(updated)
+
+
+def consume(r, consumer, count=200, block_ms=5000, pending=False):
+    """
+    读取并处理一批事件。pending=True 时重放本消费者已读未确认的事件。
+    :return: 处理的事件数
+    """
+    resp = r.xreadgroup(GROUP, consumer, {STREAM_KEY: "0" if pending else ">"}, count=count, block=None if pending else block_ms)
+    if not resp:
+        return 0
+    _, messages = resp[0]
+    messages = [(mid, fields) for mid, fields in messages if fields]
+    if not messages:
+        return 0
+    events = []
+    for mid, fields in messages:
+        event = _decode(fields)
+        event["event_id"] = mid.decode() if isinstance(mid, bytes) else mid
+        events.append(event)
+    write_batch(events)
+    r.xack(STREAM_KEY, GROUP, *[mid for mid, _ in messages])
+    return len(messages)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+帖子列表的游标（keyset）分页：按 (created_at, id) 倒序，下一页条件为 (created_at, id) < 游标，
+走 (status, created_at, id) 索引范围扫描，翻得再深也不产生 OFFSET 扫描，新帖插入也不会导致重复/漏读。
+游标格式 "<created_at 秒级时间戳>,<id>"，接口返回 nextCursor，客户端下一页传 cursor=nextCursor。
+未传 cursor 时仍兼容旧客户端的 page 参数（OFFSET 分页）。
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Q
+
+
+def encode_cursor(created_at, row_id):
+    """(created_at, id) -> 游标字符串"""
+    if created_at is None or row_id is None:
+        return None
+    return f"{int(created_at.timestamp())},{row_id}"
+
+
+def decode_cursor(raw):
+    """游标字符串 -> (aware datetime, id)，格式错误返回 None"""
+    if not raw or not isinstance(raw, str):
+        return None
+    try:
+        ts, row_id = raw.split(",", 1)
+        return datetime.fromtimestamp(int(ts), tz=dt_timezone.utc), int(row_id)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def page_params(request, default_size=20, max_size=30):
+    """读取 (cursor, page, page_size)；cursor 优先，page 仅在没有 cursor 时使用"""
+    cursor = decode_cursor((request.GET.get("cursor") or "").strip())
+    try:
+        page = max(1, int(request.GET.get("page") or 1))
+    except (TypeError, ValueError):
+        page = 1
+    try:
+        page_size = min(max_size, max(1, int(request.GET.get("page_size") or default_size)))
+    except (TypeError, ValueError):
+        page_size = default_size
+    return cursor, page, page_size
+
+
+def keyset_page(qs, cursor, page, page_size, time_field="created_at", id_field="id"):
+    """
+    对 queryset 按 (time_field, id_field) 倒序取一页。
+    :return: (rows, has_more, next_cursor)
+    """
+    qs = qs.order_by(f"-{time_field}", f"-{id_field}")
+    if cursor:
+        c_time, c_id = cursor
+        qs = qs.filter(Q(**{f"{time_field}__lt": c_time}) | Q(**{time_field: c_time, f"{id_field}__lt": c_id}))
+        rows = list(qs[: page_size + 1])
+    else:
+        start = (page - 1) * page_size
+        rows = list(qs[start : start + page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_field), getattr(last, id_field))
+    return rows, has_more, next_cursor
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+推荐信息流（recommend tab）：离线打分 + Redis 预排序列表。
+- rank_posts 命令定时（建议每 5 分钟）对最近 RANK_WINDOW_DAYS 天的帖子打分，
+  写入新版本有序集合 feed:rank:<ver>，再切换 feed:rank:current 指向新版本
+- 旧版本保留 RANK_VERSION_TTL，正在翻页的客户端游标 "rank:<ver>:<offset>" 继续读同一版本，不会重复/漏读
+- 接口按 offset 取一页 id 后批量回表，单次请求成本与帖子总量无关；无排序结果或 Redis 不可用时调用方回退为按时间
+- 排序列表只含窗口内前 RANK_MAX 条，读完后按时间接续，游标切换为 "rank-tail:<ver>:<ts>,<id>"，
+  跳过该版本排序列表中已出现的帖子；游标中的版本已过期时从当前版本 offset 0 重新开始
+分数 = 时间衰减 × (1 + 互动速度项 + 话题热度项)：
+- 时间衰减：RANK_HALF_LIFE_HOURS 半衰期的指数衰减
+- 互动速度：(点赞 + 2×评论 + 3×分享) / (发帖小时数 + 2)，取 log1p 抑制头部
+- 话题热度：帖子所属话题 heat_score 最大值，按全站最热话题归一化到 0~1
+"""
+import json
+import logging
+import math
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+RANK_KEY = "feed:rank:{}"
+RANK_TAIL_PREFIX = "rank-tail:"
+RANK_CURRENT_KEY = "feed:rank:current"
+RANK_WINDOW_DAYS = 7
+RANK_MAX = 2000
+RANK_VERSION_TTL = 3600
+RANK_HALF_LIFE_HOURS = 24.0
+WEIGHT_VELOCITY = 1.0
+WEIGHT_TOPIC_HEAT = 0.5
+SCAN_BATCH = 2000
+# 按时间接续时每次回表的行数（跳过排序列表中已出现的帖子）
+TAIL_SCAN_BATCH = 200
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def _topic_heat():
+    """{topic_id: 0~1 归一化热度}"""
+    with connection.cursor() as c:
+        c.execute("SELECT id, heat_score FROM topic WHERE status = 1 AND heat_score > 0")
+        rows = c.fetchall()
+    if not rows:
+        return {}
+    top = max(math.log1p(h) for _, h in rows) or 1.0
+    return {tid: math.log1p(h) / top for tid, h in rows}
+
+
+def score_post(age_hours, like_count, comment_count, share_count, topic_heat=0.0):
+    age_hours = max(0.0, age_hours)
+    decay = 0.5 ** (age_hours / RANK_HALF_LIFE_HOURS)
+    engagement = (like_count or 0) + 2 * (comment_count or 0) + 3 * (share_count or 0)
+    velocity = engagement / (age_hours + 2.0)
+    return decay * (1.0 + WEIGHT_VELOCITY * math.log1p(velocity) + WEIGHT_TOPIC_HEAT * topic_heat)
+
+
+def compute_scores(now=None):
+    """对窗口内公开帖子打分，返回按分数倒序的前 RANK_MAX 个 (post_id, score)"""
+    now = now or timezone.now()
+    since = now - timedelta(days=RANK_WINDOW_DAYS)
+    heat = _topic_heat()
+    scored = []
+    last_id = 0
+    while True:
+        with connection.cursor() as c:
+            c.execute(
+                "SELECT id, created_at, like_count, comment_count, share_count, topic_ids_json FROM post "
+                "WHERE status = 1 AND created_at >= %s AND id > %s ORDER BY id LIMIT %s",
+                [since, last_id, SCAN_BATCH],
+            )
+            rows = c.fetchall()
+        for post_id, created_at, likes, comments, shares, topic_ids_json in rows:
+            topic_heat = 0.0
+            if topic_ids_json and heat:
+                try:
+                    topic_ids = json.loads(topic_ids_json) or []
+                    topic_heat = max((heat.get(int(t), 0.0) for t in topic_ids), default=0.0)
+                except Exception:
+                    pass
+            if created_at is not None and timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+            age_hours = (now - created_at).total_seconds() / 3600.0 if created_at else RANK_WINDOW_DAYS * 24
+            scored.append((post_id, score_post(age_hours, likes, comments, shares, topic_heat)))
+        if len(rows) < SCAN_BATCH:
+            break
+        last_id = rows[-1][0]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:RANK_MAX]
+
+
+def publish_ranking(scored):
+    """写入新版本排序列表并切换 current；返回版本号"""
+    r = _redis()
+    version = str(int(time.time()))
+    key = RANK_KEY.format(version)
+    pipe = r.pipeline()
+    pipe.delete(key)
+    if scored:
+        pipe.zadd(key, {str(post_id): score for post_id, score in scored})
+    pipe.expire(key, RANK_VERSION_TTL)
+    pipe.set(RANK_CURRENT_KEY, version)
+    pipe.execute()
+    return version
+
+
+def encode_rank_cursor(version, offset):
+    return f"rank:{version}:{offset}"
+
+
+def decode_rank_cursor(raw):
+    """"rank:<ver>:<offset>" -> (ver, offset)，格式不符返回 None"""
+    if not raw or not isinstance(raw, str) or not raw.startswith("rank:"):
+        return None
+    try:
+        _, version, offset = raw.split(":", 2)
+        return version, max(0, int(offset))
+    except (TypeError, ValueError):
+        return None
+
+
+def encode_rank_tail_cursor(version, position):
+    """排序列表读完后按时间接续的游标；position 为 (created_at, id)，None 表示从最新开始"""
+    return f"{RANK_TAIL_PREFIX}{version}:{encode_cursor(*position) if position else ''}"
+
+
+def decode_rank_tail_cursor(raw):
+    """"rank-tail:<ver>:<ts>,<id>" -> (ver, (created_at, id) 或 None)，格式不符返回 None"""
+    if not raw or not isinstance(raw, str) or not raw.startswith(RANK_TAIL_PREFIX):
+        return None
+    version, _, position = raw[len(RANK_TAIL_PREFIX):].partition(":")
+    if not version:
+        return None
+    if not position:
+        return version, None
+    position = decode_cursor(position)
+    return (version, position) if position else None
+
+
+def ranked_post_ids(version=None, offset=0, limit=20):
+    """
+    从预排序列表取一页 post_id。
+    version 为游标中的版本；已过期时改读当前版本并从 offset 0 重新开始（旧 offset 在新版本中不对应同一位置）。
+    :return: (ids, version, offset, has_more)；尚无排序结果或 Redis 不可用时返回 None
+    """
+    try:
+        r = _redis()
+        current = r.get(RANK_CURRENT_KEY)
+        current = current.decode() if isinstance(current, bytes) else current
+        if version and version != current:
+            if r.exists(RANK_KEY.format(version)):
+                r.expire(RANK_KEY.format(version), RANK_VERSION_TTL)
+            else:
+                version, offset = current, 0
+        else:
+            version = current
+        if not version:
+            return None
+        key = RANK_KEY.format(version)
+        ids = [int(x) for x in r.zrevrange(key, offset, offset + limit)]
+    except Exception as e:
+        logger.warning("推荐流读取失败: %s", e)
+        return None
+    if not ids and offset == 0:
+        return None
+    return ids[:limit], version, offset, len(ids) > limit
+
+
+def rank_size(version):
+    """该版本排序列表的长度；Redis 不可用返回 0"""
+    try:
+        return _redis().zcard(RANK_KEY.format(version))
+    except Exception:
+        return 0
+
+
+def ranked_members(version, post_ids):
+    """post_ids 中出现在该版本排序列表里的 id 集合（按时间接续时去重）；版本已过期或 Redis 不可用返回空集"""
+    if not version or not post_ids:
+        return set()
+    key = RANK_KEY.format(version)
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for pid in post_ids:
+            pipe.zscore(key, pid)
+        pipe.expire(key, RANK_VERSION_TTL)
+        scores = pipe.execute()[:-1]
+    except Exception as e:
+        logger.warning("推荐流去重读取失败: %s", e)
+        return set()
+    return {pid for pid, score in zip(post_ids, scores) if score is not None}
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+地域规范化：把定位文本（如 "湖北省 武汉市"、"广东 深圳"、"北京市"）解析为 (省, 市) 短名，
+写入 user_profile / post 的 region_province、region_city，同城信息流据此走索引等值查询。
+"""
+import re
+
+# 省级行政区短名（直辖市、特别行政区省市同名）
+PROVINCES = (
+    "北京", "天津", "上海", "重庆", "河北", "山西", "辽宁", "吉林", "黑龙江", "江苏", "浙江", "安徽",
+    "福建", "江西", "山东", "河南", "湖北", "湖南", "广东", "海南", "四川", "贵州", "云南", "陕西",
+    "甘肃", "青海", "台湾", "内蒙古", "广西", "西藏", "宁夏", "新疆", "香港", "澳门",
+)
+MUNICIPALITIES = ("北京", "天津", "上海", "重庆", "香港", "澳门")
+
+_SUFFIXES = (
+    "壮族自治区", "回族自治区", "维吾尔自治区", "特别行政区", "自治区", "自治州", "地区", "盟", "省", "市",
+)
+_IGNORED = ("中国", "本地", "内网", "未知", "局域网")
+_SPLIT_RE = re.compile(r"[\s|·,，/\-]+")
+# 市级名称止于第一个 市/州/盟，其后为区县（"武汉市洪山区" -> "武汉市"）
+_CITY_RE = re.compile(r"^.+?[市州盟]")
+
+
+def _short_name(token):
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) > len(suffix):
+            return token[: -len(suffix)]
+    return token
+
+
+def _split_province(token):
+    """"湖北省武汉市" 这类未分隔的文本拆为 ("湖北", "武汉市")；不以省名开头返回 (None, token)"""
+    for name in PROVINCES:
+        if token.startswith(name):
+            rest = token[len(name):]
+            for suffix in _SUFFIXES:
+                if rest.startswith(suffix):
+                    rest = rest[len(suffix):]
+                    break
+            return name, rest
+    return None, token
+
+
+def _city_name(token):
+    """"武汉市洪山区" -> "武汉"；不含 市/州/盟 时整体取短名"""
+    m = _CITY_RE.match(token)
+    return _short_name(m.group(0) if m else token)[:16] or None
+
+
+def parse_region(text):
+    """
+    解析定位文本为 (province, city)，无法识别的部分为 None。
+    例："湖北省 武汉市" -> ("湖北", "武汉")；"湖北省武汉市洪山区" -> ("湖北", "武汉")；
+    "广东省 广州市天河区" -> ("广东", "广州")；"内蒙古锡林郭勒盟" -> ("内蒙古", "锡林郭勒")；
+    "北京市 朝阳区" -> ("北京", "北京")；"深圳" -> (None, "深圳")
+    """
+    if not text or not isinstance(text, str):
+        return None, None
+    tokens = [t for t in _SPLIT_RE.split(text.strip()) if t and t not in _IGNORED]
+    province = None
+    city = None
+    for token in tokens:
+        if province is None:
+            found, rest = _split_province(token)
+            if found:
+                province = found
+                # 直辖市/特别行政区的下一级为区，同城按市匹配
+                if found in MUNICIPALITIES:
+                    city = found
+                token = rest
+        if token and city is None:
+            city = _city_name(token)
+    return province, city
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+帖子/用户搜索：MySQL FULLTEXT 索引（ngram 分词，支持中文），替代 LIKE '%kw%' 全表扫描。
+- post.content + post.tags_json 建 ft_post_content_tags，user.nickname 建 ft_user_nickname（见 sql/migrate_search_fulltext.sql）
+- 关键词按空白切分，每段作为短语 +"..." 以 BOOLEAN MODE 匹配（ngram 下短语即连续 n 元组全部命中）
+- 排序：relevance 按 MATCH 得分倒序，游标为 "r:<offset>"（相关度无稳定的键，限制最大深度）；
+  latest 按 (created_at, id) 倒序，游标与其它帖子列表一致
+- 关键词短于 ngram_token_size（默认 2）或未建全文索引时，调用方回退为 LIKE
+"""
+import logging
+import re
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+NGRAM_TOKEN_SIZE = 2
+RELEVANCE_MAX_OFFSET = 1000
+POST_MATCH = "MATCH(content, tags_json) AGAINST (%s IN BOOLEAN MODE)"
+USER_MATCH = "MATCH(nickname) AGAINST (%s IN BOOLEAN MODE)"
+
+# BOOLEAN MODE 运算符，出现在用户输入中时去掉
+_OPERATORS_RE = re.compile(r'[+\-<>()~*"@]+')
+
+
+def boolean_query(keyword):
+    """关键词 -> BOOLEAN MODE 查询串；任一片段短于 ngram 长度时返回 None（全文索引无法命中）"""
+    tokens = [t for t in _OPERATORS_RE.sub(" ", keyword or "").split() if t]
+    if not tokens or any(len(t) < NGRAM_TOKEN_SIZE for t in tokens):
+        return None
+    return " ".join(f'+"{t}"' for t in tokens)
+
+
+def encode_relevance_cursor(offset):
+    return f"r:{offset}"
+
+
+def decode_relevance_cursor(raw):
+    if not raw or not isinstance(raw, str) or not raw.startswith("r:"):
+        return None
+    try:
+        return max(0, int(raw[2:]))
+    except ValueError:
+        return None
+
+
+def _tag_filter(tag):
+    if not tag:
+        return "", []
+    return " AND JSON_CONTAINS(tags_json, JSON_QUOTE(%s))", [tag]
+
+
+def search_post_ids_by_relevance(query, tag=None, offset=0, limit=20):
+    """
+    按相关度取一页帖子 id。
+    :return: (ids, has_more, next_cursor)
+    """
+    offset = min(offset, RELEVANCE_MAX_OFFSET)
+    tag_sql, tag_params = _tag_filter(tag)
+    with connection.cursor() as c:
+        c.execute(
+            f"SELECT id, {POST_MATCH} AS score FROM post "
+            f"WHERE status = 1 AND {POST_MATCH}{tag_sql} "
+            "ORDER BY score DESC, id DESC LIMIT %s, %s",
+            [query, query] + tag_params + [offset, limit + 1],
+        )
+        ids = [row[0] for row in c.fetchall()]
+    has_more = len(ids) > limit and offset + limit < RELEVANCE_MAX_OFFSET
+    ids = ids[:limit]
+    return ids, has_more, (encode_relevance_cursor(offset + limit) if has_more else None)
+
+
+def post_latest_queryset(query, tag=None):
+    """按时间排序时的 queryset（配合 keyset_page）"""
+    from .models import Post
+    where = [POST_MATCH]
+    params = [query]
+    if tag:
+        where.append("JSON_CONTAINS(tags_json, JSON_QUOTE(%s))")
+        params.append(tag)
+    return Post.objects.filter(status=1).extra(where=where, params=params)
+
+
+def search_user_ids(query, offset=0, limit=20):
+    """昵称全文检索，按相关度倒序"""
+    with connection.cursor() as c:
+        c.execute(
+            f"SELECT id, {USER_MATCH} AS score FROM `user` "
+            f"WHERE status = 1 AND {USER_MATCH} ORDER BY score DESC, id DESC LIMIT %s, %s",
+            [query, query, offset, limit],
+        )
+        return [row[0] for row in c.fetchall()]
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+关注信息流（follow tab）：写扩散收件箱 + 大 V 读时拉取。
+- 每个用户一个 Redis 有序集合 timeline:inbox:<uid>，member/score 均为 post_id（自增，与发帖时间同序），
+  只保留最近 INBOX_MAX 条；收件箱不存在时读时从库重建，INBOX_TTL 内无访问自动过期
+- 发帖时把 post_id 推入作者所有粉丝的收件箱（只推已存在的收件箱，不活跃用户不占内存）
+- 粉丝数 >= CELEB_FOLLOWERS 的作者记入 timeline:celebs，不做写扩散，读时按关注的大 V 拉取后归并
+- 删帖/下架不主动清理收件箱，读时回表按 status=1 过滤
+"""
+import logging
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+INBOX_KEY = "timeline:inbox:{}"
+CELEBS_KEY = "timeline:celebs"
+INBOX_MAX = 800
+INBOX_TTL = 7 * 86400
+CELEB_FOLLOWERS = 5000
+FANOUT_BATCH = 500
+# 空收件箱占位 member，保证“已重建但没有帖子”的收件箱也存在
+EMPTY_MEMBER = "0"
+
+# 仅当收件箱存在时写入并截断，KEYS 为收件箱，ARGV: post_id, 保留条数
+_PUSH_SCRIPT = """
+local n = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('ZADD', key, ARGV[1], ARGV[1])
+        redis.call('ZREMRANGEBYRANK', key, 0, -(tonumber(ARGV[2]) + 2))
+        n = n + 1
+    end
+end
+return n
+"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def _follower_count(author_id):
+    with connection.cursor() as c:
+        c.execute("SELECT COUNT(*) FROM user_follow WHERE target_user_id = %s", [author_id])
+        return (c.fetchone() or (0,))[0]
+
+
+def fan_out(post_id, author_id):
+    """发帖后写扩散到粉丝收件箱；大 V 只登记到 timeline:celebs。失败只记日志，读时会回表兜底"""
+    try:
+        r = _redis()
+        if _follower_count(author_id) >= CELEB_FOLLOWERS:
+            r.sadd(CELEBS_KEY, author_id)
+            return
+        r.srem(CELEBS_KEY, author_id)
+        push = r.register_script(_PUSH_SCRIPT)
+        last_id = 0
+        while True:
+            with connection.cursor() as c:
+                c.execute(
+                    "SELECT user_id FROM user_follow WHERE target_user_id = %s AND user_id > %s "
+                    "ORDER BY user_id LIMIT %s",
+                    [author_id, last_id, FANOUT_BATCH],
+                )
+                follower_ids = [row[0] for row in c.fetchall()]
+            if not follower_ids:
+                break
+            push(keys=[INBOX_KEY.format(uid) for uid in follower_ids], args=[post_id, INBOX_MAX])
+            last_id = follower_ids[-1]
+            if len(follower_ids) < FANOUT_BATCH:
+                break
+    except Exception as e:
+        logger.warning("关注流写扩散失败 post=%s: %s", post_id, e)
+
+
+def _recent_post_ids(author_id, limit=INBOX_MAX):
+    with connection.cursor() as c:
+        c.execute(
+            "SELECT id FROM post WHERE user_id = %s AND status = 1 ORDER BY id DESC LIMIT %s",
+            [author_id, limit],
+        )
+        return [row[0] for row in c.fetchall()]
+
+
+def on_follow(user_id, target_user_id):
+    """关注后把对方最近的帖子并入收件箱（收件箱不存在时不处理，读时重建）"""
+    try:
+        r = _redis()
+        key = INBOX_KEY.format(user_id)
+        if not r.exists(key):
+            return
+        ids = _recent_post_ids(target_user_id)
+        if ids:
+            pipe = r.pipeline()
+            pipe.zadd(key, {str(i): i for i in ids})
+            pipe.zremrangebyrank(key, 0, -(INBOX_MAX + 2))
+            pipe.execute()
+    except Exception as e:
+        logger.warning("关注流合并失败 %s->%s: %s", user_id, target_user_id, e)
+
+
+def on_unfollow(user_id, target_user_id):
+    """取关后从收件箱移除对方的帖子"""
+    try:
+        r = _redis()
+        key = INBOX_KEY.format(user_id)
+        if not r.exists(key):
+            return
+        ids = _recent_post_ids(target_user_id)
+        if ids:
+            r.zrem(key, *[str(i) for i in ids])
+    except Exception as e:
+        logger.warning("关注流移除失败 %s->%s: %s", user_id, target_user_id, e)
+
+
+def _rebuild_inbox(r, user_id):
+    """冷启动：从库取关注的人最近 INBOX_MAX 条帖子写入收件箱"""
+    with connection.cursor() as c:
+        c.execute(
+            "SELECT p.id FROM post p INNER JOIN user_follow f ON f.target_user_id = p.user_id "
+            "WHERE f.user_id = %s AND p.status = 1 ORDER BY p.id DESC LIMIT %s",
+            [user_id, INBOX_MAX],
+        )
+        ids = [row[0] for row in c.fetchall()]
+    key = INBOX_KEY.format(user_id)
+    pipe = r.pipeline()
+    pipe.delete(key)
+    mapping = {str(i): i for i in ids}
+    mapping[EMPTY_MEMBER] = 0
+    pipe.zadd(key, mapping)
+    pipe.expire(key, INBOX_TTL)
+    pipe.execute()
+
+
+def _followed_celebs(r, user_id):
+    celebs = [int(x) for x in (r.smembers(CELEBS_KEY) or [])]
+    if not celebs:
+        return []
+    with connection.cursor() as c:
+        c.execute(
+            "SELECT target_user_id FROM user_follow WHERE user_id = %s AND target_user_id IN ("
+            + ",".join(["%s"] * len(celebs)) + ")",
+            [user_id] + celebs,
+        )
+        return [row[0] for row in c.fetchall()]
+
+
+def follow_post_ids(user_id, before_id=None, offset=0, limit=20):
+    """
+    关注流一页的 post_id（倒序）：收件箱 ZREVRANGEBYSCORE 与关注的大 V 最近帖子归并。
+    before_id 为游标（上一页最后一条 id），offset 仅用于兼容 page 参数。
+    :return: 最多 offset + limit 条之后的 limit 个候选 id（调用方回表过滤已删帖）；Redis 不可用时返回 None
+    """
+    try:
+        r = _redis()
+        key = INBOX_KEY.format(user_id)
+        if not r.exists(key):
+            _rebuild_inbox(r, user_id)
+        else:
+            r.expire(key, INBOX_TTL)
+        max_score = f"({before_id}" if before_id else "+inf"
+        want = offset + limit
+        inbox_ids = [int(x) for x in r.zrevrangebyscore(key, max_score, "(0", start=0, num=want)]
+        celeb_ids = _followed_celebs(r, user_id)
+    except Exception as e:
+        logger.warning("关注流读取失败 user=%s: %s", user_id, e)
+        return None
+    pulled = []
+    if celeb_ids:
+        with connection.cursor() as c:
+            sql = (
+                "SELECT id FROM post WHERE status = 1 AND user_id IN (" + ",".join(["%s"] * len(celeb_ids)) + ")"
+                + (" AND id < %s" if before_id else "")
+                + " ORDER BY id DESC LIMIT %s"
+            )
+            c.execute(sql, celeb_ids + ([before_id] if before_id else []) + [want])
+            pulled = [row[0] for row in c.fetchall()]
+    merged = sorted(set(inbox_ids) | set(pulled), reverse=True)
+    return merged[offset:want]
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+通知未读数缓存：每个用户一个 Redis Hash notify:unread:<uid>，字段 interaction（互动通知）/ system（逐用户的系统通知），
+以及全员公告的已读水位 bc_mark 与注册时间 joined（公告未读数按 broadcast.active_broadcasts 读时计算，发布公告无需逐用户累加）。
+- 读：一次 HMGET；不存在时按 MySQL COUNT 重建，UNREAD_TTL 后过期重新统计（定期对账）
+- 写：新通知落库后 incr（仅 key 已存在时累加，不存在的下次读时从库统计）；标记已读时按实际更新行数扣减，全部已读置 0
+- reconcile_unread_counts 命令可主动对账当前缓存中的所有用户
+Redis 不可用时回退为直接 COUNT。
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+UNREAD_KEY = "notify:unread:{}"
+UNREAD_TTL = 3600
+FIELDS = ("interaction", "system", "bc_mark", "joined")
+
+# 仅 key 存在时累加，结果不小于 0。KEYS: hash；ARGV: field, delta
+_INCR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+local v = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+if v < 0 then
+    redis.call('HSET', KEYS[1], ARGV[1], 0)
+    v = 0
+end
+return v
+"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def count_from_db(user_id):
+    from .broadcast import user_state
+    from .models import Notification, SystemNotification
+    bc_mark, joined = user_state(user_id)
+    return {
+        "interaction": Notification.objects.filter(user_id=user_id, read=0).count(),
+        "system": SystemNotification.objects.filter(user_id=user_id, read=0).count(),
+        "bc_mark": bc_mark,
+        "joined": joined,
+    }
+
+
+def _store(r, user_id, counts):
+    key = UNREAD_KEY.format(user_id)
+    pipe = r.pipeline()
+    pipe.hset(key, mapping=counts)
+    pipe.expire(key, UNREAD_TTL)
+    pipe.execute()
+
+
+def state(user_id):
+    """缓存的原始字段 {"interaction", "system", "bc_mark", "joined"}"""
+    try:
+        r = _redis()
+        values = r.hmget(UNREAD_KEY.format(user_id), *FIELDS)
+        if all(v is not None for v in values):
+            return {f: max(0, int(v)) for f, v in zip(FIELDS, values)}
+    except Exception as e:
+        logger.warning("读取未读数缓存失败 user=%s: %s", user_id, e)
+        return count_from_db(user_id)
+    counts = count_from_db(user_id)
+    try:
+        _store(r, user_id, counts)
+    except Exception:
+        pass
+    return counts
+
+
+def get(user_id):
+    """{"interaction": n, "system": n}，system 含未读的全员公告"""
+    from .broadcast import unread_count
+    s = state(user_id)
+    return {"interaction": s["interaction"], "system": s["system"] + unread_count(s["bc_mark"], s["joined"])}
+
+
+def incr_many(field, deltas):
+    """deltas: {user_id: 增量}，一个 pipeline 完成；key 不存在的用户跳过"""
+    deltas = {uid: d for uid, d in deltas.items() if uid and d}
+    if not deltas:
+        return
+    try:
+        r = _redis()
+        script = r.register_script(_INCR_SCRIPT)
+        pipe = r.pipeline()
+        for uid, d in deltas.items():
+            script(keys=[UNREAD_KEY.format(uid)], args=[field, d], client=pipe)
+        pipe.execute()
+    except Exception as e:
+        # 计数可能已偏差，删除后下次读时从库统计
+        logger.warning("更新未读数缓存失败: %s", e)
+        reset(*deltas.keys())
+
+
+def incr(user_id, field, delta=1):
+    incr_many(field, {user_id: delta})
+
+
+def clear(user_id, field):
+    """全部标记已读后置 0"""
+    try:
+        r = _redis()
+        key = UNREAD_KEY.format(user_id)
+        if r.exists(key):
+            r.hset(key, field, 0)
+    except Exception as e:
+        logger.warning("清零未读数缓存失败 user=%s: %s", user_id, e)
+        reset(user_id)
+
+
+def reset(*user_ids):
+    """删除缓存，下次读取时从库统计"""
+    if not user_ids:
+        return
+    try:
+        _redis().delete(*[UNREAD_KEY.format(uid) for uid in user_ids])
+    except Exception:
+        pass
+
+
+def reconcile(batch=500):
+    """对账：用库中 COUNT 覆盖所有已缓存用户的未读数，返回处理的用户数"""
+    r = _redis()
+    user_ids = []
+    for key in r.scan_iter(match=UNREAD_KEY.format("*"), count=batch):
+        key = key.decode() if isinstance(key, bytes) else key
+        try:
+            user_ids.append(int(key.rsplit(":", 1)[1]))
+        except ValueError:
+            continue
+    for uid in user_ids:
+        _store(r, uid, count_from_db(uid))
+    return len(user_ids)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+用户统计计数（关注数/粉丝数/发帖数/获赞数）反范式存储在 user_stats 表，主页与 me 一次主键查询取回，不再每次 COUNT/SUM。
+- 关注/取关、发帖、删帖/下架/恢复时 incr 增量更新；获赞数随帖子点赞计数落库（counters.flush）一并累加
+- 只更新已有行：没有行的用户在首次读取时从源表统计并写入
+- repair_user_stats 命令按源表重算覆盖，修正增量更新的偏差
+获赞数口径与原先一致：该用户正常状态帖子的 like_count 之和（不含 Redis 中尚未落库的点赞）。
+"""
+import logging
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("follow_count", "follower_count", "post_count", "received_like_count")
+
+_UPSERT_SQL = (
+    "INSERT INTO user_stats (user_id, follow_count, follower_count, post_count, received_like_count, updated_at) "
+    "VALUES (%s, %s, %s, %s, %s, NOW()) ON DUPLICATE KEY UPDATE "
+    "follow_count = VALUES(follow_count), follower_count = VALUES(follower_count), "
+    "post_count = VALUES(post_count), received_like_count = VALUES(received_like_count), updated_at = NOW()"
+)
+
+
+def compute(user_ids):
+    """按源表统计 {user_id: {field: n}}"""
+    user_ids = list(dict.fromkeys(user_ids))
+    stats = {uid: dict.fromkeys(FIELDS, 0) for uid in user_ids}
+    if not user_ids:
+        return stats
+    placeholders = ",".join(["%s"] * len(user_ids))
+    with connection.cursor() as c:
+        c.execute(
+            f"SELECT user_id, COUNT(*) FROM user_follow WHERE user_id IN ({placeholders}) GROUP BY user_id",
+            user_ids,
+        )
+        for uid, n in c.fetchall():
+            stats[uid]["follow_count"] = n
+        c.execute(
+            f"SELECT target_user_id, COUNT(*) FROM user_follow WHERE target_user_id IN ({placeholders}) GROUP BY target_user_id",
+            user_ids,
+        )
+        for uid, n in c.fetchall():
+            stats[uid]["follower_count"] = n
+        c.execute(
+            f"SELECT user_id, COUNT(*), COALESCE(SUM(like_count), 0) FROM post "
+            f"WHERE user_id IN ({placeholders}) AND status = 1 GROUP BY user_id",
+            user_ids,
+        )
+        for uid, n, likes in c.fetchall():
+            stats[uid]["post_count"] = n
+            stats[uid]["received_like_count"] = int(likes)
+    return stats
+
+
+def _store(stats):
+    with connection.cursor() as c:
+        c.executemany(_UPSERT_SQL, [
+            (uid, s["follow_count"], s["follower_count"], s["post_count"], s["received_like_count"])
+            for uid, s in stats.items()
+        ])
+
+
+def get(user_id):
+    """{"followCount", "followerCount", "postCount", "likeCount"}"""
+    with connection.cursor() as c:
+        c.execute(
+            "SELECT follow_count, follower_count, post_count, received_like_count FROM user_stats WHERE user_id = %s",
+            [user_id],
+        )
+        row = c.fetchone()
+    if row:
+        s = dict(zip(FIELDS, row))
+    else:
+        s = compute([user_id])[user_id]
+        try:
+            _store({user_id: s})
+        except Exception as e:
+            logger.warning("写入用户统计失败 user=%s: %s", user_id, e)
+    return {
+        "followCount": s["follow_count"],
+        "followerCount": s["follower_count"],
+        "postCount": s["post_count"],
+        "likeCount": s["received_like_count"],
+    }
+
+
+def incr(user_id, **deltas):
+    """按增量更新一个用户的计数，如 incr(uid, post_count=1)；结果不小于 0"""
+    deltas = {f: d for f, d in deltas.items() if d}
+    if not user_id or not deltas:
+        return
+    if any(f not in FIELDS for f in deltas):
+        raise ValueError(list(deltas))
+    sets = ", ".join(f"{f} = GREATEST(0, {f} + %s)" for f in deltas)
+    try:
+        with connection.cursor() as c:
+            c.execute(
+                f"UPDATE user_stats SET {sets}, updated_at = NOW() WHERE user_id = %s",
+                list(deltas.values()) + [user_id],
+            )
+    except Exception as e:
+        logger.warning("更新用户统计失败 user=%s: %s", user_id, e)
+
+
+def add_received_likes(post_deltas):
+    """帖子点赞数变化 {post_id: 增量} 按作者汇总计入获赞数（仅正常状态的帖子）"""
+    post_deltas = {pid: d for pid, d in post_deltas.items() if d}
+    if not post_deltas:
+        return
+    placeholders = ",".join(["%s"] * len(post_deltas))
+    with connection.cursor() as c:
+        c.execute(f"SELECT id, user_id FROM post WHERE id IN ({placeholders}) AND status = 1", list(post_deltas))
+        per_user = {}
+        for pid, uid in c.fetchall():
+            per_user[uid] = per_user.get(uid, 0) + post_deltas[pid]
+    for uid, d in per_user.items():
+        incr(uid, received_like_count=d)
+
+
+def on_post_status(post, active):
+    """帖子删除/下架（active=False）或恢复（True）后调用，调整作者的发帖数与获赞数"""
+    sign = 1 if active else -1
+    incr(post.user_id, post_count=sign, received_like_count=sign * (post.like_count or 0))
+
+
+def repair(batch=500, user_id=None):
+    """按源表重算 user_stats，返回处理的用户数。user_id 为空时重算所有已有统计行的用户"""
+    if user_id:
+        _store(compute([user_id]))
+        return 1
+    total = 0
+    last_id = 0
+    while True:
+        with connection.cursor() as c:
+            c.execute(
+                "SELECT user_id FROM user_stats WHERE user_id > %s ORDER BY user_id LIMIT %s",
+                [last_id, batch],
+            )
+            ids = [row[0] for row in c.fetchall()]
+        if not ids:
+            break
+        _store(compute(ids))
+        total += len(ids)
+        last_id = ids[-1]
+    return total
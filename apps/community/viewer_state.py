@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+当前用户对帖子的点赞/收藏状态（列表中的 liked / favorited）：每个用户一份 Redis 结构，一页帖子一次 pipeline 判断。
+- 普通用户：Set viewer:<kind>:<uid>，成员为 post_id，占位成员 "0" 表示已预热（空集合也存在）
+- 重度用户（超过 SET_MAX 条）：Bitmap viewer:<kind>:bm:<uid>，第 post_id 位为 1 表示已点赞/收藏，第 0 位为预热标记；
+  Set 在成员多时退化为哈希表，位图按 post_id 上限定长，对大量点赞的用户更省内存
+- 首次访问时从 MySQL 懒加载（按主键 (user_id, post_id) 扫描），VIEWER_TTL 内无访问过期
+- 点赞/收藏切换时调用 on_toggle，仅在结构已预热时同步修改，未预热的下次从库加载
+Redis 不可用时 flags 返回 None，调用方回退为查库。
+"""
+import logging
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+KINDS = {"like": "post_like", "fav": "post_favorite"}
+SET_KEY = "viewer:{}:{}"
+BITMAP_KEY = "viewer:{}:bm:{}"
+WARM_MEMBER = "0"
+SET_MAX = 2000
+VIEWER_TTL = 7 * 86400
+
+# 已预热时同步修改。KEYS: set, bitmap；ARGV: post_id, 1 加入 / 0 移除
+_TOGGLE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    if ARGV[2] == '1' then
+        redis.call('SADD', KEYS[1], ARGV[1])
+    else
+        redis.call('SREM', KEYS[1], ARGV[1])
+    end
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('SETBIT', KEYS[2], ARGV[1], tonumber(ARGV[2]))
+end
+return 1
+"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def _warm(r, kind, user_id):
+    """从库加载该用户全部已点赞/收藏的 post_id 写入 Redis，返回 id 集合"""
+    with connection.cursor() as c:
+        c.execute(f"SELECT post_id FROM {KINDS[kind]} WHERE user_id = %s", [user_id])
+        ids = {row[0] for row in c.fetchall()}
+    pipe = r.pipeline()
+    if len(ids) > SET_MAX:
+        key = BITMAP_KEY.format(kind, user_id)
+        pipe.delete(key)
+        pipe.setbit(key, 0, 1)
+        for pid in ids:
+            pipe.setbit(key, pid, 1)
+    else:
+        key = SET_KEY.format(kind, user_id)
+        pipe.delete(key)
+        pipe.sadd(key, WARM_MEMBER, *ids)
+    pipe.expire(key, VIEWER_TTL)
+    pipe.execute()
+    return ids
+
+
+def flags(user_id, post_ids):
+    """
+    (已点赞 post_id 集合, 已收藏 post_id 集合)。
+    两种结构在同一个 pipeline 中判断，只有未预热的用户额外查一次库。Redis 不可用返回 None
+    """
+    post_ids = [int(pid) for pid in dict.fromkeys(post_ids)]
+    if not user_id or not post_ids:
+        return set(), set()
+    try:
+        r = _redis()
+        pipe = r.pipeline()
+        for kind in KINDS:
+            set_key = SET_KEY.format(kind, user_id)
+            for pid in [WARM_MEMBER] + post_ids:
+                pipe.sismember(set_key, pid)
+            bitfield = pipe.bitfield(BITMAP_KEY.format(kind, user_id))
+            for pid in [0] + post_ids:
+                bitfield.get("u1", pid)
+            bitfield.execute()
+        for kind in KINDS:
+            # 续期放在同一 pipeline 末尾，不存在的 key 无影响
+            pipe.expire(SET_KEY.format(kind, user_id), VIEWER_TTL)
+            pipe.expire(BITMAP_KEY.format(kind, user_id), VIEWER_TTL)
+        results = pipe.execute()
+        out = []
+        n = len(post_ids) + 1
+        for i, kind in enumerate(KINDS):
+            in_set = results[i * (n + 1): i * (n + 1) + n]
+            in_bitmap = results[i * (n + 1) + n] or [0] * n
+            if in_set[0]:
+                hit = {pid for pid, ok in zip(post_ids, in_set[1:]) if ok}
+            elif in_bitmap[0]:
+                hit = {pid for pid, ok in zip(post_ids, in_bitmap[1:]) if ok}
+            else:
+                hit = _warm(r, kind, user_id) & set(post_ids)
+            out.append(hit)
+        return out[0], out[1]
+    except Exception as e:
+        logger.warning("读取点赞/收藏状态失败 user=%s: %s", user_id, e)
+        return None
+
+
+def on_toggle(kind, user_id, post_id, added):
+    """点赞/收藏切换后同步 Redis（未预热时不处理）"""
+    try:
+        r = _redis()
+        r.register_script(_TOGGLE_SCRIPT)(
+            keys=[SET_KEY.format(kind, user_id), BITMAP_KEY.format(kind, user_id)],
+            args=[post_id, 1 if added else 0],
+        )
+    except Exception as e:
+        logger.warning("同步点赞/收藏状态失败 user=%s post=%s: %s", user_id, post_id, e)
+        # 同步失败时删除，下次从库重新加载，避免状态不一致
+        try:
+            _redis().delete(SET_KEY.format(kind, user_id), BITMAP_KEY.format(kind, user_id))
+        except Exception:
+            pass
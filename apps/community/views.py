@@ -5,7 +5,7 @@ import json
 import re
 from django.conf import settings
 from django.db import connection
-from django.db.models import Q, F, Sum
+from django.db.models import Q, F
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
@@ -13,9 +13,18 @@ from rest_framework.response import Response
 
 from apps.account.models import User
 from apps.account.session_store import get_user_id_by_token
+from apps.system.media_jobs import JOB_THUMBNAIL, enqueue_many
+from apps.system.oss_signer import refresh_url_map, to_object_key
 from apps.system.oss_upload import refresh_oss_url_if_applicable
 from apps.system.views import get_ip_location_for_request
-from .models import Topic, Post, Comment, PostLike, PostFavorite, UserFollow, Report, Notification, SystemNotification
+from . import broadcast, counters, notify, unread, user_stats, viewer_state
+from .hydration import hydrate_posts, invalidate_posts, post_bodies, post_counts
+from .pagination import decode_cursor, keyset_page, page_params
+from .ranking import TAIL_SCAN_BATCH, decode_rank_cursor, decode_rank_tail_cursor, encode_rank_cursor, encode_rank_tail_cursor, rank_size, ranked_members, ranked_post_ids
+from .search import boolean_query, decode_relevance_cursor, post_latest_queryset, search_post_ids_by_relevance, search_user_ids
+from .region import parse_region
+from .timeline import fan_out, follow_post_ids, on_follow, on_unfollow
+from .models import Topic, Post, Comment, PostFavorite, PostTopic, UserFollow, Report, Notification, SystemNotification
 
 
 def _result(code=0, message="success", data=None):
@@ -23,11 +32,13 @@ def _result(code=0, message="success", data=None):
 
 
 def _create_notification(user_id, ntype, from_user_id, post_id, comment_id=None, content_snippet=None):
-    """给帖子作者发互动通知，不给自己发"""
+    """给帖子作者发互动通知，不给自己发；投递到 Redis Stream 由 notification_consumer 异步落库，Redis 不可用时同步写入"""
     if user_id == from_user_id:
         return
     snippet = (content_snippet or "")[:255]
-    Notification.objects.create(
+    if notify.publish(user_id, ntype, from_user_id, post_id, comment_id=comment_id, content_snippet=snippet):
+        return
+    n = Notification.objects.create(
         user_id=user_id,
         type=ntype,
         from_user_id=from_user_id,
@@ -36,6 +47,10 @@ def _create_notification(user_id, ntype, from_user_id, post_id, comment_id=None,
         content_snippet=snippet or None,
         read=0,
     )
+    if ntype in notify.AGG_TYPES:
+        # 之后由消费者合并进来时按人去重
+        notify.add_actors(n.id, [from_user_id])
+    unread.incr(user_id, "interaction")
 
 
 def _user_id_from_request(request):
@@ -46,69 +61,6 @@ def _user_id_from_request(request):
     return None
 
 
-def _topics_for_ids(ids):
-    if not ids:
-        return []
-    qs = Topic.objects.filter(id__in=ids, status=1)
-    return [{"id": t.id, "name": t.name} for t in qs]
-
-
-def _post_item(p, u, topic_list, liked=False, favorited=False):
-    media_urls = []
-    if p.media_urls_json:
-        try:
-            media_urls = json.loads(p.media_urls_json) if isinstance(p.media_urls_json, str) else p.media_urls_json
-        except Exception:
-            pass
-    media_cover_urls = []
-    if getattr(p, "media_cover_urls_json", None):
-        try:
-            media_cover_urls = json.loads(p.media_cover_urls_json) if isinstance(p.media_cover_urls_json, str) else p.media_cover_urls_json
-        except Exception:
-            pass
-    # 若启用 OSS 且为私有读，每次返回帖子时用新签名替换过期 URL，避免 403
-    if getattr(settings, "ALIYUN_OSS_ENABLED", False) and getattr(settings, "ALIYUN_OSS_BUCKET", ""):
-        try:
-            from apps.system.oss_upload import refresh_signed_url
-            expires = getattr(settings, "ALIYUN_OSS_SIGNED_URL_EXPIRES", 604800)
-            bucket = settings.ALIYUN_OSS_BUCKET
-            endpoint = getattr(settings, "ALIYUN_OSS_ENDPOINT", "oss-cn-beijing.aliyuncs.com")
-            cred = getattr(settings, "ALIYUN_OSS_CREDENTIAL_FILE", "")
-            media_urls = [refresh_signed_url(u, bucket, endpoint, cred, expires) if u else u for u in (media_urls or [])]
-            media_cover_urls = [refresh_signed_url(u, bucket, endpoint, cred, expires) if u else u for u in (media_cover_urls or [])]
-        except Exception:
-            pass
-    avatar_url_out = refresh_oss_url_if_applicable(getattr(u, "avatar_url", None))
-    tags = []
-    if getattr(p, "tags_json", None):
-        try:
-            tags = json.loads(p.tags_json) if isinstance(p.tags_json, str) else p.tags_json
-        except Exception:
-            pass
-    allow_comment = getattr(p, "allow_comment", 1)
-    return {
-        "id": p.id,
-        "userId": p.user_id,
-        "nickname": getattr(u, "nickname", None) or f"用户{p.user_id}",
-        "avatarUrl": avatar_url_out,
-        "content": p.content or "",
-        "mediaType": p.media_type,
-        "mediaUrls": media_urls,
-        "mediaCoverUrls": media_cover_urls if isinstance(media_cover_urls, list) else [],
-        "allowComment": bool(allow_comment),
-        "locationCode": getattr(p, "location_code", None) or None,
-        "topicIds": topic_list and [t["id"] for t in topic_list] or [],
-        "topics": topic_list or [],
-        "tags": tags if isinstance(tags, list) else [],
-        "likeCount": p.like_count,
-        "commentCount": p.comment_count,
-        "shareCount": p.share_count,
-        "liked": liked,
-        "favorited": favorited,
-        "createdAt": p.created_at.isoformat() if p.created_at else None,
-    }
-
-
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def topic_list(request):
@@ -121,18 +73,138 @@ def topic_list(request):
     return Response(_result(data=data))
 
 
+def _bump_count(post_id, field, delta):
+    """帖子计数变化：Redis 累加增量由 flush_post_counters 回写；Redis 不可用时直接 UPDATE"""
+    if counters.incr(post_id, field, delta):
+        return
+    Post.objects.filter(id=post_id).update(**{field: F(field) + delta})
+    invalidate_posts([post_id])
+    if field == "like_count":
+        user_stats.add_received_likes({post_id: delta})
+
+
+def _user_region(user_id):
+    """用户资料中的 (省, 市)；未解析过的老数据现场解析 region_code"""
+    try:
+        with connection.cursor() as c:
+            c.execute(
+                "SELECT region_province, region_city, region_code FROM user_profile WHERE user_id = %s",
+                [user_id],
+            )
+            row = c.fetchone()
+    except Exception:
+        return None, None
+    if not row:
+        return None, None
+    if row[0] or row[1]:
+        return row[0], row[1]
+    return parse_region(row[2])
+
+
+def _recommend_tail_page(version, position, limit):
+    """推荐流排序列表读完后按时间接续：从 position 起取 limit 条，跳过该版本排序列表中已出现的帖子"""
+    qs = Post.objects.filter(status=1).only("id", "created_at")
+    picked = []
+    more = True
+    while more and len(picked) < limit:
+        rows, more, _ = keyset_page(qs, position, 1, TAIL_SCAN_BATCH)
+        served = ranked_members(version, [p.id for p in rows])
+        for i, p in enumerate(rows):
+            position = (p.created_at, p.id)
+            if p.id in served:
+                continue
+            picked.append(p.id)
+            if len(picked) == limit:
+                more = more or i < len(rows) - 1
+                break
+    return picked, more, (encode_rank_tail_cursor(version, position) if more else None)
+
+
+def _recommend_feed_page(request, page, page_size):
+    """
+    推荐流一页：(post_ids, has_more, next_cursor)，先从离线排序列表按 offset 取，读完后按时间接续；
+    无排序结果时返回 None（回退按时间）
+    """
+    raw_cursor = (request.GET.get("cursor") or "").strip()
+    tail_cursor = decode_rank_tail_cursor(raw_cursor)
+    if tail_cursor:
+        return _recommend_tail_page(*tail_cursor, page_size)
+    rank_cursor = decode_rank_cursor(raw_cursor)
+    if rank_cursor:
+        version, offset = rank_cursor
+    else:
+        version, offset = None, (page - 1) * page_size
+    ranked = ranked_post_ids(version, offset=offset, limit=page_size)
+    if ranked is None:
+        return None
+    ids, version, offset, has_more = ranked
+    if has_more:
+        return ids, True, encode_rank_cursor(version, offset + len(ids))
+    if not rank_cursor and page > 1:
+        # 旧客户端按 page 翻页：排序列表之后的页按时间分页，去掉排序列表中已出现的帖子（该页可能不足 page_size 条）
+        if ids:
+            return ids, True, None
+        ranked_pages = -(-rank_size(version) // page_size)
+        qs = Post.objects.filter(status=1).only("id", "created_at")
+        rows, more, _ = keyset_page(qs, None, max(1, page - ranked_pages), page_size)
+        served = ranked_members(version, [p.id for p in rows])
+        return [p.id for p in rows if p.id not in served], more, None
+    # 排序列表读完：本页剩余位置从最新的帖子按时间补齐，之后的游标切换为 rank-tail
+    tail_ids, more, next_cursor = _recommend_tail_page(version, None, page_size - len(ids))
+    return ids + tail_ids, more, next_cursor
+
+
+def _follow_before_id(raw):
+    """
+    关注流游标 -> 上一页最后一条 post_id。收件箱游标为 post_id，回退查库时为 keyset 游标 "ts,id"，
+    两种都接受，Redis 恢复/故障前后翻页不重复
+    """
+    raw = (raw or "").strip()
+    keyset = decode_cursor(raw)
+    if keyset:
+        return keyset[1]
+    try:
+        return int(raw or 0) or None
+    except (TypeError, ValueError):
+        return None
+
+
+def _follow_feed_page(request, user_id, page, page_size):
+    """关注流一页：(post_ids, has_more, next_cursor)；收件箱不可用时返回 None"""
+    before_id = _follow_before_id(request.GET.get("cursor"))
+    offset = 0 if before_id else (page - 1) * page_size
+    ids = follow_post_ids(user_id, before_id=before_id, offset=offset, limit=page_size + 1)
+    if ids is None:
+        return None
+    page_ids = ids[:page_size]
+    has_more = len(ids) > page_size
+    return page_ids, has_more, (str(page_ids[-1]) if has_more else None)
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def feed(request):
-    """信息流：tab=follow|local|recommend，page, page_size"""
+    """信息流：tab=follow|local|recommend，cursor（上一页返回的 nextCursor）或 page，page_size"""
     tab = (request.GET.get("tab") or "recommend").strip().lower()
-    page = max(1, int(request.GET.get("page") or 1))
-    page_size = min(30, max(1, int(request.GET.get("page_size") or 20)))
+    cursor, page, page_size = page_params(request)
     user_id = _user_id_from_request(request)
 
     qs = Post.objects.filter(status=1).order_by("-created_at")
-    if tab in ("follow", "following"):
-        # 关注：只显示当前用户关注的人发的帖（未登录则无数据）
+    precomputed_page = None
+    if tab in ("follow", "following") and user_id:
+        # 关注：读 Redis 收件箱（写扩散）并归并关注的大 V，游标为上一页最后一条 post_id
+        precomputed_page = _follow_feed_page(request, user_id, page, page_size)
+    elif tab == "recommend" and (
+        not request.GET.get("cursor")
+        or decode_rank_cursor(request.GET.get("cursor"))
+        or decode_rank_tail_cursor(request.GET.get("cursor"))
+    ):
+        # 推荐：读 rank_posts 预排序列表，游标为 "rank:<版本>:<offset>"，读完后按时间接续（"rank-tail:..."）；没有排序结果时按时间
+        precomputed_page = _recommend_feed_page(request, page, page_size)
+    if precomputed_page is not None:
+        post_ids, has_more, next_cursor = precomputed_page
+    elif tab in ("follow", "following"):
+        # 关注：只显示当前用户关注的人发的帖（未登录则无数据；收件箱不可用时回退为按关注列表查库）
         if not user_id:
             qs = qs.none()
         else:
@@ -146,74 +218,48 @@ def feed(request):
                     qs = qs.none()
             except Exception:
                 qs = qs.none()
+            if not cursor:
+                # 收件箱下发的 post_id 游标：id 与发帖时间同序，按 id 截断后取第一页
+                before_id = _follow_before_id(request.GET.get("cursor"))
+                if before_id:
+                    qs = qs.filter(id__lt=before_id)
+                    page = 1
     elif tab == "local":
-        # 同城：只显示与当前用户同定位的人发的帖（先取用户数据库里的 region_code，没有再取 IP 属地）
-        loc = None
-        if user_id:
-            try:
-                with connection.cursor() as c:
-                    c.execute("SELECT region_code FROM user_profile WHERE user_id = %s", [user_id])
-                    row = c.fetchone()
-                    if row and row[0] and str(row[0]).strip():
-                        loc = str(row[0]).strip()
-            except Exception:
-                pass
-        if not loc or loc in ("本地", "内网", "未知"):
-            loc = get_ip_location_for_request(request)
-        if not loc or loc in ("本地", "内网", "未知"):
-            qs = qs.none()
+        # 同城：按发帖时冗余的 region_city（无市则 region_province）等值查询；当前用户定位先取资料，没有再取 IP 属地
+        province, city = _user_region(user_id) if user_id else (None, None)
+        if not province and not city:
+            province, city = parse_region(get_ip_location_for_request(request))
+        if city:
+            qs = qs.filter(region_city=city)
+        elif province:
+            qs = qs.filter(region_province=province)
         else:
-            parts = [p.strip() for p in loc.replace("|", " ").split() if len(p.strip()) > 1]
-            if parts:
-                # 筛选发帖作者的 user_profile.region_code 与当前定位有交集的用户
-                try:
-                    with connection.cursor() as c:
-                        placeholders = " OR ".join(["region_code LIKE %s"] * min(len(parts), 4))
-                        params = ["%{}%".format(p) for p in parts[:4]]
-                        c.execute(
-                            "SELECT user_id FROM user_profile WHERE (region_code IS NOT NULL AND region_code != '') AND (" + placeholders + ")",
-                            params,
-                        )
-                        author_ids = [r[0] for r in c.fetchall()]
-                    if author_ids:
-                        qs = qs.filter(user_id__in=author_ids)
-                    else:
-                        qs = qs.none()
-                except Exception:
-                    qs = qs.none()
-            else:
-                qs = qs.none()
-    start = (page - 1) * page_size
-    posts = list(qs[start : start + page_size])
-    user_ids = list({p.user_id for p in posts})
-    users = {u.id: u for u in User.objects.filter(id__in=user_ids)} if user_ids else {}
-    liked_set = set()
-    favorited_set = set()
-    if user_id and posts:
-        post_ids = [p.id for p in posts]
-        liked_set = set(PostLike.objects.filter(user_id=user_id, post_id__in=post_ids).values_list("post_id", flat=True))
-        favorited_set = set(PostFavorite.objects.filter(user_id=user_id, post_id__in=post_ids).values_list("post_id", flat=True))
-    all_topic_ids = set()
-    for p in posts:
-        if p.topic_ids_json:
-            try:
-                ids = json.loads(p.topic_ids_json) if isinstance(p.topic_ids_json, str) else p.topic_ids_json
-                all_topic_ids.update(ids)
-            except Exception:
-                pass
-    topics_map = {t.id: {"id": t.id, "name": t.name} for t in Topic.objects.filter(id__in=all_topic_ids)} if all_topic_ids else {}
-    items = []
-    for p in posts:
-        u = users.get(p.user_id)
-        topic_ids = []
-        if p.topic_ids_json:
-            try:
-                topic_ids = json.loads(p.topic_ids_json) if isinstance(p.topic_ids_json, str) else p.topic_ids_json
-            except Exception:
-                pass
-        topic_list = [topics_map[i] for i in topic_ids if i in topics_map]
-        items.append(_post_item(p, u, topic_list, liked=(p.id in liked_set), favorited=(p.id in favorited_set)))
-    return Response(_result(data={"list": items, "hasMore": len(posts) == page_size}))
+            qs = qs.none()
+    if precomputed_page is None:
+        rows, has_more, next_cursor = keyset_page(qs.only("id", "created_at"), cursor, page, page_size)
+        post_ids = [p.id for p in rows]
+    items = hydrate_posts(post_ids, user_id)
+    return Response(_result(data={"list": items, "hasMore": has_more, "nextCursor": next_cursor}))
+
+
+def _save_post_topics(post_id, topic_ids, created_at):
+    """写入 post_topic 关联（话题页按 topic_id + created_at 索引分页）"""
+    ids = set()
+    for t in topic_ids or []:
+        try:
+            ids.add(int(t))
+        except (TypeError, ValueError):
+            pass
+    if not ids:
+        return
+    try:
+        with connection.cursor() as c:
+            c.executemany(
+                "INSERT IGNORE INTO post_topic (topic_id, post_id, created_at) VALUES (%s, %s, %s)",
+                [(tid, post_id, created_at) for tid in ids],
+            )
+    except Exception:
+        pass
 
 
 @api_view(["POST"])
@@ -256,7 +302,16 @@ def create_post(request):
             media_cover_urls = []
     if not isinstance(media_cover_urls, list):
         media_cover_urls = []
+    if not isinstance(media_urls, list):
+        media_urls = []
+    # 入库只存 object key（客户端传签名 URL 时在此解析），返回时再按需签名
+    media_urls = [to_object_key(m) for m in media_urls if m]
+    media_cover_urls = [to_object_key(m) for m in media_cover_urls if m]
     media_type = "video" if request.data.get("mediaType") == "video" else "image_text"
+    if media_type == "video" and not media_cover_urls:
+        # 封面由后台任务异步生成，发帖时可能尚未返回 coverUrl；按确定的封面 key 补齐
+        from apps.system.media_jobs import cover_key_for
+        media_cover_urls = [cover_key_for(m) for m in media_urls if isinstance(m, str) and m.startswith("video/")]
     vis = request.data.get("visibility")
     visibility = 2 if vis == 2 else 1
     allow_comment = 0 if request.data.get("allowComment") is False else 1
@@ -267,6 +322,10 @@ def create_post(request):
     if not location_code:
         loc = get_ip_location_for_request(request)
         location_code = loc[:32] if loc else None
+    # 同城流按作者资料中的地域冗余到帖子，资料未设置时用发帖定位
+    region_province, region_city = _user_region(user_id)
+    if not region_province and not region_city:
+        region_province, region_city = parse_region(location_code)
     post = Post(
         user_id=user_id,
         content=content,
@@ -274,13 +333,20 @@ def create_post(request):
         media_urls_json=json.dumps(media_urls) if media_urls else None,
         media_cover_urls_json=json.dumps(media_cover_urls) if media_cover_urls else None,
         topic_ids_json=json.dumps(topic_ids) if topic_ids else None,
-        tags_json=json.dumps(tags) if tags else None,
+        tags_json=json.dumps(tags, ensure_ascii=False) if tags else None,
         location_code=location_code,
+        region_province=region_province,
+        region_city=region_city,
         status=1,
         visibility=visibility,
         allow_comment=allow_comment,
     )
     post.save()
+    _save_post_topics(post.id, topic_ids, post.created_at)
+    user_stats.incr(user_id, post_count=1)
+    fan_out(post.id, user_id)
+    # 图片（含客户端上传的封面图）生成缩略图，幂等，上传时已入队的不会重复执行
+    enqueue_many(JOB_THUMBNAIL, [m for m in media_urls + media_cover_urls if isinstance(m, str) and m.startswith("image/")], user_id)
     return Response(_result(data={"id": post.id, "createdAt": post.created_at.isoformat()}))
 
 
@@ -288,26 +354,12 @@ def create_post(request):
 @permission_classes([AllowAny])
 def post_detail(request, post_id):
     """帖子详情"""
-    try:
-        p = Post.objects.get(id=post_id, status=1)
-    except Post.DoesNotExist:
-        return Response(_result(404, "帖子不存在"), status=status.HTTP_404_NOT_FOUND)
-    try:
-        u = User.objects.get(id=p.user_id)
-    except User.DoesNotExist:
-        u = None
-    topic_ids = []
-    if p.topic_ids_json:
-        try:
-            topic_ids = json.loads(p.topic_ids_json)
-        except Exception:
-            pass
-    topic_list = _topics_for_ids(topic_ids)
     user_id = _user_id_from_request(request)
-    liked = bool(user_id and PostLike.objects.filter(user_id=user_id, post_id=post_id).exists())
-    favorited = bool(user_id and PostFavorite.objects.filter(user_id=user_id, post_id=post_id).exists())
-    data = _post_item(p, u, topic_list, liked=liked, favorited=favorited)
-    data["isOwner"] = bool(user_id and p.user_id == user_id)
+    items = hydrate_posts([post_id], user_id)
+    if not items:
+        return Response(_result(404, "帖子不存在"), status=status.HTTP_404_NOT_FOUND)
+    data = items[0]
+    data["isOwner"] = bool(user_id and data["userId"] == user_id)
     return Response(_result(data=data))
 
 
@@ -321,12 +373,13 @@ def comment_list(request, post_id):
     qs = Comment.objects.filter(post_id=post_id, status=1).order_by("created_at")[start : start + page_size]
     user_ids = list({c.user_id for c in qs})
     users = {u.id: u for u in User.objects.filter(id__in=user_ids)} if user_ids else {}
+    avatar_map = refresh_url_map([getattr(u, "avatar_url", None) for u in users.values()])
     items = [
         {
             "id": c.id,
             "userId": c.user_id,
             "nickname": (getattr(users.get(c.user_id), "nickname", None) if users.get(c.user_id) else None) or f"用户{c.user_id}",
-            "avatarUrl": refresh_oss_url_if_applicable(getattr(users.get(c.user_id), "avatar_url", None)) if users.get(c.user_id) else None,
+            "avatarUrl": avatar_map.get(users[c.user_id].avatar_url, users[c.user_id].avatar_url) if users.get(c.user_id) else None,
             "parentId": c.parent_id,
             "content": c.content,
             "likeCount": c.like_count,
@@ -355,7 +408,7 @@ def add_comment(request, post_id):
         return Response(_result(403, "作者已关闭评论"), status=status.HTTP_403_FORBIDDEN)
     c = Comment(post_id=post_id, user_id=user_id, parent_id=parent_id, content=content, status=1)
     c.save()
-    Post.objects.filter(id=post_id).update(comment_count=F("comment_count") + 1)
+    _bump_count(post_id, "comment_count", 1)
     if p and p.user_id != user_id:
         _create_notification(p.user_id, "comment", user_id, post_id, comment_id=c.id, content_snippet=content[:100])
     return Response(_result(data={"id": c.id, "createdAt": c.created_at.isoformat()}))
@@ -378,75 +431,74 @@ def comment_delete(request, post_id, comment_id):
         return Response(_result(403, "无权删除该评论"), status=status.HTTP_403_FORBIDDEN)
     c.status = 0
     c.save(update_fields=["status"])
-    Post.objects.filter(id=post_id).update(comment_count=F("comment_count") - 1)
+    _bump_count(post_id, "comment_count", -1)
     return Response(_result(data={"message": "已删除"}))
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def post_like(request, post_id):
-    """点赞/取消点赞（post_like 为联合主键表无 id，用 raw SQL 做存在判断与增删）"""
+    """点赞/取消点赞：先 DELETE，未删到行再 INSERT IGNORE，按影响行数判断状态；计数只在 Redis 累加增量"""
     user_id = _user_id_from_request(request)
     if not user_id:
         return Response(_result(400, "请先登录"), status=status.HTTP_400_BAD_REQUEST)
-    if not Post.objects.filter(id=post_id, status=1).exists():
+    body = post_bodies([post_id]).get(post_id)
+    if not body or body["status"] != 1:
         return Response(_result(404, "帖子不存在"), status=status.HTTP_404_NOT_FOUND)
     with connection.cursor() as cursor:
         cursor.execute(
-            "SELECT 1 FROM post_like WHERE user_id = %s AND post_id = %s LIMIT 1",
+            "DELETE FROM post_like WHERE user_id = %s AND post_id = %s",
             [user_id, post_id],
         )
-        exists = cursor.fetchone() is not None
-    if exists:
-        with connection.cursor() as cursor:
+        unliked = cursor.rowcount > 0
+        inserted = False
+        if not unliked:
             cursor.execute(
-                "DELETE FROM post_like WHERE user_id = %s AND post_id = %s",
+                "INSERT IGNORE INTO post_like (user_id, post_id) VALUES (%s, %s)",
                 [user_id, post_id],
             )
-        Post.objects.filter(id=post_id).update(like_count=F("like_count") - 1)
-        return Response(_result(data={"liked": False, "likeCount": max(0, Post.objects.get(id=post_id).like_count)}))
-    with connection.cursor() as cursor:
-        cursor.execute(
-            "INSERT INTO post_like (user_id, post_id) VALUES (%s, %s)",
-            [user_id, post_id],
-        )
-    Post.objects.filter(id=post_id).update(like_count=F("like_count") + 1)
-    p = Post.objects.filter(id=post_id).first()
-    if p and p.user_id != user_id:
-        _create_notification(p.user_id, "like", user_id, post_id)
-    return Response(_result(data={"liked": True, "likeCount": Post.objects.get(id=post_id).like_count}))
+            inserted = cursor.rowcount > 0
+    if unliked or inserted:
+        viewer_state.on_toggle("like", user_id, post_id, inserted)
+    if unliked:
+        _bump_count(post_id, "like_count", -1)
+        return Response(_result(data={"liked": False, "likeCount": post_counts(post_id)["likeCount"]}))
+    if inserted:
+        _bump_count(post_id, "like_count", 1)
+        if body["userId"] != user_id:
+            _create_notification(body["userId"], "like", user_id, post_id)
+    return Response(_result(data={"liked": True, "likeCount": post_counts(post_id)["likeCount"]}))
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def post_favorite(request, post_id):
-    """收藏/取消收藏（post_favorite 为联合主键表无 id，用 raw SQL）"""
+    """收藏/取消收藏（post_favorite 为联合主键表无 id）：先 DELETE，未删到行再 INSERT IGNORE"""
     user_id = _user_id_from_request(request)
     if not user_id:
         return Response(_result(400, "请先登录"), status=status.HTTP_400_BAD_REQUEST)
-    if not Post.objects.filter(id=post_id, status=1).exists():
+    body = post_bodies([post_id]).get(post_id)
+    if not body or body["status"] != 1:
         return Response(_result(404, "帖子不存在"), status=status.HTTP_404_NOT_FOUND)
     with connection.cursor() as cursor:
         cursor.execute(
-            "SELECT 1 FROM post_favorite WHERE user_id = %s AND post_id = %s LIMIT 1",
+            "DELETE FROM post_favorite WHERE user_id = %s AND post_id = %s",
             [user_id, post_id],
         )
-        exists = cursor.fetchone() is not None
-    if exists:
-        with connection.cursor() as cursor:
+        removed = cursor.rowcount > 0
+        inserted = False
+        if not removed:
             cursor.execute(
-                "DELETE FROM post_favorite WHERE user_id = %s AND post_id = %s",
+                "INSERT IGNORE INTO post_favorite (user_id, post_id) VALUES (%s, %s)",
                 [user_id, post_id],
             )
+            inserted = cursor.rowcount > 0
+    if removed or inserted:
+        viewer_state.on_toggle("fav", user_id, post_id, inserted)
+    if removed:
         return Response(_result(data={"favorited": False}))
-    with connection.cursor() as cursor:
-        cursor.execute(
-            "INSERT INTO post_favorite (user_id, post_id) VALUES (%s, %s)",
-            [user_id, post_id],
-        )
-    p = Post.objects.filter(id=post_id).first()
-    if p and p.user_id != user_id:
-        _create_notification(p.user_id, "favorite", user_id, post_id)
+    if inserted and body["userId"] != user_id:
+        _create_notification(body["userId"], "favorite", user_id, post_id)
     return Response(_result(data={"favorited": True}))
 
 
@@ -456,36 +508,27 @@ def topic_feed(request, topic_id):
     """话题下的帖子列表"""
     if not Topic.objects.filter(id=topic_id, status=1).exists():
         return Response(_result(404, "话题不存在"), status=status.HTTP_404_NOT_FOUND)
-    page = max(1, int(request.GET.get("page") or 1))
-    page_size = min(30, max(1, int(request.GET.get("page_size") or 20)))
+    cursor, page, page_size = page_params(request)
     user_id = _user_id_from_request(request)
-    # 帖子 topic_ids_json 为 JSON 数组如 [1,2]，精确匹配 topic_id
-    sid = str(topic_id)
-    qs = Post.objects.filter(status=1).filter(
-        Q(topic_ids_json__contains=f"[{sid},") |
-        Q(topic_ids_json__contains=f",{sid}]") |
-        Q(topic_ids_json__contains=f",{sid},") |
-        Q(topic_ids_json__contains=f"[{sid}]")
-    ).order_by("-created_at")
-    start = (page - 1) * page_size
-    posts = list(qs[start : start + page_size])
-    user_ids = list({p.user_id for p in posts})
-    users = {u.id: u for u in User.objects.filter(id__in=user_ids)} if user_ids else {}
-    liked_set = set(PostLike.objects.filter(user_id=user_id, post_id__in=[p.id for p in posts]).values_list("post_id", flat=True)) if user_id and posts else set()
-    favorited_set = set(PostFavorite.objects.filter(user_id=user_id, post_id__in=[p.id for p in posts]).values_list("post_id", flat=True)) if user_id and posts else set()
-    topic_list = _topics_for_ids([topic_id])
-    items = []
-    for p in posts:
-        u = users.get(p.user_id)
-        t_ids = []
-        if p.topic_ids_json:
-            try:
-                t_ids = json.loads(p.topic_ids_json) if isinstance(p.topic_ids_json, str) else p.topic_ids_json
-            except Exception:
-                pass
-        tl = _topics_for_ids(t_ids)
-        items.append(_post_item(p, u, tl, liked=(p.id in liked_set), favorited=(p.id in favorited_set)))
-    return Response(_result(data={"list": items, "hasMore": len(posts) == page_size}))
+    try:
+        # post_topic 按 (topic_id, created_at, post_id) 索引范围扫描；已删帖子在组装时跳过
+        rows, has_more, next_cursor = keyset_page(
+            PostTopic.objects.filter(topic_id=topic_id), cursor, page, page_size, id_field="post_id"
+        )
+        post_ids = [r.post_id for r in rows]
+    except Exception:
+        # 未建 post_topic 表时回退：帖子 topic_ids_json 为 JSON 数组如 [1,2]，精确匹配 topic_id
+        sid = str(topic_id)
+        qs = Post.objects.filter(status=1).filter(
+            Q(topic_ids_json__contains=f"[{sid},") |
+            Q(topic_ids_json__contains=f",{sid}]") |
+            Q(topic_ids_json__contains=f",{sid},") |
+            Q(topic_ids_json__contains=f"[{sid}]")
+        ).order_by("-created_at")
+        rows, has_more, next_cursor = keyset_page(qs.only("id", "created_at"), cursor, page, page_size)
+        post_ids = [p.id for p in rows]
+    items = hydrate_posts(post_ids, user_id)
+    return Response(_result(data={"list": items, "hasMore": has_more, "nextCursor": next_cursor}))
 
 
 def _get_user_code(user_id):
@@ -502,52 +545,47 @@ def _get_user_code(user_id):
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def post_search(request):
-    """帖子搜索：按内容、标签模糊匹配"""
+    """帖子搜索：全文检索内容与标签，sort=relevance（默认，按相关度）|latest（按时间），tag 按标签过滤"""
     keyword = (request.GET.get("keyword") or "").strip()[:64]
-    if not keyword:
+    tag = (request.GET.get("tag") or "").strip()[:20]
+    if not keyword and not tag:
         return Response(_result(data={"list": [], "hasMore": False}))
-    page = max(1, int(request.GET.get("page") or 1))
-    page_size = min(30, max(1, int(request.GET.get("page_size") or 20)))
+    sort = (request.GET.get("sort") or "relevance").strip().lower()
+    cursor, page, page_size = page_params(request)
     user_id = _user_id_from_request(request)
 
-    qs = Post.objects.filter(status=1).filter(
-        Q(content__icontains=keyword) | Q(tags_json__icontains=keyword)
-    ).order_by("-created_at")
-    start = (page - 1) * page_size
-    posts = list(qs[start : start + page_size])
-    if not posts:
+    post_ids = None
+    query = boolean_query(keyword or tag)
+    if query:
+        try:
+            if sort == "latest":
+                qs = post_latest_queryset(query, tag or None).only("id", "created_at")
+                rows, has_more, next_cursor = keyset_page(qs, cursor, page, page_size)
+                post_ids = [p.id for p in rows]
+            else:
+                offset = decode_relevance_cursor((request.GET.get("cursor") or "").strip())
+                if offset is None:
+                    offset = (page - 1) * page_size
+                post_ids, has_more, next_cursor = search_post_ids_by_relevance(query, tag or None, offset, page_size)
+            # 全文索引一条都没命中时回退 LIKE（与 ngram 分词口径不同的关键词仍能搜到）；LIKE 结果的后续页同样走这里
+            if not post_ids and ((page == 1 and not cursor) or not post_latest_queryset(query, tag or None).exists()):
+                post_ids = None
+        except Exception:
+            # 未建全文索引（未执行 migrate_search_fulltext.sql）时回退 LIKE
+            post_ids = None
+    if post_ids is None:
+        # 关键词短于 ngram 长度（单字）或全文索引不可用：按时间 LIKE 匹配
+        qs = Post.objects.filter(status=1)
+        if keyword:
+            qs = qs.filter(Q(content__icontains=keyword) | Q(tags_json__icontains=keyword))
+        if tag:
+            qs = qs.extra(where=["JSON_CONTAINS(tags_json, JSON_QUOTE(%s))"], params=[tag])
+        rows, has_more, next_cursor = keyset_page(qs.only("id", "created_at"), cursor, page, page_size)
+        post_ids = [p.id for p in rows]
+    if not post_ids:
         return Response(_result(data={"list": [], "hasMore": False}))
-
-    user_ids = list({p.user_id for p in posts})
-    users = {u.id: u for u in User.objects.filter(id__in=user_ids)} if user_ids else {}
-    liked_set = set()
-    favorited_set = set()
-    if user_id and posts:
-        post_ids = [p.id for p in posts]
-        liked_set = set(PostLike.objects.filter(user_id=user_id, post_id__in=post_ids).values_list("post_id", flat=True))
-        favorited_set = set(PostFavorite.objects.filter(user_id=user_id, post_id__in=post_ids).values_list("post_id", flat=True))
-
-    all_topic_ids = set()
-    for p in posts:
-        if p.topic_ids_json:
-            try:
-                ids = json.loads(p.topic_ids_json) if isinstance(p.topic_ids_json, str) else p.topic_ids_json
-                all_topic_ids.update(ids)
-            except Exception:
-                pass
-    topics_map = {t.id: {"id": t.id, "name": t.name} for t in Topic.objects.filter(id__in=all_topic_ids)} if all_topic_ids else {}
-    items = []
-    for p in posts:
-        u = users.get(p.user_id)
-        topic_ids = []
-        if p.topic_ids_json:
-            try:
-                topic_ids = json.loads(p.topic_ids_json) if isinstance(p.topic_ids_json, str) else p.topic_ids_json
-            except Exception:
-                pass
-        topic_list = [topics_map[i] for i in topic_ids if i in topics_map]
-        items.append(_post_item(p, u, topic_list, liked=(p.id in liked_set), favorited=(p.id in favorited_set)))
-    return Response(_result(data={"list": items, "hasMore": len(posts) == page_size}))
+    items = hydrate_posts(post_ids, user_id)
+    return Response(_result(data={"list": items, "hasMore": has_more, "nextCursor": next_cursor}))
 
 
 @api_view(["GET"])
@@ -574,8 +612,21 @@ def user_search(request):
             except (ValueError, TypeError):
                 pass
     if not items:
-        qs = User.objects.filter(status=1).filter(Q(nickname__icontains=keyword)).order_by("-id")[(page - 1) * page_size : page * page_size]
-        items = [{"userId": u.id, "userCode": getattr(u, "user_code", None) or _get_user_code(u.id), "nickname": u.nickname or f"用户{u.id}", "avatarUrl": refresh_oss_url_if_applicable(u.avatar_url)} for u in qs]
+        qs = None
+        query = boolean_query(keyword)
+        if query:
+            try:
+                ids = search_user_ids(query, offset=(page - 1) * page_size, limit=page_size)
+                # 全文索引一条都没命中时保持 qs 为 None，回退 LIKE
+                if ids or (page > 1 and search_user_ids(query, limit=1)):
+                    user_map = {u.id: u for u in User.objects.filter(id__in=ids)} if ids else {}
+                    qs = [user_map[i] for i in ids if i in user_map]
+            except Exception:
+                qs = None
+        if qs is None:
+            qs = list(User.objects.filter(status=1).filter(Q(nickname__icontains=keyword)).order_by("-id")[(page - 1) * page_size : page * page_size])
+        avatar_map = refresh_url_map([u.avatar_url for u in qs])
+        items = [{"userId": u.id, "userCode": getattr(u, "user_code", None) or _get_user_code(u.id), "nickname": u.nickname or f"用户{u.id}", "avatarUrl": avatar_map.get(u.avatar_url, u.avatar_url)} for u in qs]
     return Response(_result(data={"list": items, "hasMore": len(items) == page_size}))
 
 
@@ -665,10 +716,10 @@ def user_profile(request, user_id):
     current_id = _user_id_from_request(request)
     following = bool(current_id and UserFollow.objects.filter(user_id=current_id, target_user_id=user_id).exists())
     prof = _get_user_profile_ext(user_id, apply_privacy=True)
-    follow_count = UserFollow.objects.filter(user_id=user_id).count()
-    follower_count = UserFollow.objects.filter(target_user_id=user_id).count()
-    post_count = Post.objects.filter(user_id=user_id, status=1).count()
-    like_count = Post.objects.filter(user_id=user_id, status=1).aggregate(s=Sum("like_count"))["s"] or 0
+    try:
+        stats = user_stats.get(user_id)
+    except Exception:
+        stats = {"followCount": 0, "followerCount": 0, "postCount": 0, "likeCount": 0}
     return Response(_result(data={
         "userId": u.id,
         "userCode": getattr(u, "user_code", None) or _get_user_code(u.id),
@@ -681,10 +732,10 @@ def user_profile(request, user_id):
         "birthTime": prof.get("birthTime"),
         "locationCode": prof.get("regionCode"),
         "age": prof.get("age"),
-        "followCount": follow_count,
-        "followerCount": follower_count,
-        "postCount": post_count,
-        "likeCount": like_count,
+        "followCount": stats["followCount"],
+        "followerCount": stats["followerCount"],
+        "postCount": stats["postCount"],
+        "likeCount": stats["likeCount"],
     }))
 
 
@@ -694,36 +745,12 @@ def user_posts(request, user_id):
     """某用户发布的帖子列表（公开主页时间流）"""
     if not User.objects.filter(id=user_id, status=1).exists():
         return Response(_result(404, "用户不存在"), status=status.HTTP_404_NOT_FOUND)
-    page = max(1, int(request.GET.get("page") or 1))
-    page_size = min(30, max(1, int(request.GET.get("page_size") or 20)))
+    cursor, page, page_size = page_params(request)
     current_id = _user_id_from_request(request)
     qs = Post.objects.filter(user_id=user_id, status=1).order_by("-created_at")
-    start = (page - 1) * page_size
-    posts = list(qs[start : start + page_size])
-    users = {user_id: User.objects.get(id=user_id)} if posts else {}
-    liked_set = set(PostLike.objects.filter(user_id=current_id, post_id__in=[p.id for p in posts]).values_list("post_id", flat=True)) if current_id and posts else set()
-    favorited_set = set(PostFavorite.objects.filter(user_id=current_id, post_id__in=[p.id for p in posts]).values_list("post_id", flat=True)) if current_id and posts else set()
-    all_topic_ids = set()
-    for p in posts:
-        if p.topic_ids_json:
-            try:
-                ids = json.loads(p.topic_ids_json) if isinstance(p.topic_ids_json, str) else p.topic_ids_json
-                all_topic_ids.update(ids)
-            except Exception:
-                pass
-    topics_map = {t.id: {"id": t.id, "name": t.name} for t in Topic.objects.filter(id__in=all_topic_ids)} if all_topic_ids else {}
-    items = []
-    for p in posts:
-        u = users.get(p.user_id)
-        t_ids = []
-        if p.topic_ids_json:
-            try:
-                t_ids = json.loads(p.topic_ids_json) if isinstance(p.topic_ids_json, str) else p.topic_ids_json
-            except Exception:
-                pass
-        tl = [topics_map[i] for i in t_ids if i in topics_map]
-        items.append(_post_item(p, u, tl, liked=(p.id in liked_set), favorited=(p.id in favorited_set)))
-    return Response(_result(data={"list": items, "hasMore": len(posts) == page_size}))
+    rows, has_more, next_cursor = keyset_page(qs.only("id", "created_at"), cursor, page, page_size)
+    items = hydrate_posts([p.id for p in rows], current_id)
+    return Response(_result(data={"list": items, "hasMore": has_more, "nextCursor": next_cursor}))
 
 
 @api_view(["POST"])
@@ -749,12 +776,20 @@ def follow_toggle(request, target_user_id):
                 "DELETE FROM user_follow WHERE user_id = %s AND target_user_id = %s",
                 [user_id, target_user_id],
             )
+            removed = cursor.rowcount > 0
+        if removed:
+            user_stats.incr(user_id, follow_count=-1)
+            user_stats.incr(target_user_id, follower_count=-1)
+        on_unfollow(user_id, target_user_id)
         return Response(_result(data={"following": False}))
     with connection.cursor() as cursor:
         cursor.execute(
             "INSERT INTO user_follow (user_id, target_user_id) VALUES (%s, %s)",
             [user_id, target_user_id],
         )
+    user_stats.incr(user_id, follow_count=1)
+    user_stats.incr(target_user_id, follower_count=1)
+    on_follow(user_id, target_user_id)
     return Response(_result(data={"following": True}))
 
 
@@ -782,6 +817,7 @@ def my_following_list(request):
     if not target_ids:
         return Response(_result(data={"list": []}))
     users = list(User.objects.filter(id__in=target_ids, status=1))
+    avatar_map = refresh_url_map([u.avatar_url for u in users])
     items = []
     for u in users:
         prof = _get_user_profile_ext(u.id)
@@ -789,7 +825,7 @@ def my_following_list(request):
             "userId": u.id,
             "userCode": getattr(u, "user_code", None) or _get_user_code(u.id),
             "nickname": u.nickname or f"用户{u.id}",
-            "avatarUrl": refresh_oss_url_if_applicable(u.avatar_url),
+            "avatarUrl": avatar_map.get(u.avatar_url, u.avatar_url),
             "intro": prof.get("intro") or "暂无介绍",
         })
     return Response(_result(data={"list": items}))
@@ -808,6 +844,7 @@ def my_followers_list(request):
     if not follower_ids:
         return Response(_result(data={"list": []}))
     users = list(User.objects.filter(id__in=follower_ids, status=1))
+    avatar_map = refresh_url_map([u.avatar_url for u in users])
     items = []
     for u in users:
         prof = _get_user_profile_ext(u.id)
@@ -815,7 +852,7 @@ def my_followers_list(request):
             "userId": u.id,
             "userCode": getattr(u, "user_code", None) or _get_user_code(u.id),
             "nickname": u.nickname or f"用户{u.id}",
-            "avatarUrl": refresh_oss_url_if_applicable(u.avatar_url),
+            "avatarUrl": avatar_map.get(u.avatar_url, u.avatar_url),
             "intro": prof.get("intro") or "暂无介绍",
         })
     return Response(_result(data={"list": items}))
@@ -849,6 +886,7 @@ def masters_list(request):
                 rows = c.fetchall()
         except Exception:
             rows = []
+    avatar_map = refresh_url_map([r[2] for r in rows if len(r) > 2])
     items = []
     for r in rows:
         uid = r[0]
@@ -857,7 +895,7 @@ def masters_list(request):
             "userId": uid,
             "userCode": _get_user_code(uid),
             "nickname": r[1] or f"名师{uid}",
-            "avatarUrl": refresh_oss_url_if_applicable(r[2]) if len(r) > 2 else None,
+            "avatarUrl": avatar_map.get(r[2], r[2]) if len(r) > 2 else None,
             "intro": r[3] if len(r) > 3 else "认证名师",
             "consultPrice": round(consult_price, 2),
         })
@@ -891,54 +929,30 @@ def my_favorites(request):
     user_id = _user_id_from_request(request)
     if not user_id:
         return Response(_result(401, "请先登录"), status=status.HTTP_401_UNAUTHORIZED)
-    page = max(1, int(request.GET.get("page") or 1))
-    page_size = min(30, max(1, int(request.GET.get("page_size") or 20)))
-    fav_post_ids = list(
-        PostFavorite.objects.filter(user_id=user_id).order_by("-created_at").values_list("post_id", flat=True)[(page - 1) * page_size : page * page_size]
+    cursor, page, page_size = page_params(request)
+    # 按收藏时间倒序，游标为 (收藏时间, post_id)，走 post_favorite (user_id, created_at, post_id) 索引
+    favs, has_more, next_cursor = keyset_page(
+        PostFavorite.objects.filter(user_id=user_id), cursor, page, page_size, id_field="post_id"
     )
+    fav_post_ids = [f.post_id for f in favs]
     if not fav_post_ids:
-        return Response(_result(data={"list": [], "hasMore": False}))
-    posts = list(Post.objects.filter(id__in=fav_post_ids, status=1).order_by("-created_at"))
-    # 保持收藏顺序：按 fav 时间更复杂，这里简化为按帖子时间
-    user_ids = list({p.user_id for p in posts})
-    users = {u.id: u for u in User.objects.filter(id__in=user_ids)} if user_ids else {}
-    liked_set = set(PostLike.objects.filter(user_id=user_id, post_id__in=[p.id for p in posts]).values_list("post_id", flat=True))
-    favorited_set = set(fav_post_ids)
-    all_topic_ids = set()
-    for p in posts:
-        if p.topic_ids_json:
-            try:
-                ids = json.loads(p.topic_ids_json) if isinstance(p.topic_ids_json, str) else p.topic_ids_json
-                all_topic_ids.update(ids)
-            except Exception:
-                pass
-    topics_map = {t.id: {"id": t.id, "name": t.name} for t in Topic.objects.filter(id__in=all_topic_ids)} if all_topic_ids else {}
-    items = []
-    for p in posts:
-        u = users.get(p.user_id)
-        t_ids = []
-        if p.topic_ids_json:
-            try:
-                t_ids = json.loads(p.topic_ids_json) if isinstance(p.topic_ids_json, str) else p.topic_ids_json
-            except Exception:
-                pass
-        tl = [topics_map[i] for i in t_ids if i in topics_map]
-        items.append(_post_item(p, u, tl, liked=(p.id in liked_set), favorited=True))
-    return Response(_result(data={"list": items, "hasMore": len(posts) == page_size}))
+        return Response(_result(data={"list": [], "hasMore": False, "nextCursor": None}))
+    items = hydrate_posts(fav_post_ids, user_id)
+    return Response(_result(data={"list": items, "hasMore": has_more, "nextCursor": next_cursor}))
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def post_share(request, post_id):
     """转发：增加分享计数；登录时给帖子作者发通知"""
-    if not Post.objects.filter(id=post_id, status=1).exists():
+    body = post_bodies([post_id]).get(post_id)
+    if not body or body["status"] != 1:
         return Response(_result(404, "帖子不存在"), status=status.HTTP_404_NOT_FOUND)
-    Post.objects.filter(id=post_id).update(share_count=F("share_count") + 1)
-    p = Post.objects.get(id=post_id)
+    _bump_count(post_id, "share_count", 1)
     user_id = _user_id_from_request(request)
-    if user_id and p.user_id != user_id:
-        _create_notification(p.user_id, "share", user_id, post_id)
-    return Response(_result(data={"shareCount": p.share_count}))
+    if user_id and body["userId"] != user_id:
+        _create_notification(body["userId"], "share", user_id, post_id)
+    return Response(_result(data={"shareCount": post_counts(post_id)["shareCount"]}))
 
 
 @api_view(["POST"])
@@ -954,7 +968,9 @@ def post_delete(request, post_id):
         return Response(_result(404, "帖子不存在"), status=status.HTTP_404_NOT_FOUND)
     if p.user_id != user_id:
         return Response(_result(403, "无权删除"), status=status.HTTP_403_FORBIDDEN)
-    Post.objects.filter(id=post_id).update(status=0)
+    if Post.objects.filter(id=post_id, status=1).update(status=0):
+        user_stats.on_post_status(p, active=False)
+    invalidate_posts([post_id])
     return Response(_result(data={"message": "已删除"}))
 
 
@@ -968,11 +984,12 @@ def notification_list(request):
     page = max(1, int(request.GET.get("page") or 1))
     page_size = min(50, max(1, int(request.GET.get("page_size") or 20)))
     qs = Notification.objects.filter(user_id=user_id).order_by("-created_at")
-    unread_count = Notification.objects.filter(user_id=user_id, read=0).count()
+    unread_count = unread.get(user_id)["interaction"]
     start = (page - 1) * page_size
     rows = list(qs[start : start + page_size])
     from_ids = list({n.from_user_id for n in rows})
     users = {u.id: u for u in User.objects.filter(id__in=from_ids)} if from_ids else {}
+    avatar_map = refresh_url_map([getattr(u, "avatar_url", None) for u in users.values()])
     type_text = {"comment": "评论", "like": "点赞", "favorite": "收藏", "share": "分享"}
     items = []
     for n in rows:
@@ -983,10 +1000,11 @@ def notification_list(request):
             "typeText": type_text.get(n.type, n.type),
             "fromUserId": n.from_user_id,
             "fromNickname": getattr(u, "nickname", None) or f"用户{n.from_user_id}",
-            "fromAvatarUrl": refresh_oss_url_if_applicable(getattr(u, "avatar_url", None)),
+            "fromAvatarUrl": avatar_map.get(getattr(u, "avatar_url", None), getattr(u, "avatar_url", None)),
             "postId": n.post_id,
             "commentId": n.comment_id,
             "contentSnippet": n.content_snippet or "",
+            "aggCount": getattr(n, "agg_count", 1) or 1,
             "read": bool(n.read),
             "createdAt": n.created_at.isoformat() if n.created_at else None,
         })
@@ -1004,9 +1022,8 @@ def notification_unread_count(request):
     user_id = _user_id_from_request(request)
     if not user_id:
         return Response(_result(data={"unreadCount": 0}))
-    interaction = Notification.objects.filter(user_id=user_id, read=0).count()
-    system_count = SystemNotification.objects.filter(user_id=user_id, read=0).count()
-    return Response(_result(data={"unreadCount": interaction + system_count}))
+    counts = unread.get(user_id)
+    return Response(_result(data={"unreadCount": counts["interaction"] + counts["system"]}))
 
 
 @api_view(["POST"])
@@ -1024,9 +1041,11 @@ def notification_mark_read(request):
             ids = []
     ids = [int(x) for x in ids if x is not None]
     if ids:
-        Notification.objects.filter(user_id=user_id, id__in=ids).update(read=1)
+        changed = Notification.objects.filter(user_id=user_id, id__in=ids, read=0).update(read=1)
+        unread.incr(user_id, "interaction", -changed)
     else:
-        Notification.objects.filter(user_id=user_id).update(read=1)
+        Notification.objects.filter(user_id=user_id, read=0).update(read=1)
+        unread.clear(user_id, "interaction")
     return Response(_result())
 
 
@@ -1034,7 +1053,7 @@ def notification_mark_read(request):
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def system_notification_list(request):
-    """系统通知列表，分页"""
+    """系统通知列表，分页。逐用户通知与全员公告（负数 id）按时间合并"""
     user_id = _user_id_from_request(request)
     if not user_id:
         return Response(_result(401, "请先登录"), status=status.HTTP_401_UNAUTHORIZED)
@@ -1042,7 +1061,8 @@ def system_notification_list(request):
     page_size = min(50, max(1, int(request.GET.get("page_size") or 20)))
     qs = SystemNotification.objects.filter(user_id=user_id).order_by("-created_at")
     start = (page - 1) * page_size
-    rows = list(qs[start : start + page_size])
+    # 合并后前 start+page_size 条只可能来自两边各自的前 start+page_size 条
+    rows = list(qs[: start + page_size + 1])
     type_text = {"announcement": "平台公告", "post_removed": "帖子下架"}
     items = []
     for n in rows:
@@ -1055,17 +1075,40 @@ def system_notification_list(request):
             "extraJson": n.extra_json,
             "read": bool(n.read),
             "createdAt": n.created_at.isoformat() if n.created_at else None,
+            "ts": n.created_at.timestamp() if n.created_at else 0,
         })
+    try:
+        state = unread.state(user_id)
+        broadcasts = broadcast.visible(state["bc_mark"], state["joined"])
+    except Exception:
+        broadcasts = []
+    for b in broadcasts:
+        items.append({
+            "id": -b["id"],
+            "type": b["type"],
+            "typeText": type_text.get(b["type"], b["type"]),
+            "title": b["title"],
+            "content": b["content"],
+            "extraJson": b["extraJson"],
+            "read": b["read"],
+            "createdAt": b["createdAt"],
+            "ts": b["ts"],
+        })
+    items.sort(key=lambda x: x.pop("ts"), reverse=True)
+    page_items = items[start : start + page_size]
     return Response(_result(data={
-        "list": items,
-        "hasMore": len(rows) == page_size,
+        "list": page_items,
+        "hasMore": len(items) > start + page_size,
     }))
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def system_notification_mark_read(request):
-    """标记系统通知已读。body: { "ids": [1,2] } 若为空则全部标已读"""
+    """
+    标记系统通知已读。body: { "ids": [1,2] } 若为空则全部标已读。
+    负数 id 为全员公告：已读按水位记录，标记某条公告即其之前的公告一并已读
+    """
     user_id = _user_id_from_request(request)
     if not user_id:
         return Response(_result(401, "请先登录"), status=status.HTTP_401_UNAUTHORIZED)
@@ -1077,9 +1120,18 @@ def system_notification_mark_read(request):
             ids = []
     ids = [int(x) for x in ids if x is not None]
     if ids:
-        SystemNotification.objects.filter(user_id=user_id, id__in=ids).update(read=1)
+        own_ids = [i for i in ids if i > 0]
+        broadcast_ids = [-i for i in ids if i < 0]
+        if own_ids:
+            changed = SystemNotification.objects.filter(user_id=user_id, id__in=own_ids, read=0).update(read=1)
+            unread.incr(user_id, "system", -changed)
+        if broadcast_ids:
+            broadcast.mark_read(user_id, max(broadcast_ids))
+            unread.reset(user_id)
     else:
-        SystemNotification.objects.filter(user_id=user_id).update(read=1)
+        SystemNotification.objects.filter(user_id=user_id, read=0).update(read=1)
+        broadcast.mark_read(user_id)
+        unread.reset(user_id)
     return Response(_result())
 
 
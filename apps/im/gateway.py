@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket 实时网关（ASGI）：客户端连 /api/im/ws?token=<session token>（或 Authorization: Bearer），
+服务端把新消息、互动/系统通知、语音匹配结果推给在线用户，客户端不再轮询 message_list / conversation_list。
+- 鉴权沿用 session_store 的 7 天会话，连接期间每 PING_INTERVAL 秒（不论是否空闲）复查一次，会话失效即断开（4401）
+- 每个进程共享一条 Redis 订阅连接：按在线用户引用计数 SUBSCRIBE rt:user:<uid>，另固定订阅 rt:broadcast，
+  收到后分发到本进程对应连接的队列；连接数不受 Redis 连接数限制
+- 每个连接一个有界队列，积压超过 QUEUE_MAX（客户端过慢）时断开（4008），客户端重连后按 HTTP 接口补齐
+- 客户端可发 {"type": "ping"}，服务端回 {"type": "pong"}；空闲 PING_INTERVAL 秒服务端主动发 ping
+由 config/asgi.py 挂载，HTTP 仍交给 Django；部署见 DEPLOY_SERVER.md（uvicorn）。
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+
+from .realtime import BROADCAST_CHANNEL, USER_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+WS_PATH = "/api/im/ws"
+PING_INTERVAL = 30
+QUEUE_MAX = 256
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+CLOSE_TOO_SLOW = 4008
+
+_OVERFLOW = object()
+
+
+def _redis_url():
+    from django.conf import settings
+    return settings.CACHES["default"]["LOCATION"]
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class Hub:
+    """进程内订阅中心：一条 Redis pub/sub 连接，user_id -> 本进程内该用户的连接队列"""
+
+    def __init__(self):
+        self._redis = None
+        self._pubsub = None
+        self._reader = None
+        self._queues = {}
+        self._lock = asyncio.Lock()
+
+    @property
+    def connection_count(self):
+        return sum(len(qs) for qs in self._queues.values())
+
+    async def _ensure_started(self):
+        if self._pubsub is not None:
+            return
+        import redis.asyncio as aioredis
+        # 订阅成功并启动读取协程后才赋值，失败时释放连接，下次 register 重试
+        client = aioredis.from_url(_redis_url())
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(BROADCAST_CHANNEL)
+        except Exception:
+            await pubsub.aclose()
+            await client.aclose()
+            raise
+        self._redis, self._pubsub = client, pubsub
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def register(self, user_id, queue):
+        async with self._lock:
+            await self._ensure_started()
+            queues = self._queues.setdefault(user_id, set())
+            if not queues:
+                await self._pubsub.subscribe(USER_CHANNEL.format(user_id))
+            queues.add(queue)
+
+    async def unregister(self, user_id, queue):
+        async with self._lock:
+            queues = self._queues.get(user_id)
+            if not queues:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._queues[user_id]
+                try:
+                    await self._pubsub.unsubscribe(USER_CHANNEL.format(user_id))
+                except Exception as e:
+                    logger.warning("退订失败 user=%s: %s", user_id, e)
+
+    async def _read_loop(self):
+        while True:
+            try:
+                msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # redis-py 重连时会自动重新订阅已订阅的频道
+                logger.warning("网关读取订阅消息失败: %s", e)
+                await asyncio.sleep(1)
+                continue
+            if not msg:
+                continue
+            channel = _decode(msg["channel"])
+            payload = _decode(msg["data"])
+            if channel == BROADCAST_CHANNEL:
+                targets = [q for qs in self._queues.values() for q in qs]
+            else:
+                try:
+                    user_id = int(channel.rsplit(":", 1)[1])
+                except ValueError:
+                    continue
+                targets = list(self._queues.get(user_id, ()))
+            for q in targets:
+                _offer(q, payload)
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._redis is not None:
+            await self._redis.aclose()
+        self._reader = self._pubsub = self._redis = None
+        self._queues = {}
+
+
+def _offer(queue, payload):
+    try:
+        queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        # 客户端消费不过来：清空并放入溢出标记，连接处理协程据此断开
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_OVERFLOW)
+
+
+hub = Hub()
+
+
+def _token_from_scope(scope):
+    query = parse_qs(_decode(scope.get("query_string") or b""))
+    token = (query.get("token") or [""])[0].strip()
+    if token:
+        return token
+    for name, value in scope.get("headers") or []:
+        if name == b"authorization":
+            value = _decode(value)
+            if value.startswith("Bearer "):
+                return value[7:].strip()
+    return ""
+
+
+async def _user_id_for_token(token):
+    from apps.account.session_store import get_user_id_by_token
+    if not token:
+        return None
+    return await sync_to_async(get_user_id_by_token, thread_sensitive=False)(token)
+
+
+async def _send_json(send, payload):
+    await send({"type": "websocket.send", "text": payload if isinstance(payload, str) else json.dumps(payload)})
+
+
+async def websocket_application(scope, receive, send):
+    """单个 WebSocket 连接的生命周期"""
+    event = await receive()
+    if event["type"] != "websocket.connect":
+        return
+    if scope.get("path") != WS_PATH:
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+    token = _token_from_scope(scope)
+    user_id = await _user_id_for_token(token)
+    if not user_id:
+        await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+        return
+    await send({"type": "websocket.accept"})
+
+    queue = asyncio.Queue(maxsize=QUEUE_MAX)
+    await hub.register(user_id, queue)
+    loop = asyncio.get_running_loop()
+    next_auth = loop.time() + PING_INTERVAL
+    receiving = asyncio.ensure_future(receive())
+    outgoing = asyncio.ensure_future(queue.get())
+    try:
+        while True:
+            timeout = max(0, next_auth - loop.time())
+            done, _ = await asyncio.wait({receiving, outgoing}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            # 会话复查按墙钟周期进行，与连接是否空闲无关
+            if loop.time() >= next_auth:
+                if await _user_id_for_token(token) != user_id:
+                    await send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+                    return
+                next_auth = loop.time() + PING_INTERVAL
+            if not done:
+                await _send_json(send, {"type": "ping"})
+                continue
+            if outgoing in done:
+                payload = outgoing.result()
+                if payload is _OVERFLOW:
+                    await send({"type": "websocket.close", "code": CLOSE_TOO_SLOW})
+                    return
+                await _send_json(send, payload)
+                outgoing = asyncio.ensure_future(queue.get())
+            if receiving in done:
+                event = receiving.result()
+                if event["type"] == "websocket.disconnect":
+                    return
+                text = event.get("text") or ""
+                try:
+                    msg = json.loads(text) if text else {}
+                except ValueError:
+                    msg = {}
+                if isinstance(msg, dict) and msg.get("type") == "ping":
+                    await _send_json(send, {"type": "pong"})
+                receiving = asyncio.ensure_future(receive())
+    finally:
+        receiving.cancel()
+        outgoing.cancel()
+        await hub.unregister(user_id, queue)
+
+
+async def _lifespan(scope, receive, send):
+    while True:
+        event = await receive()
+        if event["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif event["type"] == "lifespan.shutdown":
+            await hub.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def asgi_router(http_application):
+    """HTTP 交给 Django，WebSocket 交给网关，lifespan 由网关处理（关闭时释放订阅连接）"""
+    async def application(scope, receive, send):
+        if scope["type"] == "websocket":
+            return await websocket_application(scope, receive, send)
+        if scope["type"] == "lifespan":
+            return await _lifespan(scope, receive, send)
+        return await http_application(scope, receive, send)
+    return application
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+会话列表（收件箱）：每个用户一个 Redis 有序集合 im:inbox:<uid>，成员为 conversation_id，分值为会话最后活动时间（conversation.updated_at），
+会话列表一页 = 一次 ZREVRANGE + 按 id 批量取会话行（行上带最后一条消息快照 last_msg_*）。
+- 首次访问时从 conversation_member 懒加载，占位成员 "0"（分值 0）表示已预热（无会话的用户也存在）
+- 发消息时 touch 更新所有成员的分值，入群/新建会话时 join，踢出时 leave；只修改已预热的集合，未预热的下次从库加载
+Redis 不可用时 page 返回 None，调用方回退为按 updated_at 查库。
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+INBOX_KEY = "im:inbox:{}"
+WARM_MEMBER = "0"
+INBOX_TTL = 7 * 86400
+
+# 已预热时写入分值。KEYS: inbox；ARGV: score, conversation_id
+_ZADD_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+end
+return 1
+"""
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def _warm(r, user_id):
+    from .models import Conversation, ConversationMember
+    conv_ids = list(ConversationMember.objects.filter(user_id=user_id).values_list("conversation_id", flat=True))
+    scores = {WARM_MEMBER: 0}
+    if conv_ids:
+        for cid, updated_at in Conversation.objects.filter(id__in=conv_ids).values_list("id", "updated_at"):
+            scores[str(cid)] = updated_at.timestamp() if updated_at else 0
+    key = INBOX_KEY.format(user_id)
+    pipe = r.pipeline()
+    pipe.delete(key)
+    pipe.zadd(key, scores)
+    pipe.expire(key, INBOX_TTL)
+    pipe.execute()
+
+
+def page(user_id, start=0, count=None):
+    """
+    按最后活动时间倒序取一页会话 id：(conversation_ids, has_more)。
+    count 为空时返回全部；Redis 不可用返回 None
+    """
+    try:
+        r = _redis()
+        key = INBOX_KEY.format(user_id)
+        if not r.exists(key):
+            _warm(r, user_id)
+        stop = -1 if count is None else start + count
+        pipe = r.pipeline()
+        pipe.zrevrange(key, start, stop)
+        pipe.expire(key, INBOX_TTL)
+        members = pipe.execute()[0]
+    except Exception as e:
+        logger.warning("读取会话列表缓存失败 user=%s: %s", user_id, e)
+        return None
+    ids = [int(m) for m in members if int(m)]
+    if count is None:
+        return ids, False
+    return ids[:count], len(ids) > count
+
+
+def touch(conversation_id, user_ids, ts):
+    """会话有新消息：成员收件箱中该会话的分值更新为 ts（秒级时间戳）"""
+    if not user_ids:
+        return
+    try:
+        r = _redis()
+        script = r.register_script(_ZADD_IF_EXISTS)
+        pipe = r.pipeline()
+        for uid in user_ids:
+            script(keys=[INBOX_KEY.format(uid)], args=[ts, conversation_id], client=pipe)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("更新会话列表缓存失败 conversation=%s: %s", conversation_id, e)
+        reset(*user_ids)
+
+
+def join(conversation_id, user_ids):
+    """用户加入会话（新建单聊/建群/入群）后调用"""
+    from .models import Conversation
+    updated_at = Conversation.objects.filter(id=conversation_id).values_list("updated_at", flat=True).first()
+    touch(conversation_id, user_ids, updated_at.timestamp() if updated_at else 0)
+
+
+def leave(conversation_id, user_id):
+    try:
+        _redis().zrem(INBOX_KEY.format(user_id), conversation_id)
+    except Exception as e:
+        logger.warning("移除会话列表缓存失败 user=%s: %s", user_id, e)
+        reset(user_id)
+
+
+def reset(*user_ids):
+    """删除缓存，下次访问从库加载"""
+    if not user_ids:
+        return
+    try:
+        _redis().delete(*[INBOX_KEY.format(uid) for uid in user_ids])
+    except Exception:
+        pass
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+回填会话消息搜索索引：把历史文本消息按 bigram 写入 message_search_token。
+用法：python manage.py backfill_message_search --batch 1000 [--from-id 0]
+需先执行 sql/migrate_message_search.sql；INSERT IGNORE 写入，可重复执行或从中断处（--from-id）继续。
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.im.search import MAX_TOKENS, TOKEN_TABLE, tokens
+
+
+class Command(BaseCommand):
+    help = "回填会话消息搜索倒排索引"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="每批处理消息数")
+        parser.add_argument("--from-id", type=int, default=0, help="从大于该 id 的消息开始")
+
+    def handle(self, *args, **options):
+        batch = max(1, options["batch"])
+        last_id = options["from_id"]
+        total = 0
+        while True:
+            with connection.cursor() as c:
+                c.execute(
+                    "SELECT id, conversation_id, content_encrypted FROM message "
+                    "WHERE id > %s AND type = 'text' ORDER BY id LIMIT %s",
+                    [last_id, batch],
+                )
+                rows = c.fetchall()
+                if not rows:
+                    break
+                values = [
+                    (conv_id, t, mid)
+                    for mid, conv_id, content in rows
+                    for t in tokens(content)[:MAX_TOKENS]
+                ]
+                if values:
+                    c.executemany(
+                        f"INSERT IGNORE INTO {TOKEN_TABLE} (conversation_id, token, message_id) VALUES (%s, %s, %s)",
+                        values,
+                    )
+            total += len(rows)
+            last_id = rows[-1][0]
+            self.stdout.write(f"已处理到消息 {last_id}，累计 {total} 条")
+        self.stdout.write(f"回填完成，共 {total} 条消息")
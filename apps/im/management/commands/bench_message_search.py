@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+会话消息搜索基准：在独立表 bench_message / bench_message_search_token 中生成一个大会话（默认 10 万条），
+对比原 LIKE 查询与倒排索引（apps.im.search）在高频词、长尾词、无结果词下的延迟。
+用法：python manage.py bench_message_search --size 100000 --queries 30
+不读写线上 message 表；默认结束后删除两张表（--keep 保留）。
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from apps.im.search import search, tokens
+
+MESSAGE_TABLE = "bench_message"
+TOKEN_TABLE = "bench_message_search_token"
+CONVERSATION_ID = 1
+INSERT_BATCH = 2000
+# 按常见程度排列，生成内容时按 1/rank 加权
+WORDS = (
+    "好的", "哈哈", "今天", "我们", "明天", "晚上", "老师", "谢谢", "什么时候", "可以", "八字", "运势",
+    "喜用神", "五行", "养生", "调理", "睡眠", "中医", "体质", "湿气", "艾灸", "穴位", "经络", "脾胃",
+    "流年", "大运", "财运", "桃花", "风水", "节气", "茶饮", "药膳", "红豆薏米", "八段锦", "黄帝内经", "梅花易数",
+)
+MISSING_WORD = "量子纠缠"
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+class Command(BaseCommand):
+    help = "对比会话消息 LIKE 搜索与倒排索引的延迟"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=100000, help="会话消息条数")
+        parser.add_argument("--queries", type=int, default=30, help="每种查询执行次数")
+        parser.add_argument("--keep", action="store_true", help="结束后保留基准表")
+
+    def handle(self, *args, **options):
+        self._create_tables()
+        try:
+            self._fill(options["size"], random.Random(42))
+            self._report(options["queries"])
+        finally:
+            if not options["keep"]:
+                with connection.cursor() as c:
+                    c.execute(f"DROP TABLE IF EXISTS {MESSAGE_TABLE}")
+                    c.execute(f"DROP TABLE IF EXISTS {TOKEN_TABLE}")
+
+    def _create_tables(self):
+        with connection.cursor() as c:
+            c.execute(f"DROP TABLE IF EXISTS {MESSAGE_TABLE}")
+            c.execute(f"DROP TABLE IF EXISTS {TOKEN_TABLE}")
+            c.execute(f"CREATE TABLE {MESSAGE_TABLE} LIKE message")
+            c.execute(f"CREATE TABLE {TOKEN_TABLE} LIKE message_search_token")
+
+    def _fill(self, size, rng):
+        weights = [1.0 / (i + 1) for i in range(len(WORDS))]
+        now = timezone.now()
+        started = time.monotonic()
+        with connection.cursor() as c:
+            c.execute(f"SELECT COALESCE(MAX(id), 0) FROM {MESSAGE_TABLE}")
+            next_id = c.fetchone()[0] + 1
+        done = 0
+        while done < size:
+            n = min(INSERT_BATCH, size - done)
+            rows = []
+            token_rows = []
+            for i in range(n):
+                mid = next_id + done + i
+                content = "，".join(rng.choices(WORDS, weights=weights, k=rng.randint(2, 12)))
+                created = now - timedelta(seconds=(size - done - i) * 30)
+                rows.append((mid, CONVERSATION_ID, rng.randint(1, 200), "text", content, created))
+                token_rows.extend((CONVERSATION_ID, t, mid) for t in tokens(content))
+            with connection.cursor() as c:
+                c.executemany(
+                    f"INSERT INTO {MESSAGE_TABLE} (id, conversation_id, sender_id, type, content_encrypted, status, created_at) "
+                    "VALUES (%s, %s, %s, %s, %s, 1, %s)",
+                    rows,
+                )
+                c.executemany(
+                    f"INSERT IGNORE INTO {TOKEN_TABLE} (conversation_id, token, message_id) VALUES (%s, %s, %s)",
+                    token_rows,
+                )
+            done += n
+        self.stdout.write(f"== 会话 {size} 条消息（生成+建索引 {time.monotonic() - started:.1f}s）")
+
+    def _time(self, fn, times):
+        samples = []
+        for _ in range(times):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+        return samples
+
+    def _like(self, kw):
+        # 与原 message_list 的 keyword 分支一致：会话内 LIKE，按 id 倒序取第一页
+        with connection.cursor() as c:
+            c.execute(
+                f"SELECT id FROM {MESSAGE_TABLE} WHERE conversation_id = %s AND status = 1 "
+                "AND content_encrypted LIKE %s ORDER BY id DESC LIMIT 20",
+                [CONVERSATION_ID, f"%{kw}%"],
+            )
+            c.fetchall()
+
+    def _report(self, times):
+        cases = [("高频词", WORDS[1]), ("长尾词", WORDS[-1]), ("无结果", MISSING_WORD)]
+        for label, kw in cases:
+            runs = [
+                ("LIKE", lambda: self._like(kw)),
+                ("倒排索引", lambda: search(
+                    CONVERSATION_ID, kw, limit=20, message_table=MESSAGE_TABLE, token_table=TOKEN_TABLE,
+                )),
+            ]
+            for name, fn in runs:
+                samples = self._time(fn, times)
+                self.stdout.write(
+                    f"{label}「{kw}」 {name}: p50 {statistics.median(samples):.1f}ms "
+                    f"p95 {_percentile(samples, 0.95):.1f}ms avg {statistics.mean(samples):.1f}ms"
+                )
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket 网关压测 / 联调：对运行中的网关建立 N 个并发连接（每个连接一个临时会话），
+经本地 Redis 向每个用户发布事件，统计建连耗时、送达率与端到端推送延迟。
+用法：
+  python manage.py bench_ws_gateway --connections 1                 # 冒烟：本地 Redis + 网关是否打通
+  python manage.py bench_ws_gateway --connections 5000 --rounds 3   # 单进程并发连接压测
+网关需先启动（uvicorn config.asgi:application --port 8090 --workers 1，单进程才能测出每进程承载量）。
+压测端与网关都需调高文件句柄上限（ulimit -n）。临时会话结束后删除，用户 id 从 --base-user-id 起，不需要真实存在。
+"""
+import asyncio
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.account.session_store import create_session, remove_session
+from apps.im.realtime import USER_CHANNEL, encode
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+class Command(BaseCommand):
+    help = "WebSocket 网关并发连接与推送延迟压测"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="ws://127.0.0.1:8090/api/im/ws", help="网关地址")
+        parser.add_argument("--connections", type=int, default=1000, help="并发连接数")
+        parser.add_argument("--ramp", type=int, default=200, help="同时进行中的建连数上限")
+        parser.add_argument("--rounds", type=int, default=1, help="每个连接接收的事件轮数")
+        parser.add_argument("--base-user-id", type=int, default=900000000, help="临时会话使用的起始用户 id")
+        parser.add_argument("--timeout", type=float, default=10, help="等待送达的秒数")
+
+    def handle(self, *args, **options):
+        n = options["connections"]
+        tokens = {options["base_user_id"] + i: create_session(options["base_user_id"] + i, "bench") for i in range(n)}
+        try:
+            asyncio.run(self._run(tokens, options))
+        finally:
+            for token in tokens.values():
+                remove_session(token)
+
+    async def _run(self, tokens, options):
+        import redis.asyncio as aioredis
+        import websockets
+        from django.conf import settings
+
+        sem = asyncio.Semaphore(options["ramp"])
+        connect_ms = []
+        sockets = {}
+        failed = 0
+
+        async def open_one(uid, token):
+            nonlocal failed
+            async with sem:
+                t0 = time.perf_counter()
+                try:
+                    sockets[uid] = await websockets.connect(f"{options['url']}?token={token}", open_timeout=30)
+                    connect_ms.append((time.perf_counter() - t0) * 1000)
+                except Exception:
+                    failed += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*[open_one(uid, token) for uid, token in tokens.items()])
+        self.stdout.write(
+            f"建连 {len(sockets)}/{len(tokens)}（失败 {failed}），总耗时 {time.perf_counter() - t0:.1f}s"
+            + (f"，单连接 p50 {_percentile(connect_ms, 0.5):.1f}ms p99 {_percentile(connect_ms, 0.99):.1f}ms" if connect_ms else "")
+        )
+        if not sockets:
+            return
+
+        latencies = []
+        expected = len(sockets) * options["rounds"]
+
+        async def read_one(ws):
+            got = 0
+            while got < options["rounds"]:
+                msg = json.loads(await ws.recv())
+                if msg.get("type") == "bench":
+                    latencies.append((time.time() - msg["data"]["sentAt"]) * 1000)
+                    got += 1
+
+        readers = [asyncio.ensure_future(read_one(ws)) for ws in sockets.values()]
+        r = aioredis.from_url(settings.CACHES["default"]["LOCATION"])
+        try:
+            for round_no in range(options["rounds"]):
+                pipe = r.pipeline(transaction=False)
+                for uid in sockets:
+                    pipe.publish(USER_CHANNEL.format(uid), encode("bench", {"round": round_no, "sentAt": time.time()}))
+                await pipe.execute()
+            await asyncio.wait(readers, timeout=options["timeout"])
+        finally:
+            for task in readers:
+                task.cancel()
+            await r.aclose()
+            await asyncio.gather(*[ws.close() for ws in sockets.values()], return_exceptions=True)
+
+        self.stdout.write(f"送达 {len(latencies)}/{expected}")
+        if latencies:
+            self.stdout.write(
+                f"推送延迟 p50 {_percentile(latencies, 0.5):.1f}ms p99 {_percentile(latencies, 0.99):.1f}ms "
+                f"max {max(latencies):.1f}ms mean {statistics.mean(latencies):.1f}ms"
+            )
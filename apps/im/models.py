@@ -6,6 +6,12 @@ class Conversation(models.Model):
     id = models.BigAutoField(primary_key=True)
     type = models.CharField(max_length=20)  # single / group
     name = models.CharField(max_length=128, null=True, blank=True)
+    # 最后一条消息快照，send_message 时更新，会话列表直接读取
+    last_msg_id = models.BigIntegerField(null=True, blank=True)
+    last_msg_type = models.CharField(max_length=20, null=True, blank=True)
+    last_msg_preview = models.CharField(max_length=100, null=True, blank=True)
+    last_msg_sender_id = models.BigIntegerField(null=True, blank=True)
+    last_msg_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -22,6 +28,7 @@ class ConversationMember(models.Model):
     mute = models.SmallIntegerField(default=0)
     top = models.SmallIntegerField(default=0)
     last_read_msg_id = models.BigIntegerField(null=True, blank=True)
+    unread_count = models.IntegerField(default=0)  # 发消息时累加、标记已读时重置
     joined_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+实时推送（发布端）：业务代码在请求内把事件 PUBLISH 到 Redis 频道，WebSocket 网关（gateway.py）订阅后推给在线连接。
+- rt:user:<uid>  发给单个用户的事件
+- rt:broadcast   发给所有在线连接的事件（如平台公告）
+事件为 JSON：{"type": "message" | "notification" | "voice_match", "data": {...}}。
+推送是尽力而为：不在线或 Redis 不可用时直接丢弃，客户端重连后按 HTTP 接口补齐。
+"""
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+USER_CHANNEL = "rt:user:{}"
+BROADCAST_CHANNEL = "rt:broadcast"
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def encode(event_type, data):
+    return json.dumps({"type": event_type, "data": data}, ensure_ascii=False, default=str)
+
+
+def push(user_ids, event_type, data):
+    """给一批用户推送同一事件"""
+    user_ids = [uid for uid in dict.fromkeys(user_ids) if uid]
+    if not user_ids:
+        return
+    payload = encode(event_type, data)
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for uid in user_ids:
+            pipe.publish(USER_CHANNEL.format(uid), payload)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("实时推送失败 type=%s: %s", event_type, e)
+
+
+def broadcast(event_type, data):
+    """推送给所有在线连接"""
+    try:
+        _redis().publish(BROADCAST_CHANNEL, encode(event_type, data))
+    except Exception as e:
+        logger.warning("实时广播失败 type=%s: %s", event_type, e)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+会话内消息搜索：每个会话一份倒排索引 message_search_token(conversation_id, token, message_id)，
+替代 content_encrypted LIKE '%kw%' 扫描会话全部历史。
+- 分词：小写后取连续的中文/字母数字片段，按相邻二元组（bigram）切分，与帖子搜索 ngram_token_size=2 的口径一致
+- send_message 落库文本消息后 index_message 写入（INSERT IGNORE，可重复执行）；历史消息由 backfill_message_search 回填
+- 查询：关键词全部 token 都命中的消息为候选（按 message_id 新到旧最多 CANDIDATE_LIMIT 条），回表校验确实包含每个关键词，
+  去掉 bigram 拼接造成的误命中，已撤回/删除（status != 1）的消息不返回
+- 召回上限：只在最新的 CANDIDATE_LIMIT 条命中中排序，常见词在大群里更早的命中不会出现在结果中。
+  这是有意的取舍：单次搜索的回表与打分成本固定，不随会话历史增长；要找更早的消息需用更具体的关键词
+- 排序：按关键词出现次数倒序、同分新到旧；游标为 "r:<offset>"，与帖子搜索一致
+- 关键词含长度 1 的片段（单字、单个字母）时无法用 bigram 命中，返回 None，调用方回退为 LIKE
+"""
+import re
+
+from django.db import connection
+
+from apps.community.search import encode_relevance_cursor
+
+TOKEN_TABLE = "message_search_token"
+MESSAGE_TABLE = "message"
+MAX_TOKENS = 2000  # 消息内容上限 2000 字，等同不截断
+CANDIDATE_LIMIT = 2000  # 召回上限：只对最新的这么多条命中排序（见模块说明）
+RELEVANCE_MAX_OFFSET = 1000
+
+_SEGMENT_RE = re.compile(r"[0-9a-z\u3400-\u9fff]+")
+
+
+def tokens(text):
+    """文本 -> 去重后的 bigram 列表（长度 1 的片段不产生 token）"""
+    out = []
+    for seg in _SEGMENT_RE.findall((text or "").lower()):
+        out.extend(seg[i: i + 2] for i in range(len(seg) - 1))
+    return list(dict.fromkeys(out))
+
+
+def query_terms(keyword):
+    """关键词 -> (按空白切分的小写关键词, 全部 token)；无法用索引命中时返回 None"""
+    terms = [t for t in (keyword or "").lower().split() if t]
+    if not terms:
+        return None
+    segments = [seg for t in terms for seg in _SEGMENT_RE.findall(t)]
+    if not segments or any(len(seg) < 2 for seg in segments):
+        return None
+    return terms, tokens(" ".join(terms))
+
+
+def index_message(conversation_id, message_id, text, token_table=TOKEN_TABLE):
+    toks = tokens(text)[:MAX_TOKENS]
+    if not toks:
+        return
+    with connection.cursor() as c:
+        c.executemany(
+            f"INSERT IGNORE INTO {token_table} (conversation_id, token, message_id) VALUES (%s, %s, %s)",
+            [(conversation_id, t, message_id) for t in toks],
+        )
+
+
+def search(conversation_id, keyword, offset=0, limit=20, message_table=MESSAGE_TABLE, token_table=TOKEN_TABLE):
+    """
+    会话内按相关度取一页消息 id。
+    :return: (ids, has_more, next_cursor)；关键词无法用索引命中时返回 None
+    """
+    parsed = query_terms(keyword)
+    if parsed is None:
+        return None
+    terms, toks = parsed
+    offset = min(offset, RELEVANCE_MAX_OFFSET)
+    placeholders = ",".join(["%s"] * len(toks))
+    with connection.cursor() as c:
+        c.execute(
+            f"SELECT message_id FROM {token_table} WHERE conversation_id = %s AND token IN ({placeholders}) "
+            "GROUP BY message_id HAVING COUNT(*) = %s ORDER BY message_id DESC LIMIT %s",
+            [conversation_id] + toks + [len(toks), CANDIDATE_LIMIT],
+        )
+        candidates = [row[0] for row in c.fetchall()]
+        if not candidates:
+            return [], False, None
+        c.execute(
+            f"SELECT id, content_encrypted FROM {message_table} "
+            f"WHERE id IN ({','.join(['%s'] * len(candidates))}) AND status = 1",
+            candidates,
+        )
+        rows = c.fetchall()
+    scored = []
+    for mid, content in rows:
+        text = (content or "").lower()
+        if all(t in text for t in terms):
+            scored.append((sum(text.count(t) for t in terms), mid))
+    scored.sort(reverse=True)
+    ids = [mid for _, mid in scored[offset: offset + limit + 1]]
+    has_more = len(ids) > limit and offset + limit < RELEVANCE_MAX_OFFSET
+    ids = ids[:limit]
+    return ids, has_more, (encode_relevance_cursor(offset + limit) if has_more else None)
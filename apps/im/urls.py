@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path("conversations", views.conversation_list),
+    path("messages/sync", views.message_sync),
     path("conversation/single", views.get_or_create_single),
     path("conversation/single-with-master", views.get_or_create_single_with_master),
     path("conversation/group", views.create_group),
@@ -2,9 +2,11 @@
 自研 IM：会话列表、单聊、群聊、消息收发、聊天申请、可加入群聊、名师咨询付费
 """
 import uuid
+from datetime import timedelta
 from decimal import Decimal
-from django.db import connection
-from django.db.models import Max, Q
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
@@ -12,10 +14,18 @@ from rest_framework.response import Response
 
 from apps.account.models import User, UserWallet, WalletLog
 from apps.account.session_store import get_user_id_by_token
+from apps.system.oss_signer import refresh_url_map, to_object_key
 from apps.system.oss_upload import refresh_oss_url_if_applicable
+from . import inbox, realtime, search
+from apps.community.search import decode_relevance_cursor
 from .models import Conversation, ConversationMember, Message, ChatApply, ImGroup
 
 
+# message_sync 的水位只推进到创建超过该秒数的消息：消息 id 在 INSERT 时分配、COMMIT 后才可见，
+# 更早分配但尚未提交的 id 在这段时间内都已提交，水位不会越过它们（发送事务远短于该时长）
+SYNC_SETTLE_SECONDS = 5
+
+
 def _result(code=0, message="success", data=None):
     return {"code": code, "message": message, "data": data}
 
@@ -42,76 +52,76 @@ def _conversation_last_message_preview(last_msg):
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def conversation_list(request):
-    """我的会话列表（私聊+群聊混合），按最后消息时间倒序"""
+    """
+    我的会话列表（私聊+群聊混合），按最后活动时间倒序。
+    顺序取自 Redis 收件箱（见 inbox.py），最后一条消息取会话行上的快照；传 page_size 时分页，不传返回全部
+    """
     user_id = _user_id_from_request(request)
     if not user_id:
         return Response(_result(401, "请先登录"), status=status.HTTP_401_UNAUTHORIZED)
-
-    my_conv_ids = list(
-        ConversationMember.objects.filter(user_id=user_id).values_list("conversation_id", flat=True)
+    page = max(1, int(request.GET.get("page") or 1))
+    page_size = request.GET.get("page_size")
+    page_size = min(100, max(1, int(page_size))) if page_size else None
+    start = (page - 1) * page_size if page_size else 0
+
+    cached = inbox.page(user_id, start, page_size)
+    if cached is not None:
+        conv_ids, has_more = cached
+        by_id = Conversation.objects.in_bulk(conv_ids)
+        convs = [by_id[cid] for cid in conv_ids if cid in by_id]
+    else:
+        qs = Conversation.objects.filter(
+            id__in=ConversationMember.objects.filter(user_id=user_id).values("conversation_id")
+        ).order_by("-updated_at")
+        convs = list(qs[start : start + page_size + 1]) if page_size else list(qs)
+        has_more = bool(page_size) and len(convs) > page_size
+        convs = convs[:page_size] if page_size else convs
+    if not convs:
+        return Response(_result(data={"list": [], "hasMore": False}))
+
+    conv_ids = [c.id for c in convs]
+    unread_by_conv = dict(
+        ConversationMember.objects.filter(conversation_id__in=conv_ids, user_id=user_id)
+        .values_list("conversation_id", "unread_count")
     )
-    if not my_conv_ids:
-        return Response(_result(data={"list": []}))
-
-    convs = list(Conversation.objects.filter(id__in=my_conv_ids).order_by("-updated_at"))
-    last_msg_map = {}
-    for m in Message.objects.filter(conversation_id__in=my_conv_ids).values("conversation_id").annotate(
-        mid=Max("id")
-    ):
-        last_msg_map[m["conversation_id"]] = m["mid"]
-    last_msgs = {}
-    if last_msg_map:
-        for msg in Message.objects.filter(id__in=last_msg_map.values()):
-            last_msgs[msg.id] = msg
-
-    members_by_conv = {}
-    last_read_by_conv = {}
-    for cm in ConversationMember.objects.filter(conversation_id__in=my_conv_ids):
-        if cm.user_id == user_id:
-            last_read_by_conv[cm.conversation_id] = cm.last_read_msg_id or 0
-        members_by_conv.setdefault(cm.conversation_id, []).append(cm.user_id)
-
-    user_ids = set()
-    for uids in members_by_conv.values():
-        user_ids.update(uids)
-    user_ids.discard(user_id)
-    users = {u.id: u for u in User.objects.filter(id__in=user_ids)} if user_ids else {}
+    # 只有单聊需要对方资料
+    single_ids = [c.id for c in convs if c.type == "single"]
+    peer_by_conv = {}
+    if single_ids:
+        for cid, uid in (
+            ConversationMember.objects.filter(conversation_id__in=single_ids)
+            .exclude(user_id=user_id)
+            .values_list("conversation_id", "user_id")
+        ):
+            peer_by_conv.setdefault(cid, uid)
+    peer_ids = set(peer_by_conv.values())
+    users = {u.id: u for u in User.objects.filter(id__in=peer_ids)} if peer_ids else {}
+    avatar_map = refresh_url_map([getattr(u, "avatar_url", None) for u in users.values()])
 
     items = []
     for c in convs:
-        last_id = last_msg_map.get(c.id)
-        last_msg = last_msgs.get(last_id) if last_id else None
         peer_name = c.name or "群聊"
-        if c.type == "single":
-            uids = members_by_conv.get(c.id, [])
-            other = [x for x in uids if x != user_id]
-            if other:
-                u = users.get(other[0])
-                peer_name = getattr(u, "nickname", None) or f"用户{other[0]}"
-        last_read = last_read_by_conv.get(c.id, 0)
-        unread = Message.objects.filter(
-            conversation_id=c.id, id__gt=last_read
-        ).exclude(sender_id=user_id).count()
+        peer_id = peer_by_conv.get(c.id) if c.type == "single" else None
+        if peer_id:
+            u = users.get(peer_id)
+            peer_name = getattr(u, "nickname", None) or f"用户{peer_id}"
         item = {
             "conversationId": c.id,
             "type": c.type,
             "title": peer_name,
-            "lastMessage": _conversation_last_message_preview(last_msg),
-            "lastMessageType": last_msg.type if last_msg else None,
-            "lastMessageAt": last_msg.created_at.isoformat() if last_msg and last_msg.created_at else None,
-            "unreadCount": unread,
+            "lastMessage": c.last_msg_preview or "",
+            "lastMessageType": c.last_msg_type,
+            "lastMessageAt": c.last_msg_at.isoformat() if c.last_msg_at else None,
+            "unreadCount": unread_by_conv.get(c.id) or 0,
         }
-        if c.type == "single":
-            uids = members_by_conv.get(c.id, [])
-            other = [x for x in uids if x != user_id]
-            if other:
-                peer_id = other[0]
-                item["peerUserId"] = peer_id
-                u = users.get(peer_id)
-                if u:
-                    item["avatarUrl"] = refresh_oss_url_if_applicable(getattr(u, "avatar_url", None)) or None
+        if peer_id:
+            item["peerUserId"] = peer_id
+            u = users.get(peer_id)
+            if u:
+                avatar_url = getattr(u, "avatar_url", None)
+                item["avatarUrl"] = avatar_map.get(avatar_url, avatar_url) or None
         items.append(item)
-    return Response(_result(data={"list": items}))
+    return Response(_result(data={"list": items, "hasMore": has_more}))
 
 
 @api_view(["POST"])
@@ -148,6 +158,7 @@ def get_or_create_single(request):
     c = Conversation.objects.create(type="single", name=None)
     ConversationMember(conversation_id=c.id, user_id=user_id).save()
     ConversationMember(conversation_id=c.id, user_id=target_id).save()
+    inbox.join(c.id, [user_id, target_id])
     u = User.objects.filter(id=target_id).first()
     title = getattr(u, "nickname", None) or f"用户{target_id}"
     return Response(_result(data={"conversationId": c.id, "type": "single", "title": title}))
@@ -277,6 +288,7 @@ def create_group(request):
     c = Conversation.objects.create(type="group", name=name)
     for uid in all_user_ids:
         ConversationMember.objects.create(conversation_id=c.id, user_id=uid, role="owner" if uid == user_id else "member")
+    inbox.join(c.id, all_user_ids)
     try:
         is_public = 1 if request.data.get("isPublic") is True else 0
         with connection.cursor() as cur:
@@ -302,13 +314,55 @@ def _get_or_create_single_bulk(user_id, target_id):
     c = Conversation.objects.create(type="single", name=None)
     ConversationMember.objects.create(conversation_id=c.id, user_id=user_id)
     ConversationMember.objects.create(conversation_id=c.id, user_id=target_id)
+    inbox.join(c.id, [user_id, target_id])
     return c, True
 
 
+def _serialize_messages(msgs, with_conversation=False):
+    """消息列表 -> 接口 dict；发送者头像与图片消息（库中为 object key）整批一次签名"""
+    sender_ids = list({m.sender_id for m in msgs})
+    users = {u.id: u for u in User.objects.filter(id__in=sender_ids)} if sender_ids else {}
+    avatar_map = refresh_url_map(
+        [getattr(u, "avatar_url", None) for u in users.values()]
+        + [m.content_encrypted for m in msgs if m.type == "image"]
+    )
+    items = []
+    for m in msgs:
+        u = users.get(m.sender_id)
+        avatar_url = getattr(u, "avatar_url", None)
+        item = {
+            "id": m.id,
+            "senderId": m.sender_id,
+            "nickname": getattr(u, "nickname", None) or f"用户{m.sender_id}",
+            "avatarUrl": avatar_map.get(avatar_url, avatar_url),
+            "type": m.type,
+            "content": (avatar_map.get(m.content_encrypted, m.content_encrypted) if m.type == "image" else m.content_encrypted) or "",
+            "createdAt": m.created_at.isoformat() if m.created_at else None,
+        }
+        if with_conversation:
+            item["conversationId"] = m.conversation_id
+        items.append(item)
+    return items
+
+
+def _int_param(request, name):
+    try:
+        return int(request.GET.get(name) or 0) or None
+    except (TypeError, ValueError):
+        return None
+
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def message_list(request, conversation_id):
-    """会话消息列表，分页，按时间正序"""
+    """
+    会话消息列表，按时间正序。走 (conversation_id, id) 索引：
+    - since_id：增量同步，返回 id > since_id 的最早 page_size 条，hasMore 表示还有更新的消息
+    - before_id：向上翻历史，返回 id < before_id 的最近 page_size 条，hasMore 表示还有更早的消息
+    - keyword：会话内搜索，走倒排索引按相关度排序，cursor 翻页（nextCursor），未传 cursor 时按 page 计算偏移（兼容旧客户端）；
+      只对最新的 search.CANDIDATE_LIMIT 条命中排序；关键词过短时回退 LIKE + page 分页
+    - 都不传时按 page 分页（兼容旧客户端）
+    """
     user_id = _user_id_from_request(request)
     if not user_id:
         return Response(_result(401, "请先登录"), status=status.HTTP_401_UNAUTHORIZED)
@@ -318,27 +372,90 @@ def message_list(request, conversation_id):
     page = max(1, int(request.GET.get("page") or 1))
     page_size = min(50, max(1, int(request.GET.get("page_size") or 20)))
     keyword = (request.GET.get("keyword") or "").strip()
-    start = (page - 1) * page_size
+    since_id = _int_param(request, "since_id")
+    before_id = _int_param(request, "before_id")
     qs = Message.objects.filter(conversation_id=conversation_id, status=1)
     if keyword:
-        qs = qs.filter(content_encrypted__icontains=keyword)
-    qs = qs.order_by("-id")[start : start + page_size]
-    msgs = list(reversed(list(qs)))
-    sender_ids = list({m.sender_id for m in msgs})
-    users = {u.id: u for u in User.objects.filter(id__in=sender_ids)} if sender_ids else {}
-    items = []
-    for m in msgs:
-        u = users.get(m.sender_id)
-        items.append({
-            "id": m.id,
-            "senderId": m.sender_id,
-            "nickname": getattr(u, "nickname", None) or f"用户{m.sender_id}",
-            "avatarUrl": refresh_oss_url_if_applicable(getattr(u, "avatar_url", None)),
-            "type": m.type,
-            "content": m.content_encrypted or "",
-            "createdAt": m.created_at.isoformat() if m.created_at else None,
-        })
-    return Response(_result(data={"list": items, "hasMore": len(msgs) == page_size}))
+        offset = decode_relevance_cursor(request.GET.get("cursor"))
+        if offset is None:
+            offset = (page - 1) * page_size
+        try:
+            found = search.search(conversation_id, keyword, offset=offset, limit=page_size)
+        except Exception:
+            found = None  # 未执行 migrate_message_search.sql 时回退 LIKE
+        if found is not None:
+            ids, has_more, next_cursor = found
+            by_id = qs.in_bulk(ids)
+            msgs = [by_id[i] for i in ids if i in by_id]
+            return Response(_result(data={"list": _serialize_messages(msgs), "hasMore": has_more, "nextCursor": next_cursor}))
+    if since_id and not keyword:
+        msgs = list(qs.filter(id__gt=since_id).order_by("id")[: page_size + 1])
+        has_more = len(msgs) > page_size
+        msgs = msgs[:page_size]
+    elif before_id and not keyword:
+        msgs = list(qs.filter(id__lt=before_id).order_by("-id")[: page_size + 1])
+        has_more = len(msgs) > page_size
+        msgs = list(reversed(msgs[:page_size]))
+    else:
+        start = (page - 1) * page_size
+        if keyword:
+            qs = qs.filter(content_encrypted__icontains=keyword)
+        msgs = list(reversed(list(qs.order_by("-id")[start : start + page_size])))
+        has_more = len(msgs) == page_size
+    return Response(_result(data={"list": _serialize_messages(msgs), "hasMore": has_more}))
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def message_sync(request):
+    """
+    多会话增量同步：一次取回所有会话中 id > since_id 的新消息，客户端保存返回的 watermark，下次作为 since_id。
+    先按会话行上的 last_msg_id 找出有新消息的会话，再按 (conversation_id, id) 索引取消息，按 id 正序最多 limit 条；
+    hasMore 时用返回的 watermark 继续调用。conversations 为这些会话的未读数与最后一条消息，用于刷新会话列表。
+    消息 id 全局递增但跨会话不按提交顺序可见，watermark 只推进到创建超过 SYNC_SETTLE_SECONDS 秒的消息，
+    更新的消息下次同步会再次返回，客户端按消息 id 去重。
+    """
+    user_id = _user_id_from_request(request)
+    if not user_id:
+        return Response(_result(401, "请先登录"), status=status.HTTP_401_UNAUTHORIZED)
+    since_id = _int_param(request, "since_id") or 0
+    limit = min(500, max(1, int(request.GET.get("limit") or 200)))
+    my_conv_ids = ConversationMember.objects.filter(user_id=user_id).values("conversation_id")
+    changed = list(Conversation.objects.filter(id__in=my_conv_ids, last_msg_id__gt=since_id))
+    if not changed:
+        return Response(_result(data={"messages": [], "conversations": [], "watermark": since_id, "hasMore": False}))
+    changed_ids = [c.id for c in changed]
+    msgs = list(
+        Message.objects.filter(conversation_id__in=changed_ids, id__gt=since_id, status=1).order_by("id")[: limit + 1]
+    )
+    has_more = len(msgs) > limit
+    msgs = msgs[:limit]
+    unread_by_conv = dict(
+        ConversationMember.objects.filter(conversation_id__in=changed_ids, user_id=user_id)
+        .values_list("conversation_id", "unread_count")
+    )
+    conversations = [
+        {
+            "conversationId": c.id,
+            "type": c.type,
+            "lastMessage": c.last_msg_preview or "",
+            "lastMessageType": c.last_msg_type,
+            "lastMessageAt": c.last_msg_at.isoformat() if c.last_msg_at else None,
+            "unreadCount": unread_by_conv.get(c.id) or 0,
+        }
+        for c in changed
+    ]
+    # 水位只推进到已返回且创建超过 SYNC_SETTLE_SECONDS 的最后一条消息；整页都太新时不再翻页，等下次同步
+    cutoff = timezone.now() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    settled = [m.id for m in msgs if m.created_at and m.created_at <= cutoff]
+    watermark = settled[-1] if settled else since_id
+    has_more = has_more and watermark > since_id
+    return Response(_result(data={
+        "messages": _serialize_messages(msgs, with_conversation=True),
+        "conversations": conversations,
+        "watermark": watermark,
+        "hasMore": has_more,
+    }))
 
 
 @api_view(["POST"])
@@ -359,25 +476,58 @@ def send_message(request, conversation_id):
         return Response(_result(400, "图片地址不能为空"), status=status.HTTP_400_BAD_REQUEST)
     if msg_type == "post" and not content:
         return Response(_result(400, "帖子信息不能为空"), status=status.HTTP_400_BAD_REQUEST)
-
-    msg = Message.objects.create(
-        conversation_id=conversation_id,
-        sender_id=user_id,
-        type=msg_type,
-        content_encrypted=content[:2000],
-        status=1,
-    )
-    Conversation.objects.filter(id=conversation_id).update(updated_at=msg.created_at)
+    if msg_type == "image":
+        # 图片消息入库存 object key，拉取消息时再签名
+        content = to_object_key(content)
+
+    # 消息、会话快照、未读数在同一事务提交：message_sync 按快照找会话时，消息一定已可见。
+    # 先锁会话行再插入，同一会话内消息 id 的分配顺序与提交顺序一致，message_list 的 since_id 不会漏读
+    with transaction.atomic():
+        list(Conversation.objects.select_for_update().filter(id=conversation_id).values_list("id", flat=True))
+        msg = Message.objects.create(
+            conversation_id=conversation_id,
+            sender_id=user_id,
+            type=msg_type,
+            content_encrypted=content[:2000],
+            status=1,
+        )
+        # 最后一条消息快照写在会话行上，只向前推进（并发发送时保留 id 较大的一条）
+        Conversation.objects.filter(id=conversation_id).filter(
+            Q(last_msg_id__isnull=True) | Q(last_msg_id__lt=msg.id)
+        ).update(
+            updated_at=msg.created_at,
+            last_msg_id=msg.id,
+            last_msg_type=msg.type,
+            last_msg_preview=_conversation_last_message_preview(msg)[:100],
+            last_msg_sender_id=user_id,
+            last_msg_at=msg.created_at,
+        )
+        # 其他成员未读数 +1（一条 UPDATE，走 uk_conv_user）
+        with connection.cursor() as c:
+            c.execute(
+                "UPDATE conversation_member SET unread_count = unread_count + 1 WHERE conversation_id = %s AND user_id != %s",
+                [conversation_id, user_id],
+            )
+    member_ids = list(ConversationMember.objects.filter(conversation_id=conversation_id).values_list("user_id", flat=True))
+    inbox.touch(conversation_id, member_ids, msg.created_at.timestamp())
     u = User.objects.filter(id=user_id).first()
-    return Response(_result(data={
+    data = {
         "id": msg.id,
         "senderId": msg.sender_id,
         "nickname": getattr(u, "nickname", None) or f"用户{user_id}",
         "avatarUrl": refresh_oss_url_if_applicable(getattr(u, "avatar_url", None)),
         "type": msg.type,
-        "content": msg.content_encrypted,
+        "content": refresh_oss_url_if_applicable(msg.content_encrypted) if msg.type == "image" else msg.content_encrypted,
         "createdAt": msg.created_at.isoformat(),
-    }))
+    }
+    # 在线的其他成员经 WebSocket 网关实时收到
+    realtime.push([uid for uid in member_ids if uid != user_id], "message", dict(data, conversationId=int(conversation_id)))
+    if msg.type == "text":
+        try:
+            search.index_message(conversation_id, msg.id, msg.content_encrypted)
+        except Exception:
+            pass  # 未建索引表时不影响发送，backfill_message_search 可补
+    return Response(_result(data=data))
 
 
 @api_view(["GET"])
@@ -577,6 +727,7 @@ def add_members(request, conversation_id):
             conversation_id=conversation_id, user_id=uid,
             defaults={"role": "member"},
         )
+    inbox.join(conversation_id, member_ids)
     return Response(_result(data={"message": f"已邀请{len(member_ids)}人", "added": len(member_ids)}))
 
 
@@ -605,22 +756,29 @@ def kick_member(request, conversation_id):
     ).delete()
     if not deleted[0]:
         return Response(_result(404, "该用户不在群内"), status=status.HTTP_404_NOT_FOUND)
+    inbox.leave(conversation_id, target_id)
     return Response(_result(data={"message": "已踢出"}))
 
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def mark_read(request, conversation_id):
-    """进入会话时标记已读，将 last_read_msg_id 更新为当前最新消息 id"""
+    """
+    进入会话时标记已读，将 last_read_msg_id 更新为当前最新消息 id。
+    unread_count 重置为该 id 之后的消息数（通常为 0），避免与并发发送的 +1 相互覆盖
+    """
     user_id = _user_id_from_request(request)
     if not user_id:
         return Response(_result(401, "请先登录"), status=status.HTTP_401_UNAUTHORIZED)
     last_msg = Message.objects.filter(conversation_id=conversation_id, status=1).order_by("-id").first()
     if last_msg:
-        ConversationMember.objects.filter(
-            conversation_id=conversation_id,
-            user_id=user_id,
-        ).update(last_read_msg_id=last_msg.id)
+        with connection.cursor() as c:
+            c.execute(
+                "UPDATE conversation_member SET last_read_msg_id = %s, unread_count = ("
+                "SELECT COUNT(*) FROM message WHERE conversation_id = %s AND id > %s AND sender_id != %s"
+                ") WHERE conversation_id = %s AND user_id = %s",
+                [last_msg.id, conversation_id, last_msg.id, user_id, conversation_id, user_id],
+            )
     return Response(_result())
 
 
@@ -804,6 +962,7 @@ def approve_group_join_apply(request, apply_id):
         conversation_id=conversation_id, user_id=target_user_id,
         defaults={"role": "member"},
     )
+    inbox.join(conversation_id, [target_user_id])
     # 更新申请状态
     with connection.cursor() as c:
         c.execute("UPDATE group_join_apply SET status = 'approved' WHERE id = %s", [apply_id])
@@ -859,14 +1018,8 @@ def master_consult_list(request):
     if not rows:
         return Response(_result(data={"list": []}))
     conv_ids = [r[0] for r in rows]
-    last_msg_map = {}
-    for m in Message.objects.filter(conversation_id__in=conv_ids).values("conversation_id").annotate(mid=Max("id")):
-        last_msg_map[m["conversation_id"]] = m["mid"]
-    last_msgs = {}
-    if last_msg_map:
-        for msg in Message.objects.filter(id__in=last_msg_map.values()):
-            last_msgs[msg.id] = msg
-    last_read_map = {cm.conversation_id: cm.last_read_msg_id or 0 for cm in ConversationMember.objects.filter(conversation_id__in=conv_ids, user_id=user_id)}
+    convs = Conversation.objects.in_bulk(conv_ids)
+    unread_map = dict(ConversationMember.objects.filter(conversation_id__in=conv_ids, user_id=user_id).values_list("conversation_id", "unread_count"))
     peer_ids = list({r[2] for r in rows})
     users = {u.id: u for u in User.objects.filter(id__in=peer_ids)}
     items = []
@@ -874,17 +1027,15 @@ def master_consult_list(request):
         conv_id, updated_at, peer_id = r[0], r[1], r[2]
         u = users.get(peer_id)
         peer_name = getattr(u, "nickname", None) or f"名师{peer_id}"
-        last_id = last_msg_map.get(conv_id)
-        last_msg = last_msgs.get(last_id) if last_id else None
-        last_read = last_read_map.get(conv_id, 0)
-        unread = Message.objects.filter(conversation_id=conv_id, id__gt=last_read).exclude(sender_id=user_id).count()
+        conv = convs.get(conv_id)
+        unread = unread_map.get(conv_id) or 0
         items.append({
             "conversationId": conv_id,
             "type": "single",
             "title": peer_name,
             "peerUserId": peer_id,
-            "lastMessage": _conversation_last_message_preview(last_msg),
-            "lastMessageAt": last_msg.created_at.isoformat() if last_msg and last_msg.created_at else None,
+            "lastMessage": (conv.last_msg_preview or "") if conv else "",
+            "lastMessageAt": conv.last_msg_at.isoformat() if conv and conv.last_msg_at else None,
             "unreadCount": unread,
         })
     return Response(_result(data={"list": items}))
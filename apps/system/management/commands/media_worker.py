@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+媒体任务 worker：领取 media_job 中的任务并发执行（ffmpeg 截封面等）。
+用法：python manage.py media_worker --concurrency 4
+生产环境用 systemd 常驻，可多开实例，任务领取用 SKIP LOCKED 不会重复执行。
+"""
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.system import media_jobs
+
+logger = logging.getLogger(__name__)
+
+
+def _run(job):
+    # 每个线程使用独立数据库连接，任务结束后关闭，避免长时间空闲被 MySQL 断开
+    try:
+        return media_jobs.process_job(job)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "执行媒体后台任务（视频封面等）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4, help="并发任务数（每个任务一个 ffmpeg 子进程）")
+        parser.add_argument("--once", action="store_true", help="处理完当前可执行任务后退出")
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options["concurrency"])
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(1))
+        self.stdout.write(f"media_worker 启动，并发 {concurrency}")
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while not stopping:
+                close_old_connections()
+                try:
+                    jobs = media_jobs.claim_jobs(limit=concurrency)
+                except Exception as e:
+                    logger.warning("领取媒体任务失败: %s", e)
+                    jobs = []
+                if not jobs:
+                    if options["once"]:
+                        break
+                    media_jobs.wait_for_jobs(timeout=5)
+                    continue
+                done = sum(1 for ok in pool.map(_run, jobs) if ok)
+                self.stdout.write(f"完成 {done}/{len(jobs)} 个任务")
+        self.stdout.write("media_worker 退出")
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+媒体后台任务：视频封面、缩略图等耗时处理从请求中移出，由 media_worker 进程执行。
+- 任务持久化在 media_job 表，(job_type, object_key) 唯一，重复入队幂等
+- 入队后 LPUSH 一个 Redis 唤醒信号，worker 空闲时 BRPOP 等待，无需轮询数据库
+- worker 用 SELECT ... FOR UPDATE SKIP LOCKED 领取任务，多进程/多机并行不会重复执行
+- 失败按指数退避重试，超过 MAX_ATTEMPTS 标记 failed；worker 崩溃后租约到期的任务会被重新领取
+- 产物 object key 由源 key 确定（如 video/abc.mp4 -> video_cover/abc_cover.jpg），重试覆盖同一对象
+"""
+import json
+import logging
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+JOB_VIDEO_COVER = "video_cover"
+JOB_THUMBNAIL = "thumbnail"
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+MAX_ATTEMPTS = 5
+# 领取后的租约（秒），超时未完成视为 worker 已退出，可被重新领取
+LEASE_SECONDS = 300
+# Redis 唤醒信号与完成事件频道
+WAKE_KEY = "media:jobs:wake"
+DONE_CHANNEL = "media:jobs:done"
+# 封面截取统计 hash：{mode}_count / {mode}_bytes（读取字节）/ video_bytes（视频总字节）
+COVER_STATS_KEY = "media:cover:stats"
+
+
+def cover_key_for(video_key):
+    """视频 object key 对应的封面 key：video/abc.mp4 -> video_cover/abc_cover.jpg"""
+    return f"video_cover/{Path(video_key).stem}_cover.jpg"
+
+
+def _redis():
+    from django_redis import get_redis_connection
+    return get_redis_connection("default")
+
+
+def enqueue(job_type, object_key, user_id=None):
+    """
+    入队（幂等）：同一 (job_type, object_key) 只保留一条，已失败的任务会被重置为 pending。
+    返回 job_id；表不存在等异常返回 None，调用方应回退为同步处理。
+    """
+    # next_run_at 与 claim_jobs/_fail 一样绑定 timezone.now()，不用 MySQL NOW()（会话时区与 Django 不一致时任务会被推迟）
+    now = timezone.now()
+    try:
+        with connection.cursor() as c:
+            c.execute(
+                """
+                INSERT INTO media_job (job_type, object_key, user_id, status, attempts, next_run_at)
+                VALUES (%s, %s, %s, %s, 0, %s)
+                ON DUPLICATE KEY UPDATE
+                    id = LAST_INSERT_ID(id),
+                    attempts = IF(status = %s, 0, attempts),
+                    next_run_at = IF(status = %s, %s, next_run_at),
+                    status = IF(status = %s, %s, status)
+                """,
+                [job_type, object_key, user_id, STATUS_PENDING, now,
+                 STATUS_FAILED, STATUS_FAILED, now, STATUS_FAILED, STATUS_PENDING],
+            )
+            c.execute("SELECT LAST_INSERT_ID()")
+            job_id = (c.fetchone() or (None,))[0]
+    except Exception as e:
+        logger.warning("媒体任务入队失败 %s %s: %s", job_type, object_key, e)
+        return None
+    try:
+        _redis().lpush(WAKE_KEY, job_id)
+    except Exception:
+        pass
+    return job_id
+
+
+def enqueue_many(job_type, object_keys, user_id=None):
+    """批量入队（幂等），一条 INSERT 写入；已存在的任务保持原状态。返回是否成功"""
+    keys = list(dict.fromkeys(k for k in object_keys if k))
+    if not keys:
+        return True
+    now = timezone.now()
+    try:
+        with connection.cursor() as c:
+            c.execute(
+                "INSERT INTO media_job (job_type, object_key, user_id, status, attempts, next_run_at) VALUES "
+                + ",".join(["(%s, %s, %s, %s, 0, %s)"] * len(keys))
+                + " ON DUPLICATE KEY UPDATE id = id",
+                [v for k in keys for v in (job_type, k, user_id, STATUS_PENDING, now)],
+            )
+    except Exception as e:
+        logger.warning("媒体任务批量入队失败 %s: %s", job_type, e)
+        return False
+    try:
+        _redis().lpush(WAKE_KEY, job_type)
+    except Exception:
+        pass
+    return True
+
+
+def claim_jobs(limit=4):
+    """领取最多 limit 个可执行任务并置为 running，返回 [{id, job_type, object_key, attempts}]"""
+    now = timezone.now()
+    with transaction.atomic():
+        with connection.cursor() as c:
+            c.execute(
+                """
+                SELECT id, job_type, object_key, attempts FROM media_job
+                WHERE (status = %s AND next_run_at <= %s) OR (status = %s AND locked_until < %s)
+                ORDER BY id LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                [STATUS_PENDING, now, STATUS_RUNNING, now, limit],
+            )
+            rows = c.fetchall()
+            if not rows:
+                return []
+            ids = [r[0] for r in rows]
+            c.execute(
+                "UPDATE media_job SET status = %s, attempts = attempts + 1, locked_until = %s "
+                "WHERE id IN (" + ",".join(["%s"] * len(ids)) + ")",
+                [STATUS_RUNNING, now + timedelta(seconds=LEASE_SECONDS)] + ids,
+            )
+    return [{"id": r[0], "job_type": r[1], "object_key": r[2], "attempts": r[3] + 1} for r in rows]
+
+
+def wait_for_jobs(timeout=5):
+    """空闲时阻塞等待入队信号，Redis 不可用时退化为定时轮询"""
+    try:
+        _redis().brpop(WAKE_KEY, timeout=timeout)
+    except Exception:
+        import time
+        time.sleep(timeout)
+
+
+def _finish(job, result):
+    with connection.cursor() as c:
+        c.execute(
+            "UPDATE media_job SET status = %s, result_json = %s, error = NULL, locked_until = NULL WHERE id = %s",
+            [STATUS_DONE, json.dumps(result, ensure_ascii=False), job["id"]],
+        )
+    try:
+        _redis().publish(DONE_CHANNEL, json.dumps({"jobId": job["id"], "objectKey": job["object_key"], **result}))
+    except Exception:
+        pass
+
+
+def _fail(job, error):
+    attempts = job["attempts"]
+    if attempts >= MAX_ATTEMPTS:
+        status, next_run = STATUS_FAILED, timezone.now()
+    else:
+        status, next_run = STATUS_PENDING, timezone.now() + timedelta(seconds=30 * 2 ** (attempts - 1))
+    with connection.cursor() as c:
+        c.execute(
+            "UPDATE media_job SET status = %s, error = %s, next_run_at = %s, locked_until = NULL WHERE id = %s",
+            [status, (error or "")[:512], next_run, job["id"]],
+        )
+
+
+def _record_cover_stats(mode, bytes_fetched, video_bytes):
+    try:
+        pipe = _redis().pipeline()
+        pipe.hincrby(COVER_STATS_KEY, f"{mode}_count", 1)
+        pipe.hincrby(COVER_STATS_KEY, f"{mode}_bytes", int(bytes_fetched or 0))
+        pipe.hincrby(COVER_STATS_KEY, "video_bytes", int(video_bytes or 0))
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def cover_stats():
+    """封面截取统计：各模式次数、读取字节与平均每个封面读取字节"""
+    try:
+        raw = _redis().hgetall(COVER_STATS_KEY) or {}
+    except Exception:
+        return {}
+    stats = {}
+    for k, v in raw.items():
+        k = k.decode("utf-8") if isinstance(k, bytes) else k
+        stats[k] = int(v)
+    for mode in ("faststart", "moov_at_end", "full", "local"):
+        count = stats.get(f"{mode}_count") or 0
+        if count:
+            stats[f"{mode}_avg_bytes"] = stats.get(f"{mode}_bytes", 0) // count
+    return stats
+
+
+def run_video_cover(object_key, local_path=None):
+    """
+    生成视频封面并上传到 cover_key_for(object_key)。已有本地文件时传 local_path 跳过下载。
+    无本地文件时先按字节范围只读 moov 与首个关键帧，失败（非 MP4、结构异常等）再完整下载。
+    返回 (result_dict, None) 或 (None, error_message)，result 含 bytesFetched 与 fetchMode。
+    """
+    from django.conf import settings
+    from .oss_upload import download_oss_to_path, oss_range_reader, upload_path_to_oss
+    from .video_cover import extract_first_frame, extract_first_frame_ranged
+
+    oss_args = dict(
+        bucket=settings.ALIYUN_OSS_BUCKET,
+        endpoint=settings.ALIYUN_OSS_ENDPOINT,
+        credential_file=settings.ALIYUN_OSS_CREDENTIAL_FILE,
+    )
+    tmp_video = None
+    cover_path = None
+    bytes_fetched = 0
+    video_bytes = 0
+    mode = "local"
+    try:
+        if local_path is None:
+            read_range, video_bytes, err = oss_range_reader(object_key, **oss_args)
+            if read_range:
+                try:
+                    cover_path, bytes_fetched, mode = extract_first_frame_ranged(read_range, video_bytes)
+                except Exception as e:
+                    logger.warning("按范围截封面失败，改为完整下载 %s: %s", object_key, e)
+        if cover_path is None and local_path is None:
+            fd, tmp_path = tempfile.mkstemp(suffix=Path(object_key).suffix or ".mp4", prefix="media_job_")
+            os.close(fd)
+            tmp_video = Path(tmp_path)
+            ok, err = download_oss_to_path(object_key, str(tmp_video), **oss_args)
+            if not ok:
+                return None, err or "拉取视频失败"
+            mode = "full"
+            video_bytes = tmp_video.stat().st_size
+            bytes_fetched += video_bytes
+            local_path = tmp_video
+        if cover_path is None:
+            cover_path = extract_first_frame(local_path)
+        if not cover_path:
+            return None, "截取封面失败"
+        cover_key = cover_key_for(object_key)
+        _, err = upload_path_to_oss(
+            cover_path,
+            cover_key,
+            signed_url_expires=getattr(settings, "ALIYUN_OSS_SIGNED_URL_EXPIRES", 604800),
+            **oss_args,
+        )
+        if err:
+            return None, err
+        _record_cover_stats(mode, bytes_fetched, video_bytes)
+        # 封面就绪后接着生成缩略图
+        enqueue(JOB_THUMBNAIL, cover_key)
+        return {"coverKey": cover_key, "bytesFetched": bytes_fetched, "fetchMode": mode}, None
+    finally:
+        for p in (tmp_video, cover_path):
+            if p and Path(p).exists():
+                try:
+                    Path(p).unlink()
+                except Exception:
+                    pass
+
+
+def run_thumbnail(object_key, local_path=None):
+    """
+    为图片（含视频封面）生成 THUMB_SIZES 各尺寸 WebP 并上传到 thumb_key_for(object_key, size)。
+    返回 ({"thumbKeys": {size: key}}, None) 或 (None, error_message)。
+    """
+    from django.conf import settings
+    from .oss_upload import download_oss_to_path, upload_path_to_oss
+    from .thumbnails import THUMB_SIZES, make_thumbnail, thumb_key_for
+
+    oss_args = dict(
+        bucket=settings.ALIYUN_OSS_BUCKET,
+        endpoint=settings.ALIYUN_OSS_ENDPOINT,
+        credential_file=settings.ALIYUN_OSS_CREDENTIAL_FILE,
+    )
+    if not thumb_key_for(object_key, THUMB_SIZES[0]):
+        return None, "不支持生成缩略图的 key"
+    tmp_src = None
+    outputs = []
+    try:
+        if local_path is None:
+            fd, tmp_path = tempfile.mkstemp(suffix=Path(object_key).suffix or ".jpg", prefix="media_thumb_")
+            os.close(fd)
+            tmp_src = Path(tmp_path)
+            ok, err = download_oss_to_path(object_key, str(tmp_src), **oss_args)
+            if not ok:
+                return None, err or "拉取图片失败"
+            local_path = tmp_src
+        thumb_keys = {}
+        for size in THUMB_SIZES:
+            out = make_thumbnail(local_path, size)
+            if not out:
+                return None, f"生成 {size} 缩略图失败"
+            outputs.append(out)
+            key = thumb_key_for(object_key, size)
+            _, err = upload_path_to_oss(
+                out,
+                key,
+                signed_url_expires=getattr(settings, "ALIYUN_OSS_SIGNED_URL_EXPIRES", 604800),
+                **oss_args,
+            )
+            if err:
+                return None, err
+            thumb_keys[str(size)] = key
+        return {"thumbKeys": thumb_keys}, None
+    finally:
+        for p in [tmp_src] + outputs:
+            if p and Path(p).exists():
+                try:
+                    Path(p).unlink()
+                except Exception:
+                    pass
+
+
+_HANDLERS = {
+    JOB_VIDEO_COVER: run_video_cover,
+    JOB_THUMBNAIL: run_thumbnail,
+}
+
+
+def process_job(job):
+    """执行单个已领取的任务并记录结果；异常不向外抛出"""
+    handler = _HANDLERS.get(job["job_type"])
+    if handler is None:
+        _fail(dict(job, attempts=MAX_ATTEMPTS), f"未知任务类型 {job['job_type']}")
+        return False
+    try:
+        result, err = handler(job["object_key"])
+    except Exception as e:
+        logger.exception("媒体任务执行异常 %s", job)
+        result, err = None, str(e)
+    if err:
+        logger.warning("媒体任务失败 id=%s key=%s 第 %s 次: %s", job["id"], job["object_key"], job["attempts"], err)
+        _fail(job, err)
+        return False
+    _finish(job, result)
+    return True
+
+
+def done_keys(job_type, object_keys):
+    """批量查询哪些源 key 的任务已完成（列表接口一次查询整页），返回 set"""
+    keys = list(dict.fromkeys(k for k in object_keys if k))
+    if not keys:
+        return set()
+    try:
+        with connection.cursor() as c:
+            c.execute(
+                "SELECT object_key FROM media_job WHERE job_type = %s AND status = %s AND object_key IN ("
+                + ",".join(["%s"] * len(keys)) + ")",
+                [job_type, STATUS_DONE] + keys,
+            )
+            return {r[0] for r in c.fetchall()}
+    except Exception:
+        return set()
+
+
+def job_status(job_type, object_key):
+    """查询任务状态，返回 {status, result, error, user_id} 或 None"""
+    try:
+        with connection.cursor() as c:
+            c.execute(
+                "SELECT status, result_json, error, user_id FROM media_job WHERE job_type = %s AND object_key = %s",
+                [job_type, object_key],
+            )
+            row = c.fetchone()
+    except Exception:
+        return None
+    if not row:
+        return None
+    try:
+        result = json.loads(row[1]) if row[1] else {}
+    except (TypeError, ValueError):
+        result = {}
+    return {"status": row[0], "result": result, "error": row[2], "user_id": row[3]}
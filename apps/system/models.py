@@ -33,3 +33,23 @@ class Banner(models.Model):
     class Meta:
         db_table = "banner"
         managed = False
+
+
+class MediaJob(models.Model):
+    """媒体后台任务（视频封面等），由 media_worker 执行，见 apps/system/media_jobs.py"""
+    id = models.BigAutoField(primary_key=True)
+    job_type = models.CharField(max_length=32)
+    object_key = models.CharField(max_length=255)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=16, default="pending")  # pending/running/done/failed
+    attempts = models.IntegerField(default=0)
+    result_json = models.TextField(null=True, blank=True)
+    error = models.CharField(max_length=512, null=True, blank=True)
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "media_job"
+        managed = False
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+OSS 签名器：进程内常驻，供上传与各列表接口复用。
+- 凭据文件只在首次或文件 mtime 变化时重新读取（每 30 秒最多 stat 一次）
+- 同一 (bucket, endpoint, 凭据) 共用一个 oss2.Auth + oss2.Bucket
+- sign_many / refresh_urls 为批量接口，列表接口一次性为整页 URL 签名
+- 签名结果按 (bucket, AccessKey id, 有效期, object key) 缓存（进程内 LRU + Redis），剩余有效期充足时直接复用，
+  同一对象在复用期内返回相同 URL，客户端与 CDN 的图片缓存才能命中；凭据轮换后旧 AccessKey 签的 URL 不再返回
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+
+logger = logging.getLogger(__name__)
+
+# 凭据文件 mtime 检查间隔（秒），间隔内直接使用内存中的凭据
+CREDENTIAL_CHECK_INTERVAL = 30
+
+_lock = threading.Lock()
+# credential_file -> {"mtime", "checked_at", "key_id", "key_secret"}
+_credentials = {}
+# (bucket, endpoint, credential_file) -> (key_id, key_secret, oss2.Bucket)
+_buckets = {}
+
+# 签名 URL 缓存：Redis key 前缀、统计 hash、统计写回间隔（秒）
+SIGNED_URL_CACHE_PREFIX = "oss:signed:"
+SIGNED_URL_STATS_KEY = "oss:signed:stats"
+STATS_FLUSH_INTERVAL = 60
+
+# 进程内 LRU：f"{bucket}:{access_key_id}:{expires}:{key}" -> (url, expire_at)
+_url_cache = OrderedDict()
+# 本进程计数：local_hits 进程内命中 / redis_hits Redis 命中 / misses 重新签名
+_stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+_stats_pending = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+_stats_flushed_at = [time.monotonic()]
+
+
+def _load_credential(file_path):
+    """解析凭据文件，格式同短信：accessKeyId xxx / accessKeySecret xxx"""
+    access_key_id = None
+    access_key_secret = None
+    path = Path(file_path)
+    if path.is_file():
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                parts = line.split(None, 1)
+                if len(parts) < 2:
+                    continue
+                key, value = parts[0].strip(), parts[1].strip()
+                if key == "accessKeyId":
+                    access_key_id = value
+                elif key == "accessKeySecret":
+                    access_key_secret = value
+    return access_key_id, access_key_secret
+
+
+def get_credential(credential_file):
+    """返回 (access_key_id, access_key_secret)，带 mtime 热更新的进程内缓存。"""
+    now = time.monotonic()
+    entry = _credentials.get(credential_file)
+    if entry and now - entry["checked_at"] < CREDENTIAL_CHECK_INTERVAL:
+        return entry["key_id"], entry["key_secret"]
+    try:
+        mtime = os.stat(credential_file).st_mtime
+    except (OSError, TypeError, ValueError):
+        mtime = None
+    with _lock:
+        entry = _credentials.get(credential_file)
+        if entry and entry["mtime"] == mtime and mtime is not None:
+            entry["checked_at"] = now
+            return entry["key_id"], entry["key_secret"]
+        key_id, key_secret = _load_credential(credential_file) if mtime is not None else (None, None)
+        _credentials[credential_file] = {
+            "mtime": mtime,
+            "checked_at": now,
+            "key_id": key_id,
+            "key_secret": key_secret,
+        }
+        if entry and (entry["key_id"], entry["key_secret"]) != (key_id, key_secret):
+            logger.info("OSS 凭据文件已更新，重新加载: %s", credential_file)
+        return key_id, key_secret
+
+
+def get_bucket(bucket, endpoint, credential_file):
+    """
+    获取共享的 oss2.Bucket。凭据变化时自动重建。
+    :return: (bucket_obj, None) 成功，(None, error_message) 失败
+    """
+    access_key_id, access_key_secret = get_credential(credential_file)
+    if not access_key_id or not access_key_secret:
+        return None, "OSS 凭据无效"
+    cache_key = (bucket, endpoint, credential_file)
+    cached = _buckets.get(cache_key)
+    if cached and cached[0] == access_key_id and cached[1] == access_key_secret:
+        return cached[2], None
+    try:
+        import oss2
+    except ImportError:
+        logger.exception("oss2 未安装，请 pip install oss2")
+        return None, "OSS 依赖未安装"
+    ep = endpoint if endpoint.startswith("http") else f"https://{endpoint}"
+    with _lock:
+        cached = _buckets.get(cache_key)
+        if cached and cached[0] == access_key_id and cached[1] == access_key_secret:
+            return cached[2], None
+        auth = oss2.Auth(access_key_id, access_key_secret)
+        bucket_obj = oss2.Bucket(auth, ep, bucket)
+        _buckets[cache_key] = (access_key_id, access_key_secret, bucket_obj)
+    return bucket_obj, None
+
+
+def object_key_from_url(oss_url, bucket):
+    """
+    从本 Bucket 的 OSS 地址（可带签名参数）解析出 object key。
+    例如 https://xuanyuapp.oss-cn-beijing.aliyuncs.com/image%2Fxxx.jpg?... -> image/xxx.jpg
+    非本 Bucket 地址或解析失败返回 None。
+    """
+    if not oss_url or not isinstance(oss_url, str) or not oss_url.strip():
+        return None
+    try:
+        parsed = urlparse(oss_url.strip())
+        netloc = (parsed.netloc or "").lower()
+        if not netloc or bucket not in netloc or "aliyuncs.com" not in netloc:
+            return None
+        path = (parsed.path or "").strip().lstrip("/")
+        if not path:
+            return None
+        return unquote(path)
+    except Exception:
+        return None
+
+
+# 上传接口与媒体 worker 生成的 object key 前缀（thumb/ 为缩略图）；以这些前缀开头、且不带协议头的值视为 object key
+MEDIA_KEY_PREFIXES = ("image/", "video/", "video_cover/", "thumb/")
+
+
+def is_object_key(value):
+    """是否为库中存储的 object key（如 image/xxx.jpg），而非完整 URL"""
+    if not value or not isinstance(value, str):
+        return False
+    value = value.strip()
+    return "://" not in value and value.startswith(MEDIA_KEY_PREFIXES)
+
+
+def to_object_key(value):
+    """
+    入库前规范化：本 Bucket 的 OSS 地址（含旧签名 URL）转为 object key，
+    已是 key 或外链/非 OSS 值原样返回。未启用 OSS 时不做转换。
+    """
+    if not value or not isinstance(value, str):
+        return value
+    value = value.strip()
+    if is_object_key(value):
+        return value
+    try:
+        conf = _oss_settings()
+    except Exception:
+        return value
+    if not conf:
+        return value
+    return object_key_from_url(value, conf["bucket"]) or value
+
+
+def _oss_settings():
+    """读取 settings 中的 OSS 配置，未启用返回 None。需在 Django 环境内调用。"""
+    from django.conf import settings
+    if not getattr(settings, "ALIYUN_OSS_ENABLED", False) or not getattr(settings, "ALIYUN_OSS_BUCKET", ""):
+        return None
+    return {
+        "bucket": settings.ALIYUN_OSS_BUCKET,
+        "endpoint": getattr(settings, "ALIYUN_OSS_ENDPOINT", "oss-cn-beijing.aliyuncs.com"),
+        "credential_file": getattr(settings, "ALIYUN_OSS_CREDENTIAL_FILE", ""),
+        "expires": getattr(settings, "ALIYUN_OSS_SIGNED_URL_EXPIRES", 604800),
+    }
+
+
+def _cache_settings():
+    """签名缓存配置：(剩余有效期低于多少秒需重签, 进程内最多缓存条数)"""
+    from django.conf import settings
+    return (
+        getattr(settings, "ALIYUN_OSS_SIGNED_URL_MIN_REMAINING", 86400),
+        getattr(settings, "ALIYUN_OSS_SIGNED_URL_CACHE_SIZE", 20000),
+    )
+
+
+def _count(name, n=1):
+    if n:
+        _stats[name] += n
+        _stats_pending[name] += n
+
+
+def _flush_stats():
+    """把本进程累计的命中/未命中增量写回 Redis hash，便于查看全部 worker 的汇总。"""
+    now = time.monotonic()
+    if now - _stats_flushed_at[0] < STATS_FLUSH_INTERVAL:
+        return
+    _stats_flushed_at[0] = now
+    pending = {k: v for k, v in _stats_pending.items() if v}
+    if not pending:
+        return
+    for k in pending:
+        _stats_pending[k] -= pending[k]
+    try:
+        from django_redis import get_redis_connection
+        pipe = get_redis_connection("default").pipeline()
+        for k, v in pending.items():
+            pipe.hincrby(SIGNED_URL_STATS_KEY, k, v)
+        pipe.execute()
+    except Exception as e:
+        logger.debug("OSS 签名缓存统计写回失败: %s", e)
+
+
+def signed_url_cache_stats():
+    """签名缓存命中统计：process 为本进程计数，total 为 Redis 中所有进程的汇总。"""
+    total = {}
+    try:
+        from django_redis import get_redis_connection
+        raw = get_redis_connection("default").hgetall(SIGNED_URL_STATS_KEY) or {}
+        for k, v in raw.items():
+            k = k.decode("utf-8") if isinstance(k, bytes) else k
+            total[k] = int(v)
+    except Exception:
+        pass
+    return {"process": dict(_stats), "processCacheSize": len(_url_cache), "total": total}
+
+
+def _access_key_id(bucket_obj):
+    """bucket_obj 签名所用的 AccessKey id（由 get_bucket 创建时记录）"""
+    for key_id, _, cached_obj in list(_buckets.values()):
+        if cached_obj is bucket_obj:
+            return key_id
+    return ""
+
+
+def sign_keys_cached(bucket_obj, bucket, keys, expires):
+    """
+    带缓存的批量签名：先查进程内 LRU，再一次 MGET 查 Redis，剩余的才真正签名并回写两级缓存。
+    缓存键包含 AccessKey id 与有效期：凭据轮换后不复用旧 key 的签名，不同有效期的调用互不复用。
+    缓存的签名剩余有效期低于 ALIYUN_OSS_SIGNED_URL_MIN_REMAINING 时视为未命中并重签。
+    返回与 keys 等长的列表，失败位置为 None。
+    """
+    from django.core.cache import cache
+
+    min_remaining, max_size = _cache_settings()
+    now = time.time()
+    scope = f"{bucket}:{_access_key_id(bucket_obj)}:{int(expires)}"
+    found = {}
+    with _lock:
+        for key in keys:
+            if not key or key in found:
+                continue
+            entry = _url_cache.get(f"{scope}:{key}")
+            if entry and entry[1] - now > min_remaining:
+                _url_cache.move_to_end(f"{scope}:{key}")
+                found[key] = entry[0]
+    _count("local_hits", len(found))
+
+    missing = [k for k in dict.fromkeys(keys) if k and k not in found]
+    fresh = {}
+    if missing:
+        try:
+            cached = cache.get_many([SIGNED_URL_CACHE_PREFIX + f"{scope}:{k}" for k in missing]) or {}
+        except Exception:
+            cached = {}
+        redis_hits = 0
+        for k in missing:
+            entry = cached.get(SIGNED_URL_CACHE_PREFIX + f"{scope}:{k}")
+            if entry and entry[1] - now > min_remaining:
+                found[k] = entry[0]
+                fresh[k] = tuple(entry)
+                redis_hits += 1
+        _count("redis_hits", redis_hits)
+
+        to_sign = [k for k in missing if k not in found]
+        if to_sign:
+            _count("misses", len(to_sign))
+            expire_at = int(now) + int(expires)
+            to_store = {}
+            for k, url in zip(to_sign, sign_keys(bucket_obj, to_sign, expires)):
+                if not url:
+                    continue
+                found[k] = url
+                fresh[k] = (url, expire_at)
+                to_store[SIGNED_URL_CACHE_PREFIX + f"{scope}:{k}"] = (url, expire_at)
+            # Redis 中只保留到“需要重签”的时刻，过期自动淘汰
+            timeout = int(expires) - int(min_remaining)
+            if to_store and timeout > 0:
+                try:
+                    cache.set_many(to_store, timeout=timeout)
+                except Exception as e:
+                    logger.debug("OSS 签名缓存写入 Redis 失败: %s", e)
+
+    if fresh:
+        with _lock:
+            for k, entry in fresh.items():
+                _url_cache[f"{scope}:{k}"] = entry
+                _url_cache.move_to_end(f"{scope}:{k}")
+            while len(_url_cache) > max_size:
+                _url_cache.popitem(last=False)
+    _flush_stats()
+    return [found.get(k) if k else None for k in keys]
+
+
+def sign_keys(bucket_obj, keys, expires):
+    """用已获取的 Bucket 为一组 object key 生成 GET 签名 URL，失败的位置为 None。"""
+    out = []
+    for key in keys:
+        if not key:
+            out.append(None)
+            continue
+        try:
+            out.append(bucket_obj.sign_url("GET", key, expires))
+        except Exception as e:
+            logger.warning("OSS 签名失败 %s: %s", key, e)
+            out.append(None)
+    return out
+
+
+def sign_many(keys, expires=None):
+    """
+    按 settings 配置批量为 object key 生成 GET 签名 URL（经签名缓存，有效期充足时复用）。
+    返回与 keys 等长的列表；未启用 OSS、key 为空或签名失败的位置为 None。
+    """
+    keys = list(keys or [])
+    if not keys:
+        return []
+    conf = _oss_settings()
+    if not conf:
+        return [None] * len(keys)
+    bucket_obj, err = get_bucket(conf["bucket"], conf["endpoint"], conf["credential_file"])
+    if err:
+        return [None] * len(keys)
+    try:
+        return sign_keys_cached(bucket_obj, conf["bucket"], keys, expires or conf["expires"])
+    except Exception as e:
+        logger.warning("OSS 签名缓存不可用，直接签名: %s", e)
+        return sign_keys(bucket_obj, keys, expires or conf["expires"])
+
+
+def refresh_urls(urls):
+    """
+    批量把库中存储的媒体值转为可访问 URL：object key 直接签名，本 Bucket 的旧 OSS 地址解析出 key 后重签，
+    其余（空值、外链、签名失败）原样返回。返回与 urls 等长的列表。
+    """
+    urls = list(urls or [])
+    if not urls:
+        return []
+    try:
+        conf = _oss_settings()
+    except Exception:
+        return urls
+    if not conf:
+        return urls
+    positions = []
+    keys = []
+    for i, url in enumerate(urls):
+        if not isinstance(url, str):
+            continue
+        key = url.strip() if is_object_key(url) else object_key_from_url(url, conf["bucket"])
+        if key:
+            positions.append(i)
+            keys.append(key)
+    if not keys:
+        return urls
+    signed = sign_many(keys, conf["expires"])
+    out = list(urls)
+    for i, s in zip(positions, signed):
+        if s:
+            out[i] = s
+    return out
+
+
+def refresh_url_map(urls):
+    """对一组 key/URL 去重后批量签名，返回 {库中原值: 可访问 URL}，便于列表接口按原值查表。"""
+    uniq = [u for u in dict.fromkeys(u for u in (urls or []) if u)]
+    return dict(zip(uniq, refresh_urls(uniq)))
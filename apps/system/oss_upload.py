@@ -2,66 +2,80 @@
 """
 阿里云 OSS 上传：读取凭据文件后上传文件。Bucket 私有读时返回签名 URL，防止泄漏。
 凭据文件格式同短信：accessKeyId xxx / accessKeySecret xxx
+凭据读取与 oss2.Bucket 由 oss_signer 进程内复用，不再每次调用都读文件、建 Bucket。
 """
 import logging
+import tempfile
 from pathlib import Path
-from urllib.parse import urlparse, unquote
+
+from .oss_signer import get_bucket, object_key_from_url, refresh_urls, sign_keys_cached
 
 logger = logging.getLogger(__name__)
 
 
-def _load_credential(file_path):
-    access_key_id = None
-    access_key_secret = None
-    path = Path(file_path)
-    if path.is_file():
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                parts = line.split(None, 1)
-                if len(parts) < 2:
-                    continue
-                key, value = parts[0].strip(), parts[1].strip()
-                if key == "accessKeyId":
-                    access_key_id = value
-                elif key == "accessKeySecret":
-                    access_key_secret = value
-    return access_key_id, access_key_secret
+def _multipart_settings():
+    """分片上传配置：(启用分片的文件大小阈值, 分片大小, 并发线程数)，单位字节"""
+    from django.conf import settings
+    return (
+        getattr(settings, "ALIYUN_OSS_MULTIPART_THRESHOLD", 10 * 1024 * 1024),
+        getattr(settings, "ALIYUN_OSS_PART_SIZE", 4 * 1024 * 1024),
+        getattr(settings, "ALIYUN_OSS_UPLOAD_THREADS", 3),
+    )
+
+
+def _put_path(bucket_obj, object_name, path):
+    """
+    上传本地文件：小文件以文件对象流式 put_object；超过阈值走 oss2 断点续传分片上传（多线程并发传分片），
+    内存占用约为 分片大小 × 线程数，与文件大小无关。
+    """
+    import oss2
+
+    threshold, part_size, num_threads = _multipart_settings()
+    if path.stat().st_size >= threshold:
+        oss2.resumable_upload(
+            bucket_obj,
+            object_name,
+            str(path),
+            store=oss2.ResumableStore(root=tempfile.gettempdir()),
+            multipart_threshold=threshold,
+            part_size=part_size,
+            num_threads=num_threads,
+        )
+        return
+    with open(path, "rb") as f:
+        bucket_obj.put_object(object_name, f)
+
+
+def _signed_read_url(bucket_obj, bucket, object_name, signed_url_expires):
+    """上传完成后生成读链接，同时写入签名缓存，后续列表接口直接复用"""
+    url = sign_keys_cached(bucket_obj, bucket, [object_name], signed_url_expires)[0]
+    return url or bucket_obj.sign_url("GET", object_name, signed_url_expires)
 
 
 def upload_file_to_oss(file_obj, object_name, bucket, endpoint, credential_file, signed_url_expires=604800):
     """
     将 file_obj（Django UploadedFile）上传到 OSS 的 object_name。
+    已落盘的大文件（TemporaryUploadedFile）直接按路径分片上传，内存中的小文件以文件对象流式上传，不整体读入内存。
     返回签名 URL（私有读，防泄漏），(url, None) 成功，(None, error_message) 失败。
     signed_url_expires: 签名有效期（秒），默认 7 天。
     """
-    access_key_id, access_key_secret = _load_credential(credential_file)
-    if not access_key_id or not access_key_secret:
-        return None, "OSS 凭据无效"
+    bucket_obj, err = get_bucket(bucket, endpoint, credential_file)
+    if err:
+        return None, err
 
     try:
-        import oss2
-    except ImportError:
-        logger.exception("oss2 未安装，请 pip install oss2")
-        return None, "OSS 依赖未安装"
-
-    auth = oss2.Auth(access_key_id, access_key_secret)
-    if not endpoint.startswith("http"):
-        endpoint = f"https://{endpoint}"
-    bucket_obj = oss2.Bucket(auth, endpoint, bucket)
-
-    try:
-        data = b"".join(file_obj.chunks())
-        bucket_obj.put_object(object_name, data)
+        if hasattr(file_obj, "temporary_file_path"):
+            _put_path(bucket_obj, object_name, Path(file_obj.temporary_file_path()))
+        else:
+            file_obj.seek(0)
+            bucket_obj.put_object(object_name, file_obj)
     except Exception as e:
         logger.exception("OSS 上传失败: %s", e)
         return None, str(e)
 
     # 私有读：返回带过期时间的签名 URL，避免公共读导致泄漏
     try:
-        url = bucket_obj.sign_url("GET", object_name, signed_url_expires)
+        url = _signed_read_url(bucket_obj, bucket, object_name, signed_url_expires)
     except Exception as e:
         logger.exception("OSS 签名 URL 生成失败: %s", e)
         return None, str(e)
@@ -70,32 +84,22 @@ def upload_file_to_oss(file_obj, object_name, bucket, endpoint, credential_file,
 
 def upload_path_to_oss(file_path, object_name, bucket, endpoint, credential_file, signed_url_expires=604800):
     """
-    将本地文件（如临时生成的封面图）上传到 OSS。
+    将本地文件（如视频临时文件、封面图）上传到 OSS，大文件自动分片并发上传。
     返回 (url, None) 成功，(None, error_message) 失败。
     """
     path = Path(file_path)
     if not path.is_file():
         return None, "文件不存在"
-    access_key_id, access_key_secret = _load_credential(credential_file)
-    if not access_key_id or not access_key_secret:
-        return None, "OSS 凭据无效"
+    bucket_obj, err = get_bucket(bucket, endpoint, credential_file)
+    if err:
+        return None, err
     try:
-        import oss2
-    except ImportError:
-        logger.exception("oss2 未安装，请 pip install oss2")
-        return None, "OSS 依赖未安装"
-    auth = oss2.Auth(access_key_id, access_key_secret)
-    if not endpoint.startswith("http"):
-        endpoint = f"https://{endpoint}"
-    bucket_obj = oss2.Bucket(auth, endpoint, bucket)
-    try:
-        with open(path, "rb") as f:
-            bucket_obj.put_object(object_name, f.read())
+        _put_path(bucket_obj, object_name, path)
     except Exception as e:
         logger.exception("OSS 上传失败: %s", e)
         return None, str(e)
     try:
-        url = bucket_obj.sign_url("GET", object_name, signed_url_expires)
+        url = _signed_read_url(bucket_obj, bucket, object_name, signed_url_expires)
     except Exception as e:
         logger.exception("OSS 签名 URL 生成失败: %s", e)
         return None, str(e)
@@ -114,18 +118,9 @@ def get_presigned_upload_urls(
     生成客户端直传 OSS 的预签名 URL。
     :return: (upload_url, read_url, None) 成功，(None, None, error_message) 失败。
     """
-    access_key_id, access_key_secret = _load_credential(credential_file)
-    if not access_key_id or not access_key_secret:
-        return None, None, "OSS 凭据无效"
-    try:
-        import oss2
-    except ImportError:
-        logger.exception("oss2 未安装")
-        return None, None, "OSS 依赖未安装"
-    auth = oss2.Auth(access_key_id, access_key_secret)
-    if not endpoint.startswith("http"):
-        endpoint = f"https://{endpoint}"
-    bucket_obj = oss2.Bucket(auth, endpoint, bucket)
+    bucket_obj, err = get_bucket(bucket, endpoint, credential_file)
+    if err:
+        return None, None, err
     try:
         upload_url = bucket_obj.sign_url("PUT", object_name, upload_expires)
         read_url = bucket_obj.sign_url("GET", object_name, read_expires)
@@ -138,34 +133,17 @@ def get_presigned_upload_urls(
 def refresh_signed_url(oss_url, bucket, endpoint, credential_file, signed_url_expires=604800):
     """
     根据已有 OSS 签名 URL 或同 Bucket 的 OSS 地址，用当前凭据重新生成签名 URL（解决过期 403）。
-    若 URL 不是本 Bucket 的 OSS 地址或解析失败，原样返回。
+    若 URL 不是本 Bucket 的 OSS 地址或解析失败，原样返回。凭据与 Bucket 由 oss_signer 进程内复用，
+    签名结果走 oss_signer 的签名缓存，剩余有效期充足时返回同一 URL。
     """
-    if not oss_url or not isinstance(oss_url, str) or not oss_url.strip():
+    object_key = object_key_from_url(oss_url, bucket)
+    if not object_key:
         return oss_url
-    try:
-        parsed = urlparse(oss_url.strip())
-        # 例如 https://xuanyuapp.oss-cn-beijing.aliyuncs.com/image%2Fxxx.jpg?...
-        netloc = (parsed.netloc or "").lower()
-        if not netloc or bucket not in netloc or "aliyuncs.com" not in netloc:
-            return oss_url
-        path = (parsed.path or "").strip().lstrip("/")
-        if not path:
-            return oss_url
-        object_key = unquote(path)
-    except Exception:
-        return oss_url
-    access_key_id, access_key_secret = _load_credential(credential_file)
-    if not access_key_id or not access_key_secret:
+    bucket_obj, err = get_bucket(bucket, endpoint, credential_file)
+    if err:
         return oss_url
     try:
-        import oss2
-    except ImportError:
-        return oss_url
-    try:
-        auth = oss2.Auth(access_key_id, access_key_secret)
-        ep = endpoint if endpoint.startswith("http") else f"https://{endpoint}"
-        bucket_obj = oss2.Bucket(auth, ep, bucket)
-        return bucket_obj.sign_url("GET", object_key, signed_url_expires)
+        return sign_keys_cached(bucket_obj, bucket, [object_key], signed_url_expires)[0] or oss_url
     except Exception as e:
         logger.warning("OSS 刷新签名失败 %s: %s", object_key, e)
         return oss_url
@@ -173,20 +151,13 @@ def refresh_signed_url(oss_url, bucket, endpoint, credential_file, signed_url_ex
 
 def refresh_oss_url_if_applicable(url):
     """
-    若 url 为本项目配置的 OSS 签名地址，则用当前凭据重新生成签名 URL（用于头像、封面等，解决过期 403）。
-    否则原样返回。需在 Django 环境内调用（依赖 settings）。
+    若 url 为 object key 或本项目配置的 OSS 签名地址，则用当前凭据生成签名 URL（用于头像、封面等，解决过期 403）。
+    否则原样返回。需在 Django 环境内调用（依赖 settings）。列表接口请用 oss_signer.refresh_urls 批量处理。
     """
     if not url or not isinstance(url, str) or not url.strip():
         return url
     try:
-        from django.conf import settings
-        if not getattr(settings, "ALIYUN_OSS_ENABLED", False) or not getattr(settings, "ALIYUN_OSS_BUCKET", ""):
-            return url
-        bucket = settings.ALIYUN_OSS_BUCKET
-        endpoint = getattr(settings, "ALIYUN_OSS_ENDPOINT", "oss-cn-beijing.aliyuncs.com")
-        cred = getattr(settings, "ALIYUN_OSS_CREDENTIAL_FILE", "")
-        expires = getattr(settings, "ALIYUN_OSS_SIGNED_URL_EXPIRES", 604800)
-        return refresh_signed_url(url.strip(), bucket, endpoint, cred, expires)
+        return refresh_urls([url.strip()])[0]
     except Exception:
         return url
 
@@ -195,17 +166,9 @@ def download_oss_to_path(object_name, local_path, bucket, endpoint, credential_f
     """将 OSS 对象下载到本地，用于服务端截视频封面等。返回 (True, None) 或 (False, error_message)。"""
     path = Path(local_path)
     path.parent.mkdir(parents=True, exist_ok=True)
-    access_key_id, access_key_secret = _load_credential(credential_file)
-    if not access_key_id or not access_key_secret:
-        return False, "OSS 凭据无效"
-    try:
-        import oss2
-    except ImportError:
-        return False, "OSS 依赖未安装"
-    auth = oss2.Auth(access_key_id, access_key_secret)
-    if not endpoint.startswith("http"):
-        endpoint = f"https://{endpoint}"
-    bucket_obj = oss2.Bucket(auth, endpoint, bucket)
+    bucket_obj, err = get_bucket(bucket, endpoint, credential_file)
+    if err:
+        return False, err
     try:
         bucket_obj.get_object_to_file(object_name, str(path))
         return True, None
@@ -213,3 +176,29 @@ def download_oss_to_path(object_name, local_path, bucket, endpoint, credential_f
         logger.exception("OSS 下载失败: %s", e)
         return False, str(e)
 
+
+def oss_range_reader(object_name, bucket, endpoint, credential_file):
+    """
+    返回 (read_range, total_size, None) 或 (None, 0, error_message)。
+    read_range(start, end) 按闭区间读取对象字节，用于只取视频头部/moov 截封面。
+    """
+    bucket_obj, err = get_bucket(bucket, endpoint, credential_file)
+    if err:
+        return None, 0, err
+    try:
+        total_size = int(bucket_obj.head_object(object_name).content_length or 0)
+    except Exception as e:
+        logger.warning("OSS 读取对象信息失败 %s: %s", object_name, e)
+        return None, 0, str(e)
+
+    def read_range(start, end):
+        end = min(end, total_size - 1)
+        if start > end:
+            return b""
+        # standard 行为：范围越界时报错而不是返回整个对象
+        result = bucket_obj.get_object(
+            object_name, byte_range=(start, end), headers={"x-oss-range-behavior": "standard"}
+        )
+        return result.read()
+
+    return read_range, total_size, None
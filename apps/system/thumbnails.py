@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+缩略图：用 ffmpeg 把图片（含视频封面）按固定宽度转为 WebP，供信息流宫格与预览使用。
+thumb key 由源 key 确定：image/abc.jpg -> thumb/abc_240.webp，列表接口据此拼出缩略图地址。
+依赖系统已安装 ffmpeg（需带 libwebp，apt 版 ffmpeg 默认包含）。
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 缩略图宽度：240 用于宫格，720 用于大图预览；高度按比例，原图更小时不放大
+THUMB_SIZES = (240, 720)
+# 生成缩略图的源 key 前缀（视频本身不生成，使用其封面）
+THUMB_SOURCE_PREFIXES = ("image/", "video_cover/")
+
+
+def thumb_key_for(object_key, size):
+    """源 object key 对应的缩略图 key；非图片 key 返回 None"""
+    if not object_key or not isinstance(object_key, str) or not object_key.startswith(THUMB_SOURCE_PREFIXES):
+        return None
+    return f"thumb/{Path(object_key).stem}_{size}.webp"
+
+
+def make_thumbnail(src_path, width, output_path=None, quality=75):
+    """
+    生成单个 WebP 缩略图。
+    :return: 成功返回输出路径（Path），失败返回 None
+    """
+    src_path = Path(src_path)
+    if not src_path.is_file():
+        logger.warning("图片文件不存在: %s", src_path)
+        return None
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        logger.warning("未找到 ffmpeg，请安装后重试")
+        return None
+    if output_path is None:
+        fd, output_path = tempfile.mkstemp(suffix=".webp", prefix=f"thumb_{width}_")
+        os.close(fd)
+    output_path = Path(output_path)
+    try:
+        subprocess.run(
+            [
+                ffmpeg,
+                "-y",
+                "-i", str(src_path),
+                "-vf", f"scale='min({width},iw)':-2",
+                "-frames:v", "1",
+                "-c:v", "libwebp",
+                "-quality", str(quality),
+                str(output_path),
+            ],
+            capture_output=True,
+            timeout=30,
+            check=True,
+        )
+        if output_path.is_file() and output_path.stat().st_size > 0:
+            return output_path
+    except subprocess.CalledProcessError as e:
+        logger.warning("ffmpeg 生成缩略图失败: %s %s", e.stderr and e.stderr.decode("utf-8", errors="replace"), src_path)
+    except Exception as e:
+        logger.warning("生成缩略图异常: %s", e)
+    try:
+        output_path.unlink()
+    except Exception:
+        pass
+    return None
@@ -7,5 +7,6 @@ urlpatterns = [
     path("upload", views.upload),
     path("presign-upload", views.presign_upload),
     path("confirm-upload", views.confirm_upload),
+    path("media-job", views.media_job_status),
     path("ipLocation", views.ip_location),
 ]
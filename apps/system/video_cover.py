@@ -2,12 +2,14 @@
 """
 视频封面：从视频文件截取第一帧为图片，用于 OSS 上传。
 检测视频旋转：ffprobe 读取编码尺寸与 rotation 元数据。
+按字节范围截帧：只读取 MP4 的 moov 与 mdat 开头（首个关键帧），无需下载整个视频。
 依赖系统已安装 ffmpeg/ffprobe（如：apt install ffmpeg / brew install ffmpeg）。
 """
 import json
 import logging
 import os
 import shutil
+import struct
 import subprocess
 import tempfile
 from pathlib import Path
@@ -147,3 +149,104 @@ def extract_first_frame(video_path, output_path=None, time_sec=0.0):
     except Exception as e:
         logger.warning("截取视频封面异常: %s", e)
     return None
+
+
+# 按范围截帧：首次读取的头部大小、mdat 开头预读大小（覆盖首个关键帧）、单个视频最多读取的字节数
+RANGE_HEAD_BYTES = 256 * 1024
+RANGE_FIRST_FRAME_BYTES = 2 * 1024 * 1024
+RANGE_MAX_BYTES = 16 * 1024 * 1024
+
+
+def _parse_box_header(buf, offset):
+    """解析 MP4 box 头，返回 (size, type, header_len)；数据不足返回 None。size 为 0 表示延续到文件末尾"""
+    if len(buf) - offset < 8:
+        return None
+    size, box_type = struct.unpack(">I4s", buf[offset : offset + 8])
+    header_len = 8
+    if size == 1:
+        if len(buf) - offset < 16:
+            return None
+        size = struct.unpack(">Q", buf[offset + 8 : offset + 16])[0]
+        header_len = 16
+    return size, box_type.decode("latin-1"), header_len
+
+
+def _scan_top_level_boxes(read_range, total_size):
+    """
+    只读 box 头遍历 MP4 顶层结构。头部之外的 box 每个只读 16 字节。
+    :return: (boxes, head_bytes, fetched)，boxes 为 [(type, offset, size, header_len)]；结构无法解析时 boxes 为 None
+    """
+    head = read_range(0, min(total_size, RANGE_HEAD_BYTES) - 1)
+    fetched = len(head)
+    boxes = []
+    offset = 0
+    while offset < total_size and len(boxes) < 64:
+        if offset + 16 <= len(head) or len(head) >= total_size:
+            parsed = _parse_box_header(head, offset)
+        else:
+            buf = read_range(offset, min(total_size, offset + 16) - 1)
+            fetched += len(buf)
+            parsed = _parse_box_header(buf, 0)
+        if not parsed:
+            break
+        size, box_type, header_len = parsed
+        if size == 0:
+            size = total_size - offset
+        if size < header_len:
+            return None, head, fetched
+        boxes.append((box_type, offset, size, header_len))
+        offset += size
+    return boxes, head, fetched
+
+
+def extract_first_frame_ranged(read_range, total_size, output_path=None):
+    """
+    按字节范围读取远端 MP4 并截取第一帧，适用于 OSS 等支持 Range 的存储。
+    faststart（moov 在 mdat 之前）只读文件开头；moov 在末尾时另读 moov，二者写入同尺寸的稀疏临时文件供 ffmpeg 解码。
+
+    :param read_range: callable(start, end)，返回 [start, end] 闭区间的字节
+    :param total_size: 视频总字节数
+    :return: (封面路径 或 None, 读取字节数, 模式 "faststart" / "moov_at_end" / None)。
+        返回 None 时调用方应回退为完整下载（非 MP4、结构异常、需读取量超过 RANGE_MAX_BYTES、解码失败）
+    """
+    if not total_size or total_size <= 0:
+        return None, 0, None
+    boxes, head, fetched = _scan_top_level_boxes(read_range, total_size)
+    if not boxes:
+        return None, fetched, None
+    moov = next((b for b in boxes if b[0] == "moov"), None)
+    mdat = next((b for b in boxes if b[0] == "mdat"), None)
+    if not moov or not mdat:
+        return None, fetched, None
+    mode = "faststart" if moov[1] < mdat[1] else "moov_at_end"
+    # 需要的区间：文件开头到 mdat 数据起始后 RANGE_FIRST_FRAME_BYTES；moov 在末尾时再加 moov 整段
+    regions = [(0, min(total_size, mdat[1] + mdat[3] + RANGE_FIRST_FRAME_BYTES))]
+    if mode == "moov_at_end":
+        regions.append((moov[1], moov[1] + moov[2]))
+    if sum(end - start for start, end in regions) > RANGE_MAX_BYTES:
+        return None, fetched, None
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".mp4", prefix="video_range_")
+    tmp_video = Path(tmp_path)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.truncate(total_size)
+            out.write(head)
+            for start, end in regions:
+                start = max(start, len(head))
+                if start >= end:
+                    continue
+                data = read_range(start, end - 1)
+                fetched += len(data)
+                out.seek(start)
+                out.write(data)
+        cover = extract_first_frame(tmp_video, output_path=output_path)
+        return cover, fetched, (mode if cover else None)
+    except Exception as e:
+        logger.warning("按范围截取视频封面异常: %s", e)
+        return None, fetched, None
+    finally:
+        try:
+            tmp_video.unlink()
+        except Exception:
+            pass
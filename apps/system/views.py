@@ -1,7 +1,5 @@
 import os
-import tempfile
 import uuid
-from pathlib import Path
 
 from django.utils import timezone
 from django.conf import settings
@@ -63,7 +61,10 @@ def announcements(request):
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def upload(request):
-    """上传图片/文件，multipart key=file。返回 { url }，用于头像、帖子图片与帖子视频。启用 OSS 时上传到阿里云并返回签名 URL。"""
+    """
+    上传图片/文件，multipart key=file。返回 { url, objectKey }，用于头像、帖子图片与帖子视频。
+    启用 OSS 时上传到阿里云，url 为展示用签名 URL；发帖/改头像时传 objectKey 或 url 均可，入库统一存 objectKey。
+    """
     from apps.account.session_store import get_user_id_by_token
     auth = request.META.get("HTTP_AUTHORIZATION") or ""
     if auth.startswith("Bearer "):
@@ -84,67 +85,9 @@ def upload(request):
     is_video = ext in _UPLOAD_VIDEO_EXTS
     oss_folder = "video" if is_video else "image"
 
-    # 启用 OSS 时上传到阿里云：图片进 image/，视频进 video/；视频会额外生成封面进 video_cover/
+    # 启用 OSS 时上传到阿里云：图片进 image/，视频进 video/；视频封面由后台任务生成到 video_cover/
     if getattr(settings, "ALIYUN_OSS_ENABLED", False) and getattr(settings, "ALIYUN_OSS_BUCKET", ""):
-        from .oss_upload import upload_file_to_oss, upload_path_to_oss
-        from .video_cover import extract_first_frame
-
-        if is_video:
-            # 视频：先落盘再上传（便于截帧），并生成封面图上传
-            tmp_video = None
-            tmp_cover = None
-            try:
-                fd, tmp_path = tempfile.mkstemp(suffix=ext, prefix="upload_video_")
-                tmp_video = Path(tmp_path)
-                try:
-                    with os.fdopen(fd, "wb") as out:
-                        for chunk in f.chunks():
-                            out.write(chunk)
-                except Exception:
-                    tmp_video.unlink(missing_ok=True)
-                    raise
-                object_name = f"{oss_folder}/{name}"
-                url, err = upload_path_to_oss(
-                    tmp_video,
-                    object_name,
-                    bucket=settings.ALIYUN_OSS_BUCKET,
-                    endpoint=settings.ALIYUN_OSS_ENDPOINT,
-                    credential_file=settings.ALIYUN_OSS_CREDENTIAL_FILE,
-                    signed_url_expires=getattr(settings, "ALIYUN_OSS_SIGNED_URL_EXPIRES", 604800),
-                )
-                if err:
-                    return Response(_result(500, err or "OSS 上传失败"), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                cover_url = None
-                cover_path = extract_first_frame(tmp_video)
-                if cover_path:
-                    tmp_cover = cover_path
-                    cover_name = f"{Path(name).stem}_cover.jpg"
-                    cover_object = f"video_cover/{cover_name}"
-                    cover_url, cover_err = upload_path_to_oss(
-                        cover_path,
-                        cover_object,
-                        bucket=settings.ALIYUN_OSS_BUCKET,
-                        endpoint=settings.ALIYUN_OSS_ENDPOINT,
-                        credential_file=settings.ALIYUN_OSS_CREDENTIAL_FILE,
-                        signed_url_expires=getattr(settings, "ALIYUN_OSS_SIGNED_URL_EXPIRES", 604800),
-                    )
-                    if cover_err:
-                        cover_url = None
-                result_data = {"url": url}
-                if cover_url:
-                    result_data["coverUrl"] = cover_url
-                return Response(_result(data=result_data))
-            finally:
-                if tmp_video and tmp_video.exists():
-                    try:
-                        tmp_video.unlink()
-                    except Exception:
-                        pass
-                if tmp_cover and Path(tmp_cover).exists():
-                    try:
-                        Path(tmp_cover).unlink()
-                    except Exception:
-                        pass
+        from .oss_upload import upload_file_to_oss
 
         object_name = f"{oss_folder}/{name}"
         url, err = upload_file_to_oss(
@@ -157,7 +100,14 @@ def upload(request):
         )
         if err:
             return Response(_result(500, err or "OSS 上传失败"), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        return Response(_result(data={"url": url}))
+        result_data = {"url": url, "objectKey": object_name}
+        if is_video:
+            local_path = f.temporary_file_path() if hasattr(f, "temporary_file_path") else None
+            result_data.update(_video_cover_result(object_name, uid, local_path=local_path))
+        else:
+            from .media_jobs import JOB_THUMBNAIL, enqueue
+            enqueue(JOB_THUMBNAIL, object_name, uid)
+        return Response(_result(data=result_data))
 
     # 已不再使用本地 media 存储，请配置并启用 OSS（ALIYUN_OSS_ENABLED=1, ALIYUN_OSS_BUCKET）或临时关闭 OSS 时设 ALIYUN_OSS_ENABLED=0 并取消下面注释以回退到本地
     return Response(_result(503, "上传服务未配置 OSS，请联系管理员"), status=503)
@@ -176,6 +126,55 @@ def _require_upload_auth(request):
     return uid, None
 
 
+def _video_cover_result(object_key, user_id, local_path=None):
+    """
+    视频封面：入队后台任务后立即返回 coverStatus=pending 与确定的 coverObjectKey，客户端轮询 media-job 取 coverUrl；
+    任务表不可用时回退为同步截帧（local_path 为已落盘的视频，可省去从 OSS 下载）。
+    """
+    from .media_jobs import JOB_VIDEO_COVER, cover_key_for, enqueue, run_video_cover
+    from .oss_signer import sign_many
+
+    job_id = enqueue(JOB_VIDEO_COVER, object_key, user_id)
+    if job_id:
+        return {"coverStatus": "pending", "coverObjectKey": cover_key_for(object_key), "jobId": job_id}
+    result, err = run_video_cover(object_key, local_path=local_path)
+    if err:
+        return {"coverStatus": "failed"}
+    cover_url = sign_many([result["coverKey"]])[0]
+    data = {"coverStatus": "done", "coverObjectKey": result["coverKey"]}
+    if cover_url:
+        data["coverUrl"] = cover_url
+    return data
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def media_job_status(request):
+    """
+    查询视频封面任务进度。query: objectKey=video/xxx.mp4
+    返回 { status: pending|running|done|failed, coverObjectKey, coverUrl（done 时） }；封面的缩略图随后由后台生成
+    """
+    uid, err_resp = _require_upload_auth(request)
+    if err_resp is not None:
+        return err_resp
+    object_key = (request.GET.get("objectKey") or "").strip()
+    if not object_key.startswith("video/"):
+        return Response(_result(400, "缺少或无效的 objectKey"), status=status.HTTP_400_BAD_REQUEST)
+    from .media_jobs import JOB_VIDEO_COVER, job_status
+    from .oss_signer import sign_many
+
+    job = job_status(JOB_VIDEO_COVER, object_key)
+    # 只能查询自己上传的视频的任务，其他用户的任务按不存在处理
+    if not job or job["user_id"] != uid:
+        return Response(_result(404, "任务不存在"), status=status.HTTP_404_NOT_FOUND)
+    data = {"status": job["status"]}
+    cover_key = (job["result"] or {}).get("coverKey")
+    if job["status"] == "done" and cover_key:
+        data["coverObjectKey"] = cover_key
+        data["coverUrl"] = sign_many([cover_key])[0]
+    return Response(_result(data=data))
+
+
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def presign_upload(request):
@@ -219,7 +218,7 @@ def presign_upload(request):
 @permission_classes([AllowAny])
 def confirm_upload(request):
     """
-    视频直传 OSS 后，由后端拉取视频、截封面并上传封面，返回展示用 url 与 coverUrl。
+    视频直传 OSS 后确认上传：返回展示用 url，并入队封面任务（coverStatus=pending，完成后通过 media-job 查询 coverUrl）。
     body: { "objectKey": "video/xxx.mp4" }。
     """
     uid, err_resp = _require_upload_auth(request)
@@ -230,65 +229,13 @@ def confirm_upload(request):
         return Response(_result(400, "缺少或无效的 objectKey"), status=status.HTTP_400_BAD_REQUEST)
     if not getattr(settings, "ALIYUN_OSS_ENABLED", False) or not getattr(settings, "ALIYUN_OSS_BUCKET", ""):
         return Response(_result(503, "上传服务未配置 OSS"), status=503)
-    from .oss_upload import download_oss_to_path, upload_path_to_oss, get_presigned_upload_urls
-    from .video_cover import extract_first_frame
-    tmp_video = None
-    tmp_cover = None
-    try:
-        fd, tmp_path = tempfile.mkstemp(suffix=Path(object_key).suffix or ".mp4", prefix="confirm_video_")
-        tmp_video = Path(tmp_path)
-        os.close(fd)
-        ok, err = download_oss_to_path(
-            object_key,
-            str(tmp_video),
-            bucket=settings.ALIYUN_OSS_BUCKET,
-            endpoint=settings.ALIYUN_OSS_ENDPOINT,
-            credential_file=settings.ALIYUN_OSS_CREDENTIAL_FILE,
-        )
-        if not ok:
-            return Response(_result(500, err or "拉取视频失败"), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        read_expires = getattr(settings, "ALIYUN_OSS_SIGNED_URL_EXPIRES", 604800)
-        upload_url, read_url, _ = get_presigned_upload_urls(
-            object_key,
-            bucket=settings.ALIYUN_OSS_BUCKET,
-            endpoint=settings.ALIYUN_OSS_ENDPOINT,
-            credential_file=settings.ALIYUN_OSS_CREDENTIAL_FILE,
-            upload_expires=60,
-            read_expires=read_expires,
-        )
-        if not read_url:
-            return Response(_result(500, "生成视频链接失败"), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        cover_url = None
-        cover_path = extract_first_frame(tmp_video)
-        if cover_path:
-            tmp_cover = cover_path
-            cover_name = f"{Path(object_key).stem}_cover.jpg"
-            cover_object = f"video_cover/{cover_name}"
-            cover_url, cover_err = upload_path_to_oss(
-                cover_path,
-                cover_object,
-                bucket=settings.ALIYUN_OSS_BUCKET,
-                endpoint=settings.ALIYUN_OSS_ENDPOINT,
-                credential_file=settings.ALIYUN_OSS_CREDENTIAL_FILE,
-                signed_url_expires=read_expires,
-            )
-            if cover_err:
-                cover_url = None
-        result_data = {"url": read_url}
-        if cover_url:
-            result_data["coverUrl"] = cover_url
-        return Response(_result(data=result_data))
-    finally:
-        if tmp_video and tmp_video.exists():
-            try:
-                tmp_video.unlink()
-            except Exception:
-                pass
-        if tmp_cover and Path(tmp_cover).exists():
-            try:
-                Path(tmp_cover).unlink()
-            except Exception:
-                pass
+    from .oss_signer import sign_many
+    read_url = sign_many([object_key])[0]
+    if not read_url:
+        return Response(_result(500, "生成视频链接失败"), status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    result_data = {"url": read_url, "objectKey": object_key}
+    result_data.update(_video_cover_result(object_key, uid))
+    return Response(_result(data=result_data))
     # 本地存储（仅当需要临时回退时取消注释）
     # root = getattr(settings, "MEDIA_ROOT", None)
     # url_prefix = getattr(settings, "MEDIA_URL", "media/")
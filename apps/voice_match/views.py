@@ -12,6 +12,7 @@ from rest_framework.response import Response
 
 from apps.account.models import User
 from apps.account.session_store import get_user_id_by_token
+from apps.im import realtime
 from .agora_token import build_rtc_token
 from .models import VoiceRoom
 
@@ -65,6 +66,8 @@ def _try_pair(redis_conn):
     redis_conn.setex(MATCHED_ROOM.format(user_id_2), MATCHED_TTL, room_id)
     redis_conn.delete(USER_IN_POOL.format(user_id_1))
     redis_conn.delete(USER_IN_POOL.format(user_id_2))
+    # 在线时经 WebSocket 直接收到匹配结果，match_status 轮询保留作回退
+    realtime.push([user_id_1, user_id_2], "voice_match", {"status": "matched", "roomId": room_id})
     return room_id, user_id_1, user_id_2
 
 
@@ -2,4 +2,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Django 初始化后再导入网关（依赖 settings / session_store）
+from apps.im.gateway import asgi_router  # noqa: E402
+
+application = asgi_router(django_application)
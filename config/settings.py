@@ -126,6 +126,13 @@ ALIYUN_OSS_BUCKET = os.environ.get("ALIYUN_OSS_BUCKET", "xuanyuapp")
 ALIYUN_OSS_ENDPOINT = os.environ.get("ALIYUN_OSS_ENDPOINT", "oss-cn-beijing.aliyuncs.com")
 # 签名 URL 有效期（秒），私有读时返回带签名的临时链接，过期需重新向接口申请
 ALIYUN_OSS_SIGNED_URL_EXPIRES = int(os.environ.get("ALIYUN_OSS_SIGNED_URL_EXPIRES", "604800"))  # 默认 7 天
+# 签名 URL 缓存：剩余有效期不足该值（秒）才重新签名，否则复用已有签名，保证 URL 稳定、图片缓存可命中
+ALIYUN_OSS_SIGNED_URL_MIN_REMAINING = int(os.environ.get("ALIYUN_OSS_SIGNED_URL_MIN_REMAINING", "86400"))  # 默认 1 天
+ALIYUN_OSS_SIGNED_URL_CACHE_SIZE = int(os.environ.get("ALIYUN_OSS_SIGNED_URL_CACHE_SIZE", "20000"))  # 进程内最多缓存条数
+# 上传：超过阈值的文件走分片并发上传，单次上传内存占用约为 分片大小 × 线程数
+ALIYUN_OSS_MULTIPART_THRESHOLD = int(os.environ.get("ALIYUN_OSS_MULTIPART_THRESHOLD", str(10 * 1024 * 1024)))
+ALIYUN_OSS_PART_SIZE = int(os.environ.get("ALIYUN_OSS_PART_SIZE", str(4 * 1024 * 1024)))
+ALIYUN_OSS_UPLOAD_THREADS = int(os.environ.get("ALIYUN_OSS_UPLOAD_THREADS", "3"))
 
 # 管理后台 API 鉴权：请求头 X-Admin-Token 需与此一致；不设置时仅 DEBUG 下允许访问
 ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY", "")
@@ -9,6 +9,8 @@
 CREATE DATABASE IF NOT EXISTS lingshu DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 USE lingshu;
 SET NAMES utf8mb4;
+-- 全文索引（ngram）不使用 InnoDB 默认停用词表，否则含 a、i 等停用词的 token 不入索引
+SET SESSION innodb_ft_enable_stopword = OFF;
 
 -- =============================================================================
 -- 2. 主表结构（用户、帖子、IM、钱包等，已含后续迁移字段）
@@ -32,7 +34,8 @@ CREATE TABLE IF NOT EXISTS `user` (
     PRIMARY KEY (`id`),
     UNIQUE KEY `uk_mobile` (`mobile`),
     UNIQUE KEY `uk_user_code` (`user_code`),
-    KEY `idx_status` (`status`)
+    KEY `idx_status` (`status`),
+    FULLTEXT KEY `ft_user_nickname` (`nickname`) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户主表';
 
 CREATE TABLE IF NOT EXISTS `user_profile` (
@@ -42,6 +45,8 @@ CREATE TABLE IF NOT EXISTS `user_profile` (
     `birth_time` VARCHAR(10) DEFAULT NULL COMMENT '出生时辰 HH:mm',
     `xiyongshen` VARCHAR(64) DEFAULT NULL COMMENT '喜用神 JSON 如 {"喜神":"水","用神":"木"}',
     `region_code` VARCHAR(32) DEFAULT NULL COMMENT '地域',
+    `region_province` VARCHAR(16) DEFAULT NULL COMMENT '省（短名，由 region_code 解析）',
+    `region_city` VARCHAR(16) DEFAULT NULL COMMENT '市（短名，由 region_code 解析）',
     `open_bazi_level` TINYINT DEFAULT 0 COMMENT '八字公开程度',
     `is_master` TINYINT NOT NULL DEFAULT 0 COMMENT '0否 1是名师',
     `real_name` VARCHAR(64) DEFAULT NULL COMMENT '实名',
@@ -191,6 +196,8 @@ CREATE TABLE IF NOT EXISTS `post` (
     `topic_ids_json` VARCHAR(500) DEFAULT NULL,
     `tags_json` VARCHAR(500) DEFAULT NULL COMMENT '自定义标签名 JSON 数组',
     `location_code` VARCHAR(32) DEFAULT NULL,
+    `region_province` VARCHAR(16) DEFAULT NULL COMMENT '发帖时作者所在省',
+    `region_city` VARCHAR(16) DEFAULT NULL COMMENT '发帖时作者所在市',
     `visibility` TINYINT NOT NULL DEFAULT 1,
     `allow_comment` TINYINT NOT NULL DEFAULT 1 COMMENT '0禁止 1允许',
     `status` TINYINT NOT NULL DEFAULT 1,
@@ -201,9 +208,23 @@ CREATE TABLE IF NOT EXISTS `post` (
     `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     PRIMARY KEY (`id`),
     KEY `idx_user_id` (`user_id`),
-    KEY `idx_created_at` (`created_at`)
+    KEY `idx_created_at` (`created_at`),
+    KEY `idx_status_created_id` (`status`, `created_at`, `id`),
+    KEY `idx_user_status_created_id` (`user_id`, `status`, `created_at`, `id`),
+    KEY `idx_city_status_created` (`region_city`, `status`, `created_at`, `id`),
+    KEY `idx_province_status_created` (`region_province`, `status`, `created_at`, `id`),
+    FULLTEXT KEY `ft_post_content_tags` (`content`, `tags_json`) WITH PARSER ngram
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='帖子';
 
+CREATE TABLE IF NOT EXISTS `post_topic` (
+    `topic_id` BIGINT NOT NULL,
+    `post_id` BIGINT NOT NULL,
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '帖子发布时间',
+    PRIMARY KEY (`topic_id`, `post_id`),
+    KEY `idx_topic_created_post` (`topic_id`, `created_at`, `post_id`),
+    KEY `idx_post_id` (`post_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='帖子-话题关联';
+
 CREATE TABLE IF NOT EXISTS `post_like` (
     `user_id` BIGINT NOT NULL,
     `post_id` BIGINT NOT NULL,
@@ -215,7 +236,8 @@ CREATE TABLE IF NOT EXISTS `post_favorite` (
     `user_id` BIGINT NOT NULL,
     `post_id` BIGINT NOT NULL,
     `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    PRIMARY KEY (`user_id`, `post_id`)
+    PRIMARY KEY (`user_id`, `post_id`),
+    KEY `idx_user_created_post` (`user_id`, `created_at`, `post_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='收藏';
 
 CREATE TABLE IF NOT EXISTS `comment` (
@@ -237,9 +259,20 @@ CREATE TABLE IF NOT EXISTS `user_follow` (
     `user_id` BIGINT NOT NULL,
     `target_user_id` BIGINT NOT NULL,
     `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    PRIMARY KEY (`user_id`, `target_user_id`)
+    PRIMARY KEY (`user_id`, `target_user_id`),
+    KEY `idx_target_user` (`target_user_id`, `user_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='关注关系';
 
+CREATE TABLE IF NOT EXISTS `user_stats` (
+    `user_id` BIGINT NOT NULL,
+    `follow_count` INT NOT NULL DEFAULT 0 COMMENT '关注数',
+    `follower_count` INT NOT NULL DEFAULT 0 COMMENT '粉丝数',
+    `post_count` INT NOT NULL DEFAULT 0 COMMENT '正常状态帖子数',
+    `received_like_count` BIGINT NOT NULL DEFAULT 0 COMMENT '正常状态帖子获赞数之和',
+    `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`user_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户统计计数';
+
 CREATE TABLE IF NOT EXISTS `match_config` (
     `user_id` BIGINT NOT NULL,
     `gender` TINYINT DEFAULT NULL,
@@ -265,6 +298,11 @@ CREATE TABLE IF NOT EXISTS `conversation` (
     `id` BIGINT NOT NULL AUTO_INCREMENT,
     `type` VARCHAR(20) NOT NULL COMMENT 'single/group',
     `name` VARCHAR(128) DEFAULT NULL COMMENT '群名',
+    `last_msg_id` BIGINT DEFAULT NULL COMMENT '最后一条消息 id',
+    `last_msg_type` VARCHAR(20) DEFAULT NULL,
+    `last_msg_preview` VARCHAR(100) DEFAULT NULL COMMENT '列表展示文案，如 [图片]',
+    `last_msg_sender_id` BIGINT DEFAULT NULL,
+    `last_msg_at` DATETIME DEFAULT NULL,
     `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     PRIMARY KEY (`id`),
@@ -279,6 +317,7 @@ CREATE TABLE IF NOT EXISTS `conversation_member` (
     `mute` TINYINT NOT NULL DEFAULT 0,
     `top` TINYINT NOT NULL DEFAULT 0,
     `last_read_msg_id` BIGINT DEFAULT NULL,
+    `unread_count` INT NOT NULL DEFAULT 0 COMMENT '未读消息数（不含自己发的）',
     `joined_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (`id`),
     UNIQUE KEY `uk_conv_user` (`conversation_id`, `user_id`),
@@ -295,9 +334,17 @@ CREATE TABLE IF NOT EXISTS `message` (
     `status` TINYINT NOT NULL DEFAULT 1,
     `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (`id`),
-    KEY `idx_conv_created` (`conversation_id`, `created_at`)
+    KEY `idx_conv_created` (`conversation_id`, `created_at`),
+    KEY `idx_conv_id` (`conversation_id`, `id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='消息';
 
+CREATE TABLE IF NOT EXISTS `message_search_token` (
+    `conversation_id` BIGINT NOT NULL,
+    `token` VARCHAR(2) NOT NULL COMMENT '小写后的相邻二字（中文/字母数字）',
+    `message_id` BIGINT NOT NULL,
+    PRIMARY KEY (`conversation_id`, `token`, `message_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin COMMENT='会话消息搜索倒排索引';
+
 CREATE TABLE IF NOT EXISTS `im_group` (
     `conversation_id` BIGINT NOT NULL,
     `owner_id` BIGINT NOT NULL,
@@ -341,11 +388,22 @@ CREATE TABLE IF NOT EXISTS `notification` (
     `comment_id` BIGINT DEFAULT NULL COMMENT '仅 comment 时有',
     `content_snippet` VARCHAR(255) DEFAULT NULL COMMENT '评论内容摘要',
     `read` TINYINT NOT NULL DEFAULT 0,
+    `agg_count` INT NOT NULL DEFAULT 1 COMMENT '合并的触发人数，from_user_id 为最近触发人',
+    `event_id` VARCHAR(32) DEFAULT NULL COMMENT 'Redis Stream 事件 id（重放去重）',
     `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (`id`),
-    KEY `idx_user_created` (`user_id`, `created_at`)
+    UNIQUE KEY `uk_event_id` (`event_id`),
+    KEY `idx_user_created` (`user_id`, `created_at`),
+    KEY `idx_user_post_type` (`user_id`, `post_id`, `type`, `created_at`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='互动通知';
 
+CREATE TABLE IF NOT EXISTS `notification_actor` (
+    `notification_id` BIGINT NOT NULL,
+    `actor_id` BIGINT NOT NULL,
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`notification_id`, `actor_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='合并互动通知的触发人（按人去重计数）';
+
 CREATE TABLE IF NOT EXISTS `system_notification` (
     `id` BIGINT NOT NULL AUTO_INCREMENT,
     `user_id` BIGINT NOT NULL COMMENT '接收人',
@@ -359,6 +417,25 @@ CREATE TABLE IF NOT EXISTS `system_notification` (
     KEY `idx_user_created` (`user_id`, `created_at`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='系统通知（公告、帖子下架等）';
 
+CREATE TABLE IF NOT EXISTS `broadcast_notification` (
+    `id` BIGINT NOT NULL AUTO_INCREMENT,
+    `type` VARCHAR(32) NOT NULL COMMENT 'announcement',
+    `title` VARCHAR(255) NOT NULL,
+    `content` TEXT DEFAULT NULL,
+    `extra_json` VARCHAR(1024) DEFAULT NULL COMMENT '如 announcementId, linkUrl',
+    `status` TINYINT NOT NULL DEFAULT 1 COMMENT '1 生效 0 撤回',
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`id`),
+    KEY `idx_status_id` (`status`, `id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='全员系统通知（读时合并）';
+
+CREATE TABLE IF NOT EXISTS `user_broadcast_state` (
+    `user_id` BIGINT NOT NULL,
+    `last_read_id` BIGINT NOT NULL DEFAULT 0 COMMENT '已读到的 broadcast_notification.id',
+    `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`user_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户全员通知已读水位';
+
 -- ------------------------------ 4.6 举报与风控 ------------------------------
 CREATE TABLE IF NOT EXISTS `report` (
     `id` BIGINT NOT NULL AUTO_INCREMENT,
@@ -433,6 +510,24 @@ CREATE TABLE IF NOT EXISTS `agreement` (
     PRIMARY KEY (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='协议版本';
 
+CREATE TABLE IF NOT EXISTS `media_job` (
+    `id` BIGINT NOT NULL AUTO_INCREMENT,
+    `job_type` VARCHAR(32) NOT NULL COMMENT 'video_cover 等',
+    `object_key` VARCHAR(255) NOT NULL COMMENT '源文件 OSS object key',
+    `user_id` BIGINT DEFAULT NULL COMMENT '上传者',
+    `status` VARCHAR(16) NOT NULL DEFAULT 'pending' COMMENT 'pending/running/done/failed',
+    `attempts` INT NOT NULL DEFAULT 0 COMMENT '已执行次数',
+    `result_json` TEXT DEFAULT NULL COMMENT '产物，如 {"coverKey": "video_cover/xxx_cover.jpg"}',
+    `error` VARCHAR(512) DEFAULT NULL COMMENT '最近一次失败原因',
+    `next_run_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '下次可执行时间（失败退避）',
+    `locked_until` DATETIME DEFAULT NULL COMMENT '领取租约到期时间',
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (`id`),
+    UNIQUE KEY `uk_type_key` (`job_type`, `object_key`),
+    KEY `idx_status_run` (`status`, `next_run_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='媒体后台任务';
+
 -- =============================================================================
 -- 初始化完成
 -- =============================================================================
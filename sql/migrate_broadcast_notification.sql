@@ -0,0 +1,22 @@
+-- 全员系统通知（平台公告）读时合并：发布公告只写一行 broadcast_notification，不再给每个用户插一行 system_notification
+-- user_broadcast_state.last_read_id 为用户已读水位，id 不大于水位的公告视为已读；无记录表示全部未读
+-- 执行：mysql -u root -p lingshu < migrate_broadcast_notification.sql
+
+CREATE TABLE IF NOT EXISTS `broadcast_notification` (
+    `id` BIGINT NOT NULL AUTO_INCREMENT,
+    `type` VARCHAR(32) NOT NULL COMMENT 'announcement',
+    `title` VARCHAR(255) NOT NULL,
+    `content` TEXT DEFAULT NULL,
+    `extra_json` VARCHAR(1024) DEFAULT NULL COMMENT '如 announcementId, linkUrl',
+    `status` TINYINT NOT NULL DEFAULT 1 COMMENT '1 生效 0 撤回',
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`id`),
+    KEY `idx_status_id` (`status`, `id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='全员系统通知（读时合并）';
+
+CREATE TABLE IF NOT EXISTS `user_broadcast_state` (
+    `user_id` BIGINT NOT NULL,
+    `last_read_id` BIGINT NOT NULL DEFAULT 0 COMMENT '已读到的 broadcast_notification.id',
+    `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`user_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户全员通知已读水位';
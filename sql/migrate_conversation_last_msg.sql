@@ -0,0 +1,26 @@
+-- 会话最后一条消息快照：会话列表直接读 conversation 行，不再按 message 分组求 MAX(id) 再回表
+-- 排序由 Redis 收件箱（im:inbox:<uid>，按 updated_at）提供，无需额外索引
+-- 执行：mysql -u root -p lingshu < migrate_conversation_last_msg.sql
+
+ALTER TABLE conversation
+    ADD COLUMN `last_msg_id` BIGINT DEFAULT NULL COMMENT '最后一条消息 id' AFTER `name`,
+    ADD COLUMN `last_msg_type` VARCHAR(20) DEFAULT NULL AFTER `last_msg_id`,
+    ADD COLUMN `last_msg_preview` VARCHAR(100) DEFAULT NULL COMMENT '列表展示文案，如 [图片]' AFTER `last_msg_type`,
+    ADD COLUMN `last_msg_sender_id` BIGINT DEFAULT NULL AFTER `last_msg_preview`,
+    ADD COLUMN `last_msg_at` DATETIME DEFAULT NULL AFTER `last_msg_sender_id`;
+
+-- 按现有消息回填（文案规则与 im.views._conversation_last_message_preview 一致）；updated_at 保持不变
+UPDATE conversation c
+JOIN (SELECT conversation_id, MAX(id) AS mid FROM message GROUP BY conversation_id) t ON t.conversation_id = c.id
+JOIN message m ON m.id = t.mid
+SET c.last_msg_id = m.id,
+    c.last_msg_type = m.type,
+    c.last_msg_preview = CASE
+        WHEN m.content_encrypted IS NULL OR m.content_encrypted = '' THEN ''
+        WHEN m.type = 'image' THEN '[图片]'
+        WHEN m.type = 'post' THEN '[帖子]'
+        ELSE LEFT(m.content_encrypted, 50)
+    END,
+    c.last_msg_sender_id = m.sender_id,
+    c.last_msg_at = m.created_at,
+    c.updated_at = c.updated_at;
@@ -0,0 +1,15 @@
+-- 会话未读数反范式：conversation_member.unread_count 由发消息时累加、标记已读时重置，
+-- 会话列表一次读出，不再每个会话 COUNT(message)
+-- 执行：mysql -u root -p lingshu < migrate_conversation_unread.sql
+
+ALTER TABLE conversation_member
+    ADD COLUMN `unread_count` INT NOT NULL DEFAULT 0 COMMENT '未读消息数（不含自己发的）' AFTER `last_read_msg_id`;
+
+-- 按现有已读位置回填
+UPDATE conversation_member cm
+SET cm.unread_count = (
+    SELECT COUNT(*) FROM message m
+    WHERE m.conversation_id = cm.conversation_id
+      AND m.id > COALESCE(cm.last_read_msg_id, 0)
+      AND m.sender_id != cm.user_id
+);
@@ -0,0 +1,20 @@
+-- 媒体后台任务表：视频封面等耗时处理由 media_worker 异步执行
+-- 执行：mysql -u root -p lingshu < migrate_media_job.sql
+
+CREATE TABLE IF NOT EXISTS `media_job` (
+    `id` BIGINT NOT NULL AUTO_INCREMENT,
+    `job_type` VARCHAR(32) NOT NULL COMMENT 'video_cover 等',
+    `object_key` VARCHAR(255) NOT NULL COMMENT '源文件 OSS object key',
+    `user_id` BIGINT DEFAULT NULL COMMENT '上传者',
+    `status` VARCHAR(16) NOT NULL DEFAULT 'pending' COMMENT 'pending/running/done/failed',
+    `attempts` INT NOT NULL DEFAULT 0 COMMENT '已执行次数',
+    `result_json` TEXT DEFAULT NULL COMMENT '产物，如 {"coverKey": "video_cover/xxx_cover.jpg"}',
+    `error` VARCHAR(512) DEFAULT NULL COMMENT '最近一次失败原因',
+    `next_run_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '下次可执行时间（失败退避）',
+    `locked_until` DATETIME DEFAULT NULL COMMENT '领取租约到期时间',
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (`id`),
+    UNIQUE KEY `uk_type_key` (`job_type`, `object_key`),
+    KEY `idx_status_run` (`status`, `next_run_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='媒体后台任务';
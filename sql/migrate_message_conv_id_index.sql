@@ -0,0 +1,5 @@
+-- 消息增量同步：message_list 的 since_id / before_id 与 messages/sync 按 (conversation_id, id) 做范围扫描，
+-- 原 (conversation_id, created_at) 索引无法按 id 定位，只能在会话内逐行过滤
+-- 执行：mysql -u root -p lingshu < migrate_message_conv_id_index.sql
+
+ALTER TABLE message ADD KEY `idx_conv_id` (`conversation_id`, `id`);
@@ -0,0 +1,11 @@
+-- 会话内消息搜索倒排索引：每条文本消息按 bigram 写入 (conversation_id, token, message_id)，
+-- 搜索只读该会话命中 token 的倒排列表，不再 LIKE 扫描会话全部历史（见 apps/im/search.py）
+-- 建表后执行 python manage.py backfill_message_search 回填历史消息
+-- 执行：mysql -u root -p lingshu < migrate_message_search.sql
+
+CREATE TABLE IF NOT EXISTS `message_search_token` (
+    `conversation_id` BIGINT NOT NULL,
+    `token` VARCHAR(2) NOT NULL COMMENT '小写后的相邻二字（中文/字母数字）',
+    `message_id` BIGINT NOT NULL,
+    PRIMARY KEY (`conversation_id`, `token`, `message_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin COMMENT='会话消息搜索倒排索引';
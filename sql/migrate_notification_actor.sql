@@ -0,0 +1,20 @@
+-- 互动通知合并按人去重、消费者重放幂等
+-- notification_actor：合并通知的触发人，(notification_id, actor_id) 唯一，agg_count 只在新增触发人时累加，
+--   同一人反复取消/点赞或事件重放不会把 "A 等 N 人" 的人数算多
+-- notification.event_id：非合并通知（评论）对应的 Redis Stream 事件 id，XACK 失败重放时不重复插入、不重复计未读
+-- 执行：mysql -u root -p lingshu < migrate_notification_actor.sql
+
+CREATE TABLE IF NOT EXISTS `notification_actor` (
+    `notification_id` BIGINT NOT NULL,
+    `actor_id` BIGINT NOT NULL,
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`notification_id`, `actor_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='合并互动通知的触发人（按人去重计数）';
+
+ALTER TABLE notification
+    ADD COLUMN `event_id` VARCHAR(32) DEFAULT NULL COMMENT 'Redis Stream 事件 id（重放去重）' AFTER `agg_count`,
+    ADD UNIQUE KEY `uk_event_id` (`event_id`);
+
+-- 已有的未读合并通知只知道最近一次触发人，回填这一人；agg_count 保持原值
+INSERT IGNORE INTO notification_actor (notification_id, actor_id)
+SELECT id, from_user_id FROM notification WHERE type IN ('like', 'favorite', 'share') AND `read` = 0;
@@ -0,0 +1,7 @@
+-- 互动通知合并：点赞/收藏/分享按 (接收人, 帖子, 类型) 合并为一条，agg_count 为合并的触发次数
+-- 消费者按 (user_id, post_id, type) 查找时间窗口内未读的同类通知
+-- 执行：mysql -u root -p lingshu < migrate_notification_agg.sql
+
+ALTER TABLE notification
+    ADD COLUMN `agg_count` INT NOT NULL DEFAULT 1 COMMENT '合并的触发次数，from_user_id 为最近触发人' AFTER `read`,
+    ADD KEY `idx_user_post_type` (`user_id`, `post_id`, `type`, `created_at`);
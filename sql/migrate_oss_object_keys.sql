@@ -0,0 +1,26 @@
+-- 媒体字段由完整签名 URL 改为存 OSS object key（如 image/xxx.jpg），接口返回时再统一签名
+-- 回填历史数据：去掉协议头、域名与签名参数，并还原 %2F；非本 Bucket 的外链不受影响
+-- 依赖 MySQL 8 REGEXP_REPLACE；若 Bucket/Endpoint 不是默认值，请先修改下面的 @oss_host
+-- 执行：mysql -u root -p lingshu < migrate_oss_object_keys.sql
+
+SET @oss_host = 'xuanyuapp.oss-cn-beijing.aliyuncs.com';
+SET @oss_url_re = CONCAT('https?://', REPLACE(@oss_host, '.', '\\.'), '/([^"?]*)(\\?[^"]*)?');
+
+-- 帖子媒体与视频封面（JSON 数组文本）
+UPDATE post
+SET media_urls_json = REPLACE(REGEXP_REPLACE(media_urls_json, @oss_url_re, '$1'), '%2F', '/')
+WHERE media_urls_json LIKE CONCAT('%', @oss_host, '%');
+
+UPDATE post
+SET media_cover_urls_json = REPLACE(REGEXP_REPLACE(media_cover_urls_json, @oss_url_re, '$1'), '%2F', '/')
+WHERE media_cover_urls_json LIKE CONCAT('%', @oss_host, '%');
+
+-- 用户头像
+UPDATE `user`
+SET avatar_url = REPLACE(REGEXP_REPLACE(avatar_url, @oss_url_re, '$1'), '%2F', '/')
+WHERE avatar_url LIKE CONCAT('%', @oss_host, '%');
+
+-- IM 图片消息
+UPDATE message
+SET content_encrypted = REPLACE(REGEXP_REPLACE(content_encrypted, @oss_url_re, '$1'), '%2F', '/')
+WHERE type = 'image' AND content_encrypted LIKE CONCAT('%', @oss_host, '%');
@@ -0,0 +1,10 @@
+-- 帖子列表游标分页：(created_at, id) < 游标 的范围扫描所需复合索引
+-- 信息流/话题/搜索按 status 过滤，用户主页按 user_id + status，收藏按 user_id + 收藏时间
+-- 执行：mysql -u root -p lingshu < migrate_post_keyset_index.sql
+
+ALTER TABLE post
+    ADD KEY `idx_status_created_id` (`status`, `created_at`, `id`),
+    ADD KEY `idx_user_status_created_id` (`user_id`, `status`, `created_at`, `id`);
+
+ALTER TABLE post_favorite
+    ADD KEY `idx_user_created_post` (`user_id`, `created_at`, `post_id`);
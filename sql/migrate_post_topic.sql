@@ -0,0 +1,21 @@
+-- 帖子-话题关联表：话题页按 (topic_id, created_at, post_id) 索引范围扫描 + 游标分页，替代对 post.topic_ids_json 的 LIKE 全表扫描
+-- created_at 冗余帖子发布时间；post.topic_ids_json 保留，供详情/列表展示话题
+-- 执行：mysql -u root -p lingshu < migrate_post_topic.sql
+
+CREATE TABLE IF NOT EXISTS `post_topic` (
+    `topic_id` BIGINT NOT NULL,
+    `post_id` BIGINT NOT NULL,
+    `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '帖子发布时间',
+    PRIMARY KEY (`topic_id`, `post_id`),
+    KEY `idx_topic_created_post` (`topic_id`, `created_at`, `post_id`),
+    KEY `idx_post_id` (`post_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='帖子-话题关联';
+
+-- 由已有帖子的 topic_ids_json 回填（可重复执行）
+INSERT IGNORE INTO post_topic (topic_id, post_id, created_at)
+SELECT jt.topic_id, p.id, p.created_at
+FROM post p,
+     JSON_TABLE(p.topic_ids_json, '$[*]' COLUMNS (`topic_id` BIGINT PATH '$' NULL ON ERROR)) jt
+WHERE p.topic_ids_json IS NOT NULL
+  AND JSON_VALID(p.topic_ids_json)
+  AND jt.topic_id IS NOT NULL;
@@ -0,0 +1,14 @@
+-- 同城信息流：定位文本解析为省/市短名（apps/community/region.py），存于 user_profile，发帖时冗余到 post
+-- 同城查询变为 post.region_city（或 region_province）等值 + 时间倒序的索引范围扫描
+-- 执行后运行 python manage.py backfill_region 回填历史数据
+-- 执行：mysql -u root -p lingshu < migrate_region.sql
+
+ALTER TABLE user_profile
+    ADD COLUMN region_province VARCHAR(16) DEFAULT NULL COMMENT '省（短名，由 region_code 解析）',
+    ADD COLUMN region_city VARCHAR(16) DEFAULT NULL COMMENT '市（短名，由 region_code 解析）';
+
+ALTER TABLE post
+    ADD COLUMN region_province VARCHAR(16) DEFAULT NULL COMMENT '发帖时作者所在省',
+    ADD COLUMN region_city VARCHAR(16) DEFAULT NULL COMMENT '发帖时作者所在市',
+    ADD KEY `idx_city_status_created` (`region_city`, `status`, `created_at`, `id`),
+    ADD KEY `idx_province_status_created` (`region_province`, `status`, `created_at`, `id`);
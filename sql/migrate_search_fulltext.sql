@@ -0,0 +1,15 @@
+-- 帖子/用户搜索：FULLTEXT 索引（ngram 分词，支持中文），替代 LIKE '%关键词%' 全表扫描
+-- ngram 分词长度由 MySQL 参数 ngram_token_size 决定（默认 2，需在建索引前于 my.cnf 设置）；单字搜索接口回退 LIKE
+-- 建索引前关闭 InnoDB 默认停用词表：ngram 下含停用词（如 a、i）的 token 整个不入索引，"lisa"、"taichi" 这类拼音/英文搜不到；
+-- 停用词设置在建索引时固化到索引上，之后重建表（ALTER/OPTIMIZE）也需关闭，建议 my.cnf 同时配置 innodb_ft_enable_stopword = OFF
+-- 执行：mysql -u root -p lingshu < migrate_search_fulltext.sql
+
+-- 旧数据 tags_json 中文为 \uXXXX 转义，全文索引无法命中，先还原为 UTF-8 原文
+UPDATE post SET tags_json = CAST(CAST(tags_json AS JSON) AS CHAR)
+WHERE tags_json LIKE '%\\\\u%' AND JSON_VALID(tags_json);
+
+SET SESSION innodb_ft_enable_stopword = OFF;
+
+ALTER TABLE post ADD FULLTEXT KEY `ft_post_content_tags` (`content`, `tags_json`) WITH PARSER ngram;
+
+ALTER TABLE `user` ADD FULLTEXT KEY `ft_user_nickname` (`nickname`) WITH PARSER ngram;
@@ -0,0 +1,12 @@
+-- 重建帖子/用户搜索的全文索引，关闭 InnoDB 默认停用词表
+-- ngram 分词下含停用词（如 a、i）的 token 整个不入索引，英文/拼音昵称与内容（"lisa"、"taichi"）搜不到；
+-- 停用词设置在建索引时固化，只能删掉重建。按旧版 migrate_search_fulltext.sql 建过索引的库执行一次，新库无需执行
+-- 执行：mysql -u root -p lingshu < migrate_search_fulltext_stopword.sql
+
+SET SESSION innodb_ft_enable_stopword = OFF;
+
+ALTER TABLE post DROP INDEX `ft_post_content_tags`;
+ALTER TABLE post ADD FULLTEXT KEY `ft_post_content_tags` (`content`, `tags_json`) WITH PARSER ngram;
+
+ALTER TABLE `user` DROP INDEX `ft_user_nickname`;
+ALTER TABLE `user` ADD FULLTEXT KEY `ft_user_nickname` (`nickname`) WITH PARSER ngram;
@@ -0,0 +1,4 @@
+-- 关注关系按被关注者查粉丝（发帖写扩散、粉丝列表、粉丝数）所需索引，原表只有 (user_id, target_user_id) 主键
+-- 执行：mysql -u root -p lingshu < migrate_user_follow_target_index.sql
+
+ALTER TABLE user_follow ADD KEY `idx_target_user` (`target_user_id`, `user_id`);
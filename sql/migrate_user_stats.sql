@@ -0,0 +1,26 @@
+-- 用户统计计数反范式：主页/me 读一行 user_stats，不再每次 COUNT(user_follow) / COUNT、SUM(post)
+-- 关注、发帖、删帖、点赞落库时增量维护；python manage.py repair_user_stats 按源表重算修正
+-- 不回填也可：没有行的用户首次访问主页时自动统计写入；下面按已有数据一次性回填
+-- 执行：mysql -u root -p lingshu < migrate_user_stats.sql
+
+CREATE TABLE IF NOT EXISTS `user_stats` (
+    `user_id` BIGINT NOT NULL,
+    `follow_count` INT NOT NULL DEFAULT 0 COMMENT '关注数',
+    `follower_count` INT NOT NULL DEFAULT 0 COMMENT '粉丝数',
+    `post_count` INT NOT NULL DEFAULT 0 COMMENT '正常状态帖子数',
+    `received_like_count` BIGINT NOT NULL DEFAULT 0 COMMENT '正常状态帖子获赞数之和',
+    `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`user_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户统计计数';
+
+INSERT INTO user_stats (user_id, follow_count, follower_count, post_count, received_like_count, updated_at)
+SELECT u.id,
+       (SELECT COUNT(*) FROM user_follow f WHERE f.user_id = u.id),
+       (SELECT COUNT(*) FROM user_follow f WHERE f.target_user_id = u.id),
+       (SELECT COUNT(*) FROM post p WHERE p.user_id = u.id AND p.status = 1),
+       (SELECT COALESCE(SUM(p.like_count), 0) FROM post p WHERE p.user_id = u.id AND p.status = 1),
+       NOW()
+FROM user u
+ON DUPLICATE KEY UPDATE
+    follow_count = VALUES(follow_count), follower_count = VALUES(follower_count),
+    post_count = VALUES(post_count), received_like_count = VALUES(received_like_count), updated_at = NOW();